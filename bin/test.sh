@@ -10,3 +10,6 @@ python3 -m mypy src/
 python3 -m pylint --rcfile=pylintrc src/ tests/ setup.py
 python3 -m coverage run setup.py test --test-suite tests.unit
 python3 -m coverage run -a setup.py test --test-suite tests.integration
+if [[ -n "${RUN_LOAD_TESTS:-}" ]]; then
+    python3 -m coverage run -a setup.py test --test-suite tests.load
+fi
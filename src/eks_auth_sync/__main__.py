@@ -3,55 +3,72 @@
 Entrypoint for the CLI utility.
 """
 
-import yaml
-import boto3  # type: ignore
+import json
+import sys
+import typing
 import structlog  # type: ignore
-import kubernetes  # type: ignore
-from eks_auth_sync import k8s, eks, mapping, scanner, _logging, _args
+from eks_auth_sync import exec_credential, query, _logging, _args
 
 
 _LOG = structlog.get_logger()
 
 
-def _k8s_client(session: boto3.Session, args) -> kubernetes.client.ApiClient:
-    if args.auth_with_aws:
-        config = eks.api_config(
-            session=session, cluster=args.cluster, role_arn=args.auth_role_arn,
+def _token(args, summary: _logging.RunSummary) -> None:
+    cache = exec_credential.TokenCache(
+        directory=None if args.no_cache else args.cache_dir,
+        region_name=args.region_name,
+    )
+    token = cache.token(args.cluster, args.role_arn)
+    summary.update(cached=cache.hits > 0)
+    json.dump(token.to_exec_credential(exec_credential.exec_api_version()), sys.stdout)
+    sys.stdout.write("\n")
+
+
+def _query(args, summary: _logging.RunSummary) -> None:
+    records: typing.List[dict] = []
+    for filename in args.snapshot_files:
+        records += query.QueryIndex.open(filename).query(
+            arn=args.arn,
+            username=args.username,
+            group=args.group,
+            cluster=args.cluster,
+        )
+    summary.update(results=len(records))
+    if args.output == "json":
+        json.dump(records, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    for record in records:
+        print(
+            record["cluster"],
+            record["arn"],
+            record["username"],
+            ",".join(record["groups"]),
+            sep="\t",
         )
-        kubernetes.client.Configuration.set_default(config)
-    elif args.in_cluster:
-        kubernetes.config.load_incluster_config()
-    else:
-        kubernetes.config.load_kube_config()
-    return kubernetes.client.ApiClient()
 
 
 def main() -> None:
     """ Entrypoint for the CLI utility """
-    args = _args.parser().parse_args()
+    args = _args.parse_args()
     _logging.configure_logging(args)
-    session = boto3.Session(region_name=args.region_name)
-
-    scnr = scanner.Scanner(session=session, cluster=args.cluster)
-    mappings = []
-    if args.roles_path:
-        mappings.extend(scnr.from_iam_roles(args.roles_path))
-    if args.users_path:
-        mappings.extend(scnr.from_iam_users(args.users_path))
-
-    configmap = mapping.to_aws_auth(mappings)
-    if args.update:
-        if not mappings:
-            if not args.allow_empty:
-                _LOG.info("no mappings found. skipping update.")
-                return
-            _LOG.warning("no mapppings found. updating!")
-
-        client = _k8s_client(session, args)
-        _LOG.info("updating aws-auth configmap")
-        k8s.update_aws_auth_configmap(client, configmap)
-    else:
-        print(yaml.dump([m.to_aws_auth_entry() for m in mappings]))
+    summary = _logging.RunSummary()
+    summary.update(command=args.command)
+    try:
+        if args.command == _args.TOKEN:
+            _token(args, summary)
+        elif args.command == _args.QUERY:
+            _query(args, summary)
+        else:
+            # Kubectl runs the token command for every request,
+            # and the query command is used interactively,
+            # so the modules needed by the other commands are only imported here.
+            # pylint: disable=import-outside-toplevel
+            from eks_auth_sync import _commands
+
+            _commands.COMMANDS[args.command](args, summary)
+    finally:
+        summary.log(_LOG)
 
 
 if __name__ == "__main__":
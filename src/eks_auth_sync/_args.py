@@ -3,6 +3,35 @@ CLI argument parsing
 """
 
 import argparse
+import sys
+import typing
+from eks_auth_sync import exec_credential, output
+
+SYNC = "sync"
+PLAN = "plan"
+RENDER = "render"
+SERVE = "serve"
+AGENT = "agent"
+TOKEN = "token"
+QUERY = "query"
+COMMANDS = (SYNC, PLAN, RENDER, SERVE, AGENT, TOKEN, QUERY)
+
+# Values of `store.ConflictPolicy`. The store module is not imported to keep the startup fast.
+CONFLICT_POLICIES = ("warn", "error", "first", "last")
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the CLI arguments for the app.
+    When no command is given, the sync command is used.
+
+    :param argv: Arguments to parse. Default: the arguments of the current process
+    :returns: The parsed arguments. The chosen command is stored in `command`.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv.insert(0, SYNC)
+    return parser().parse_args(argv)
 
 
 def parser() -> argparse.ArgumentParser:
@@ -10,18 +39,257 @@ def parser() -> argparse.ArgumentParser:
     Create a CLI argument parser for the app
     """
     aparser = argparse.ArgumentParser(description="Update AWS auth in EKS cluster",)
+    subparsers = aparser.add_subparsers(dest="command")
+
+    sync_parser = subparsers.add_parser(
+        SYNC,
+        help="Scan AWS for EKS users and print them or update them to the cluster",
+    )
+    _add_cluster_argument(sync_parser)
+    _add_scan_arguments(sync_parser)
+    _add_checkpoint_arguments(sync_parser)
+    _add_sync_arguments(sync_parser)
+    _add_k8s_arguments(sync_parser)
+    _add_common_arguments(sync_parser)
+
+    plan_parser = subparsers.add_parser(
+        PLAN, help="Show the changes an update would make to the cluster",
+    )
+    _add_cluster_argument(plan_parser)
+    _add_scan_arguments(plan_parser)
+    _add_checkpoint_arguments(plan_parser)
+    _add_from_snapshot_argument(plan_parser)
+    plan_parser.add_argument(
+        "--detailed-exitcode",
+        dest="detailed_exitcode",
+        action="store_true",
+        help="If enabled, exit with status 2 when there are changes",
+    )
+    _add_k8s_arguments(plan_parser)
+    _add_common_arguments(plan_parser)
+
+    render_parser = subparsers.add_parser(
+        RENDER, help="Print the AWS auth ConfigMap for the cluster",
+    )
+    _add_cluster_argument(render_parser)
+    _add_scan_arguments(render_parser)
+    _add_checkpoint_arguments(render_parser)
+    _add_from_snapshot_argument(render_parser)
+    _add_common_arguments(render_parser)
+
+    serve_parser = subparsers.add_parser(
+        SERVE, help="Scan AWS periodically and serve the AWS auth for many clusters",
+    )
+    serve_parser.add_argument(
+        "--cluster",
+        dest="clusters",
+        action="append",
+        required=True,
+        help="Cluster to serve the AWS auth for. Can be repeated.",
+    )
+    _add_scan_arguments(serve_parser)
+    _add_serve_arguments(serve_parser)
+    _add_common_arguments(serve_parser)
+
+    agent_parser = subparsers.add_parser(
+        AGENT, help="Update the cluster with the AWS auth served by a hub",
+    )
+    _add_cluster_argument(agent_parser)
+    _add_agent_arguments(agent_parser)
+    _add_k8s_arguments(agent_parser)
+    _add_common_arguments(agent_parser)
+
+    token_parser = subparsers.add_parser(
+        TOKEN, help="Print an ExecCredential for authenticating kubectl to the cluster",
+    )
+    token_parser.add_argument(
+        "--cluster", dest="cluster", required=True, help="Cluster to authenticate to",
+    )
+    token_parser.add_argument(
+        "--role-arn", dest="role_arn", help="Role to assume for EKS authentication",
+    )
+    token_parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=exec_credential.default_cache_dir(),
+        help="Directory for caching the tokens and the assumed role credentials. "
+        "Default: $XDG_CACHE_HOME/eks-auth-sync",
+    )
+    token_parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="If enabled, tokens and credentials are not cached.",
+    )
+    _add_common_arguments(token_parser)
+
+    query_parser = subparsers.add_parser(
+        QUERY, help="Look up mappings from the results of the previous scans",
+    )
+    query_parser.add_argument(
+        "--snapshot-file",
+        dest="snapshot_files",
+        action="append",
+        required=True,
+        help="Snapshot file saved by the sync command. "
+        "Can be given multiple times for querying many clusters.",
+    )
+    query_parser.add_argument(
+        "--arn", dest="arn", help="Find the mapping for this IAM user or role ARN",
+    )
+    query_parser.add_argument(
+        "--username",
+        dest="username",
+        help="Find the mappings for this Kubernetes user",
+    )
+    query_parser.add_argument(
+        "--group", dest="group", help="Find the mappings for this Kubernetes group",
+    )
+    query_parser.add_argument(
+        "--cluster", dest="cluster", help="Find the mappings for this cluster",
+    )
+    query_parser.add_argument(
+        "--output",
+        dest="output",
+        choices=("text", "json"),
+        default="text",
+        help="Format for printing the mappings found. Default: text",
+    )
+    _add_common_arguments(query_parser)
+    return aparser
+
+
+def _add_cluster_argument(aparser: argparse.ArgumentParser) -> None:
     aparser.add_argument(
-        "--cluster", dest="cluster", required=True, help="Cluster to update",
+        "--cluster", dest="cluster", required=True, help="Cluster to scan and update",
+    )
+
+
+def _add_checkpoint_arguments(aparser: argparse.ArgumentParser) -> None:
+    aparser.add_argument(
+        "--scan-deadline",
+        dest="scan_deadline",
+        type=float,
+        help="Number of seconds after which the scan is stopped",
     )
+    aparser.add_argument(
+        "--checkpoint-file",
+        dest="checkpoint_file",
+        help="File for saving the scan progress to. "
+        "Interrupted scans are resumed from the file on the next run.",
+    )
+    aparser.add_argument(
+        "--allow-partial",
+        dest="allow_partial",
+        action="store_true",
+        help="If enabled, results are used even when the scan didn't finish in time.",
+    )
+    aparser.add_argument(
+        "--max-api-calls",
+        dest="max_api_calls",
+        type=int,
+        help="Maximum number of AWS API calls to make. "
+        "The run is aborted when the scan would make more calls.",
+    )
+
+
+def _add_scan_arguments(aparser: argparse.ArgumentParser) -> None:
     aparser.add_argument(
         "--scan-roles-path",
-        dest="roles_path",
-        help="AWS IAM role path to scan for EKS users",
+        dest="roles_paths",
+        action="append",
+        default=[],
+        help="AWS IAM role path to scan for EKS users. Can be repeated.",
     )
     aparser.add_argument(
         "--scan-users-path",
-        dest="users_path",
-        help="AWS IAM user path to scan for EKS users",
+        dest="users_paths",
+        action="append",
+        default=[],
+        help="AWS IAM user path to scan for EKS users. Can be repeated.",
+    )
+    aparser.add_argument(
+        "--scan-concurrency",
+        dest="scan_concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of IAM paths to scan concurrently. Default: 4",
+    )
+    aparser.add_argument(
+        "--rules-file",
+        dest="rules_file",
+        help="YAML file containing rules for mapping IAM users and roles by name and path",
+    )
+    aparser.add_argument(
+        "--include-name",
+        dest="include_names",
+        action="append",
+        default=[],
+        help="Only scan IAM users and roles with a name matching this glob. "
+        'Prefix with "regex:" to use a regular expression. Can be repeated.',
+    )
+    aparser.add_argument(
+        "--exclude-name",
+        dest="exclude_names",
+        action="append",
+        default=[],
+        help="Skip IAM users and roles with a name matching this glob. "
+        'Prefix with "regex:" to use a regular expression. Can be repeated.',
+    )
+    aparser.add_argument(
+        "--include-path",
+        dest="include_paths",
+        action="append",
+        default=[],
+        help="Only scan IAM users and roles with a path matching this glob. "
+        'Prefix with "regex:" to use a regular expression. Can be repeated.',
+    )
+    aparser.add_argument(
+        "--exclude-path",
+        dest="exclude_paths",
+        action="append",
+        default=[],
+        help="Skip IAM users and roles with a path matching this glob. "
+        'Prefix with "regex:" to use a regular expression. Can be repeated.',
+    )
+    aparser.add_argument(
+        "--scan-service-roles",
+        dest="scan_service_roles",
+        action="store_true",
+        help="If enabled, AWS service-linked roles are scanned too.",
+    )
+    aparser.add_argument(
+        "--mappings-file",
+        dest="mappings_file",
+        help="YAML file containing mappings to include in addition to the scanned ones",
+    )
+    aparser.add_argument(
+        "--conflict-policy",
+        dest="conflict_policy",
+        choices=CONFLICT_POLICIES,
+        default="warn",
+        help="How to resolve mappings for the same IAM user or role, "
+        "or for the same Kubernetes username: "
+        '"warn" logs the conflicts and keeps the first mapping for each IAM user and role, '
+        '"error" fails the scan, and "first" and "last" keep only the first '
+        "or the last conflicting mapping. "
+        'With "first" and "last", ndjson output is printed only after the scan. '
+        "Default: warn",
+    )
+
+
+def _add_sync_arguments(aparser: argparse.ArgumentParser) -> None:
+    aparser.add_argument(
+        "--output",
+        dest="output",
+        choices=output.FORMATS,
+        default=output.YAML,
+        help="Format for printing the mappings when not updating the cluster. "
+        'In "ndjson" format with --allow-partial and the "warn" or "error" '
+        "conflict policy, mappings are printed as soon as they are found, "
+        "even if the run fails later. "
+        "Otherwise, mappings are printed only after the scan results pass all checks. "
+        "Default: yaml",
     )
     aparser.add_argument(
         "--update",
@@ -35,6 +303,136 @@ def parser() -> argparse.ArgumentParser:
         action="store_true",
         help="If enabled, AWS auth is updated even when no mappings are found.",
     )
+    aparser.add_argument(
+        "--backend",
+        dest="backend",
+        choices=("configmap", "crd"),
+        default="configmap",
+        help='Where to update the mappings to: "configmap" for the aws-auth ConfigMap '
+        'or "crd" for aws-iam-authenticator IAMIdentityMapping resources. '
+        "Default: configmap",
+    )
+    aparser.add_argument(
+        "--apply-concurrency",
+        dest="apply_concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of Kubernetes resources to change concurrently. Default: 4",
+    )
+    aparser.add_argument(
+        "--priority-path",
+        dest="priority_paths",
+        action="append",
+        default=[],
+        help="IAM role path prefix to scan before the other users and roles. "
+        "When updating the aws-auth ConfigMap, the roles under the priority paths "
+        "and the roles mapped to nodes by the rules are merged to the ConfigMap "
+        "as soon as they are scanned. Can be given multiple times.",
+    )
+    aparser.add_argument(
+        "--snapshot-file",
+        dest="snapshot_file",
+        help="File for saving the results of a complete scan to. "
+        "When a user or role can't be scanned, "
+        "its mapping is taken from the previous results saved in the file. "
+        "An index for the query command is saved next to the file.",
+    )
+    aparser.add_argument(
+        "--max-degraded-ratio",
+        dest="max_degraded_ratio",
+        type=float,
+        default=0.05,
+        help="Maximum share of the users and roles that had their tags looked up "
+        "that can be mapped using the previous results in the snapshot file. "
+        "The results are not used when the share is larger. Default: 0.05",
+    )
+
+
+def _add_serve_arguments(aparser: argparse.ArgumentParser) -> None:
+    aparser.add_argument(
+        "--listen-address",
+        dest="listen_address",
+        default="127.0.0.1",
+        help="Address to listen to for HTTPS requests. Default: 127.0.0.1",
+    )
+    aparser.add_argument(
+        "--port",
+        dest="port",
+        type=int,
+        default=8080,
+        help="Port to listen to for HTTPS requests. Default: 8080",
+    )
+    aparser.add_argument(
+        "--tls-cert",
+        dest="tls_cert",
+        required=True,
+        help="PEM file containing the TLS certificate chain of the hub",
+    )
+    aparser.add_argument(
+        "--tls-key",
+        dest="tls_key",
+        required=True,
+        help="PEM file containing the private key of the TLS certificate",
+    )
+    aparser.add_argument(
+        "--token-file",
+        dest="token_file",
+        required=True,
+        help="File containing the bearer token the agents must present",
+    )
+    aparser.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=300.0,
+        help="Number of seconds between scans. Default: 300",
+    )
+
+
+def _add_agent_arguments(aparser: argparse.ArgumentParser) -> None:
+    aparser.add_argument(
+        "--hub-url",
+        dest="hub_url",
+        required=True,
+        help="HTTPS base URL of the hub started with the serve command",
+    )
+    aparser.add_argument(
+        "--hub-token-file",
+        dest="hub_token_file",
+        required=True,
+        help="File containing the bearer token for authenticating to the hub",
+    )
+    aparser.add_argument(
+        "--hub-ca-file",
+        dest="hub_ca_file",
+        help="PEM file containing the CA certificates for verifying the hub. "
+        "Default: the system CA certificates",
+    )
+    aparser.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=0.0,
+        help="Number of seconds between fetching the AWS auth from the hub. "
+        "If zero, the AWS auth is fetched only once. Default: 0",
+    )
+    aparser.add_argument(
+        "--allow-empty",
+        dest="allow_empty",
+        action="store_true",
+        help="If enabled, AWS auth is updated even when no mappings are found.",
+    )
+
+
+def _add_from_snapshot_argument(aparser: argparse.ArgumentParser) -> None:
+    aparser.add_argument(
+        "--from-snapshot",
+        dest="from_snapshot",
+        help="Use the results saved in this snapshot file instead of scanning AWS",
+    )
+
+
+def _add_k8s_arguments(aparser: argparse.ArgumentParser) -> None:
     aparser.add_argument(
         "--in-cluster",
         dest="in_cluster",
@@ -52,6 +450,9 @@ def parser() -> argparse.ArgumentParser:
         dest="auth_role_arn",
         help="Role to assume for EKS authentication",
     )
+
+
+def _add_common_arguments(aparser: argparse.ArgumentParser) -> None:
     aparser.add_argument(
         "--log-format",
         dest="log_format",
@@ -65,4 +466,3 @@ def parser() -> argparse.ArgumentParser:
         help="Logging level. Default: WARNING",
     )
     aparser.add_argument("--region-name", dest="region_name", help="AWS region to use")
-    return aparser
@@ -0,0 +1,119 @@
+"""
+Shared AWS clients
+"""
+import threading
+import typing
+import boto3  # type: ignore
+import botocore.config  # type: ignore
+
+# Botocore defaults to 10 connections per client
+MIN_POOL_CONNECTIONS = 10
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+MAX_ATTEMPTS = 8
+
+
+def client_config(
+    max_pool_connections: int = MIN_POOL_CONNECTIONS,
+) -> botocore.config.Config:
+    """
+    Create a client configuration for the AWS clients.
+
+    :param max_pool_connections: Number of connections to keep open per client
+    :returns: A configuration with adaptive retries and timeouts.
+        The adaptive retries slow down the requests when AWS starts throttling them.
+    """
+    return botocore.config.Config(
+        max_pool_connections=max(MIN_POOL_CONNECTIONS, max_pool_connections),
+        retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+
+
+class ApiCallBudgetExceeded(Exception):
+    """
+    Raised when more AWS API calls are made than allowed by the budget.
+    """
+
+
+class ClientRegistry:
+    """
+    ClientRegistry creates each AWS client only once,
+    so that the clients share their connections and endpoint details between uses.
+    The registry is safe to share between threads.
+
+    :param session: Boto3 session to create the clients with
+    :param concurrency: Number of threads using the same client at the same time.
+        The connection pools of the clients are sized to match it.
+    :param max_api_calls: Optional maximum number of API calls to make with
+        the clients. Calls exceeding the budget raise `ApiCallBudgetExceeded`
+        before they are sent to AWS. Retries are not counted as separate calls.
+    """
+
+    def __init__(
+        self,
+        session: boto3.Session,
+        concurrency: int = 1,
+        max_api_calls: typing.Optional[int] = None,
+    ) -> None:
+        self.session = session
+        self._config = client_config(concurrency)
+        self._max_api_calls = max_api_calls
+        self._lock = threading.Lock()
+        self._clients: typing.Dict[tuple, typing.Any] = {}
+        self._api_calls_lock = threading.Lock()
+        self.api_calls = 0
+
+    def client(
+        self,
+        service: str,
+        region_name: typing.Optional[str] = None,
+        credentials: typing.Optional[dict] = None,
+    ) -> typing.Any:
+        """
+        Get a client for an AWS service.
+
+        :param service: Name of the AWS service
+        :param region_name: Optional region to use instead of the session region
+        :param credentials: Optional credentials to use instead of the session credentials.
+            The credentials are given in the format returned by STS.
+        :returns: A Boto3 client for the service
+        """
+        credentials_key = None
+        client_kwargs = {}
+        if credentials is not None:
+            credentials_key = credentials["AccessKeyId"], credentials["SessionToken"]
+            client_kwargs = {
+                "aws_access_key_id": credentials["AccessKeyId"],
+                "aws_secret_access_key": credentials["SecretAccessKey"],
+                "aws_session_token": credentials["SessionToken"],
+            }
+        key = (service, region_name or self.session.region_name, credentials_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self.session.client(
+                    service,
+                    region_name=region_name,
+                    config=self._config,
+                    **client_kwargs,
+                )
+                client.meta.events.register_first(
+                    "before-call.*.*",
+                    self._count_api_call,
+                    unique_id="eks-auth-sync-count-api-call",
+                )
+                self._clients[key] = client
+        return client
+
+    def _count_api_call(self, model: typing.Any, **kwargs) -> None:
+        with self._api_calls_lock:
+            self.api_calls += 1
+            api_calls = self.api_calls
+        if self._max_api_calls is not None and api_calls > self._max_api_calls:
+            raise ApiCallBudgetExceeded(
+                f"Budget of {self._max_api_calls} AWS API calls exceeded "
+                f"by {model.service_model.service_name}.{model.name}"
+            )
@@ -0,0 +1,388 @@
+"""
+Commands of the CLI utility.
+"""
+
+import hashlib
+import os
+import sys
+import typing
+import yaml
+import boto3  # type: ignore
+import structlog  # type: ignore
+import kubernetes  # type: ignore
+from eks_auth_sync import k8s, eks, filters, mapping, output, rules, scanner
+from eks_auth_sync import agent, hub, plan, _aws, _logging, _args
+from eks_auth_sync.store import ConflictPolicy, MappingConflict
+from eks_auth_sync.checkpoint import Checkpoint, config_hash as checkpoint_config_hash
+from eks_auth_sync.snapshot import Snapshot
+from eks_auth_sync.query import QueryIndex
+
+
+_LOG = structlog.get_logger()
+
+# Conflict policies whose results contain every mapping streamed during the scan.
+# "warn" keeps the first mapping for each IAM user and role like the stream does,
+# and "error" fails the whole scan. "first" and "last" can drop mappings that
+# were already streamed.
+_STREAMING_POLICIES = (ConflictPolicy.Warn, ConflictPolicy.Error)
+
+
+def _clients(args) -> _aws.ClientRegistry:
+    return _aws.ClientRegistry(
+        boto3.Session(region_name=args.region_name),
+        concurrency=getattr(args, "scan_concurrency", 1),
+        max_api_calls=getattr(args, "max_api_calls", None),
+    )
+
+
+def _k8s_client(clients: _aws.ClientRegistry, args) -> kubernetes.client.ApiClient:
+    if args.auth_with_aws:
+        config = eks.api_config(
+            session=clients.session,
+            cluster=args.cluster,
+            role_arn=args.auth_role_arn,
+            clients=clients,
+        )
+        kubernetes.client.Configuration.set_default(config)
+    elif args.in_cluster:
+        kubernetes.config.load_incluster_config()
+    else:
+        kubernetes.config.load_kube_config()
+    return kubernetes.client.ApiClient()
+
+
+def _scanners(
+    clients: _aws.ClientRegistry,
+    args,
+    clusters: typing.List[str],
+    tag_cache: typing.Optional[scanner.TagCache] = None,
+) -> typing.Dict[str, scanner.Scanner]:
+    ruleset = rules.RuleSet.from_file(args.rules_file) if args.rules_file else None
+    principal_filter = filters.PrincipalFilter(
+        include_names=args.include_names,
+        exclude_names=args.exclude_names,
+        include_paths=args.include_paths,
+        exclude_paths=args.exclude_paths,
+        exclude_service_roles=not args.scan_service_roles,
+    )
+    return {
+        cluster: scanner.Scanner(
+            session=clients.session,
+            cluster=cluster,
+            rules=ruleset,
+            principal_filter=principal_filter,
+            tag_cache=tag_cache,
+            clients=clients,
+        )
+        for cluster in clusters
+    }
+
+
+def _file_mappings(args) -> typing.List[mapping.Mapping]:
+    return mapping.from_file(args.mappings_file) if args.mappings_file else []
+
+
+def _last_known_good(args) -> typing.Optional[Snapshot]:
+    filename = getattr(args, "snapshot_file", None)
+    if not filename or not os.path.exists(filename):
+        return None
+    snapshot = Snapshot.load(filename)
+    if snapshot.cluster != args.cluster:
+        _LOG.warning(
+            "snapshot is for another cluster. not using it as a fallback.",
+            filename=filename,
+            snapshot_cluster=snapshot.cluster,
+        )
+        return None
+    return snapshot
+
+
+def _scan_config_hash(args) -> str:
+    rules_hash = None
+    if args.rules_file:
+        with open(args.rules_file, "rb") as fp:
+            rules_hash = hashlib.sha256(fp.read()).hexdigest()
+    return checkpoint_config_hash(
+        {
+            "roles_paths": args.roles_paths,
+            "users_paths": args.users_paths,
+            "priority_paths": getattr(args, "priority_paths", []),
+            "rules": rules_hash,
+            "include_names": args.include_names,
+            "exclude_names": args.exclude_names,
+            "include_paths": args.include_paths,
+            "exclude_paths": args.exclude_paths,
+            "scan_service_roles": args.scan_service_roles,
+        }
+    )
+
+
+def _scan(
+    clients: _aws.ClientRegistry,
+    args,
+    summary: _logging.RunSummary,
+    on_mapping: typing.Optional[typing.Callable[[mapping.Mapping], None]] = None,
+    on_priority: typing.Optional[
+        typing.Callable[[typing.List[mapping.Mapping]], None]
+    ] = None,
+) -> scanner.ScanResult:
+    scnr = _scanners(clients, args, [args.cluster])[args.cluster]
+    checkpoint = (
+        Checkpoint(args.checkpoint_file, args.cluster, _scan_config_hash(args))
+        if args.checkpoint_file
+        else None
+    )
+    file_mappings = _file_mappings(args)
+    if on_mapping:
+        for file_mapping in file_mappings:
+            on_mapping(file_mapping)
+
+    conflict_policy = ConflictPolicy(args.conflict_policy)
+    last_known_good = _last_known_good(args)
+    try:
+        with summary.timed("scan"):
+            result = scnr.scan(
+                roles_paths=args.roles_paths,
+                users_paths=args.users_paths,
+                options=scanner.ScanOptions(
+                    concurrency=args.scan_concurrency,
+                    deadline=args.scan_deadline,
+                    checkpoint=checkpoint,
+                    on_mapping=on_mapping,
+                    conflict_policy=conflict_policy,
+                    fallback=last_known_good.mappings if last_known_good else None,
+                    priority_paths=getattr(args, "priority_paths", ()),
+                    on_priority=on_priority,
+                    extra_mappings=file_mappings,
+                ),
+            )
+    except MappingConflict as err:
+        _LOG.error("conflicting mappings found. skipping results.", error=str(err))
+        sys.exit(1)
+    except _aws.ApiCallBudgetExceeded as err:
+        _LOG.error("AWS API call budget exceeded. skipping results.", error=str(err))
+        sys.exit(1)
+    finally:
+        summary.update(api_calls=clients.api_calls)
+    summary.update(
+        complete=result.complete,
+        conflicts=len(result.conflicts),
+        **scnr.stats.as_dict(),
+    )
+    if result.degraded:
+        # Only the users and roles that needed their tags can be degraded
+        looked_up = scnr.stats["tag_lookups"] + scnr.stats["tag_cache_hits"]
+        degraded_ratio = len(result.degraded) / max(1, looked_up)
+        if degraded_ratio > args.max_degraded_ratio:
+            _LOG.error(
+                "too many users and roles could not be scanned. skipping results.",
+                degraded=len(result.degraded),
+                degraded_ratio=round(degraded_ratio, 3),
+            )
+            sys.exit(1)
+        _LOG.warning(
+            "some users and roles could not be scanned. using last known good mappings!",
+            degraded=result.degraded,
+        )
+    if not result.complete:
+        if not args.allow_partial:
+            _LOG.error("scan did not complete before the deadline. skipping results.")
+            sys.exit(1)
+        _LOG.warning(
+            "scan did not complete before the deadline. using partial results!"
+        )
+    elif checkpoint:
+        checkpoint.clear()
+
+    return result
+
+
+def _snapshot_or_scan(
+    clients: typing.Optional[_aws.ClientRegistry], args, summary: _logging.RunSummary
+) -> Snapshot:
+    if args.from_snapshot:
+        snapshot = Snapshot.load(args.from_snapshot)
+        if snapshot.cluster != args.cluster:
+            raise ValueError(
+                f"Snapshot {args.from_snapshot} is for cluster {snapshot.cluster}"
+            )
+        return snapshot
+    assert clients is not None
+    result = _scan(clients, args, summary)
+    return Snapshot.create(args.cluster, result.mappings, result.principals)
+
+
+def _sync(args, summary: _logging.RunSummary) -> None:
+    clients = _clients(args)
+    writer = None
+    if (
+        not args.update
+        and args.output == output.NDJSON
+        and args.allow_partial
+        and ConflictPolicy(args.conflict_policy) in _STREAMING_POLICIES
+    ):
+        # Streamed mappings can't be taken back, so they're only streamed
+        # when the user accepts results from scans that are not used in full.
+        writer = output.NdjsonWriter(sys.stdout)
+
+    result = _scan(
+        clients,
+        args,
+        summary,
+        on_mapping=writer.write if writer else None,
+        on_priority=_interim_updater(clients, args, summary),
+    )
+    mappings = result.mappings
+    if args.snapshot_file and result.complete and not result.degraded:
+        _LOG.debug("saving snapshot", filename=args.snapshot_file)
+        snapshot = Snapshot.create(args.cluster, mappings, result.principals)
+        snapshot.save(args.snapshot_file)
+        QueryIndex.build(args.snapshot_file).save_for(args.snapshot_file)
+
+    configmap = mapping.to_aws_auth(mappings)
+    if args.update:
+        if not mappings:
+            if not args.allow_empty:
+                _LOG.info("no mappings found. skipping update.")
+                return
+            _LOG.warning("no mapppings found. updating!")
+
+        with summary.timed("update"):
+            client = _k8s_client(clients, args)
+            if args.backend == "crd":
+                changes = k8s.sync_iam_identity_mappings(
+                    client, mappings, concurrency=args.apply_concurrency
+                )
+                summary.update(**changes._asdict())
+            else:
+                _LOG.debug("updating aws-auth configmap")
+                k8s.update_aws_auth_configmap(client, configmap)
+        summary.update(updated=True)
+    elif not writer:
+        output.write(args.output, mappings, sys.stdout)
+
+
+def _interim_updater(
+    clients: _aws.ClientRegistry, args, summary: _logging.RunSummary
+) -> typing.Optional[typing.Callable[[typing.List[mapping.Mapping]], None]]:
+    """
+    Create a function for merging the priority tier to the aws-auth ConfigMap
+    before the whole scan is complete.
+
+    The interim update bypasses the checks the final update is subject to:
+    the scan may still fail, hit the deadline, or exceed the degraded ratio,
+    and conflicts with the rest of the mappings aren't known yet.
+    It's therefore only a merge that adds and updates the priority mappings,
+    while the scanner leaves out the degraded users and roles and the mappings
+    overridden by the mapping file. The final update replaces it.
+    """
+    if not args.update or args.backend != "configmap":
+        return None
+
+    def update(mappings: typing.List[mapping.Mapping]) -> None:
+        with summary.timed("interim_update"):
+            _LOG.debug("merging priority mappings to aws-auth configmap")
+            changed = k8s.merge_aws_auth_configmap(_k8s_client(clients, args), mappings)
+        summary.update(interim_changes=changed)
+
+    return update
+
+
+def _plan(args, summary: _logging.RunSummary) -> None:
+    clients = _clients(args)
+    snapshot = _snapshot_or_scan(clients, args, summary)
+    client = _k8s_client(clients, args)
+    changes = plan.create(k8s.read_aws_auth_configmap(client), snapshot.mappings)
+    print(changes.format())
+    summary.update(
+        added=len(changes.added),
+        removed=len(changes.removed),
+        changed=len(changes.changed),
+    )
+    if args.detailed_exitcode and changes.has_changes:
+        sys.exit(2)
+
+
+class _ManifestDumper(yaml.SafeDumper):
+    """ YAML dumper that writes multi-line strings as literal blocks """
+
+
+_ManifestDumper.add_representer(
+    str,
+    lambda dumper, data: dumper.represent_scalar(
+        "tag:yaml.org,2002:str", data, style="|" if "\n" in data else None
+    ),
+)
+
+
+def _render(args, summary: _logging.RunSummary) -> None:
+    clients = None if args.from_snapshot else _clients(args)
+    snapshot = _snapshot_or_scan(clients, args, summary)
+    configmap = mapping.to_aws_auth(snapshot.mappings)
+    print(
+        yaml.dump(
+            {
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "metadata": {
+                    "name": configmap.metadata["name"],
+                    "namespace": k8s.AWS_AUTH_NAMESPACE,
+                },
+                "data": configmap.data,
+            },
+            Dumper=_ManifestDumper,
+        ),
+        end="",
+    )
+
+
+def _read_token(filename: str) -> str:
+    with open(filename, encoding="utf-8") as fp:
+        return fp.read().strip()
+
+
+def _serve(args, summary: _logging.RunSummary) -> None:
+    clients = _clients(args)
+    tag_cache = scanner.TagCache()
+    mapping_hub = hub.Hub(
+        scanners=_scanners(clients, args, args.clusters, tag_cache),
+        tag_cache=tag_cache,
+        roles_paths=args.roles_paths,
+        users_paths=args.users_paths,
+        concurrency=args.scan_concurrency,
+        extra_mappings=_file_mappings(args),
+        conflict_policy=ConflictPolicy(args.conflict_policy),
+    )
+    hub.serve(
+        mapping_hub,
+        args.listen_address,
+        args.port,
+        args.interval,
+        token=_read_token(args.token_file),
+        ssl_context=hub.server_ssl_context(args.tls_cert, args.tls_key),
+    )
+
+
+def _agent(args, summary: _logging.RunSummary) -> None:
+    clients = _clients(args)
+    hub_agent = agent.Agent(
+        hub_url=args.hub_url,
+        cluster=args.cluster,
+        client_factory=lambda: _k8s_client(clients, args),
+        token=_read_token(args.hub_token_file),
+        ca_file=args.hub_ca_file,
+        allow_empty=args.allow_empty,
+    )
+    if args.interval > 0:
+        hub_agent.run(args.interval)
+    else:
+        summary.update(updated=hub_agent.sync())
+
+
+COMMANDS = {
+    _args.SYNC: _sync,
+    _args.PLAN: _plan,
+    _args.RENDER: _render,
+    _args.SERVE: _serve,
+    _args.AGENT: _agent,
+}
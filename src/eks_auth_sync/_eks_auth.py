@@ -22,6 +22,10 @@
 # * Made `TokenGenerator` private.
 # * Replaced `STSClientFactory` with a function.
 # * Replaced the session parameter with a `boto3.Session`
+# * Added `assume_role` function, and made `get_token` accept its credentials
+#   to allow the credentials to be cached.
+# * Create the STS clients using a shared client registry, and register
+#   the cluster name handlers only once per client.
 #
 # =========================
 """
@@ -31,6 +35,7 @@ IAM authentication for EKS clusters.
 import typing
 import base64
 import boto3  # type: ignore
+from eks_auth_sync._aws import ClientRegistry
 
 # Presigned url timeout in seconds
 URL_TIMEOUT = 60
@@ -41,7 +46,11 @@ CLUSTER_NAME_HEADER = "x-k8s-aws-id"
 
 
 def get_token(
-    session: boto3.Session, cluster: str, role_arn: typing.Optional[str],
+    session: boto3.Session,
+    cluster: str,
+    role_arn: typing.Optional[str],
+    credentials: typing.Optional[dict] = None,
+    clients: typing.Optional[ClientRegistry] = None,
 ) -> str:
     """
     Fetch the authentication token for an EKS cluster.
@@ -49,9 +58,15 @@ def get_token(
     :param session: Boto3 session to use as a context for interacting with AWS
     :param cluster: Name of the EKS cluster
     :param role_arn: Optional IAM role ARN to assume as for the authentication
+    :param credentials: Optional credentials from `assume_role` to use
+        instead of assuming the role again
+    :param clients: Optional registry to get the STS clients from
     :returns: A session token that can be used as a bearer token with the EKS cluster
     """
-    sts_client = _create_sts_client(session, role_arn)
+    clients = clients or ClientRegistry(session)
+    if credentials is None and role_arn is not None:
+        credentials = assume_role(session, role_arn, clients)
+    sts_client = _create_sts_client(clients, credentials)
     token_gen = _TokenGenerator(sts_client)
     return token_gen.get_token(cluster)
 
@@ -77,27 +92,41 @@ class _TokenGenerator:
         )
 
 
-def _create_sts_client(session: boto3.Session, role_arn: typing.Optional[str]):
-    client_kwargs = {}
-    if role_arn is not None:
-        sts = session.client("sts")
-        creds = sts.assume_role(RoleArn=role_arn, RoleSessionName="EKSGetTokenAuth")[
-            "Credentials"
-        ]
-        client_kwargs["aws_access_key_id"] = creds["AccessKeyId"]
-        client_kwargs["aws_secret_access_key"] = creds["SecretAccessKey"]
-        client_kwargs["aws_session_token"] = creds["SessionToken"]
-    sts = session.client("sts", **client_kwargs)
+def assume_role(
+    session: boto3.Session,
+    role_arn: str,
+    clients: typing.Optional[ClientRegistry] = None,
+) -> dict:
+    """
+    Assume an IAM role for the authentication.
+
+    :param session: Boto3 session to use as a context for interacting with AWS
+    :param role_arn: IAM role ARN to assume
+    :param clients: Optional registry to get the STS client from
+    :returns: Temporary credentials for the role in the format returned by STS
+    """
+    sts = (clients or ClientRegistry(session)).client("sts")
+    return sts.assume_role(RoleArn=role_arn, RoleSessionName="EKSGetTokenAuth")[
+        "Credentials"
+    ]
+
+
+def _create_sts_client(clients: ClientRegistry, creds: typing.Optional[dict]):
+    sts = clients.client("sts", credentials=creds)
     _register_cluster_name_handlers(sts)
     return sts
 
 
 def _register_cluster_name_handlers(sts_client):
     sts_client.meta.events.register(
-        "provide-client-params.sts.GetCallerIdentity", _retrieve_cluster_name
+        "provide-client-params.sts.GetCallerIdentity",
+        _retrieve_cluster_name,
+        unique_id="eks-auth-sync-retrieve-cluster-name",
     )
     sts_client.meta.events.register(
-        "before-sign.sts.GetCallerIdentity", _inject_cluster_name_header
+        "before-sign.sts.GetCallerIdentity",
+        _inject_cluster_name_header,
+        unique_id="eks-auth-sync-inject-cluster-name-header",
     )
 
 
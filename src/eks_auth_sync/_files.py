@@ -0,0 +1,28 @@
+"""
+File helpers
+"""
+import os
+import tempfile
+
+
+def atomic_write(filename: str, content: str) -> None:
+    """
+    Write the given content to a file atomically.
+
+    The content is first written to a temporary file in the same directory,
+    which then replaces the target file. Readers never see a partially written file.
+
+    :param filename: Name of the file to write
+    :param content: Content to write to the file
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write(content)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
@@ -1,24 +1,35 @@
 """
 Configure logging for the app
 """
+import contextlib
 import typing
 import sys
 import logging
+import time
 import uuid
 import structlog  # type: ignore
 
+# Events are filtered by level in `_LevelFilteringBoundLogger` before these are run.
 _PROCESSORS = (
-    structlog.stdlib.filter_by_level,
+    structlog.threadlocal.merge_threadlocal,
     structlog.stdlib.add_logger_name,
     structlog.stdlib.add_log_level,
-    structlog.stdlib.PositionalArgumentsFormatter(),
     structlog.processors.TimeStamper(fmt="iso"),
     structlog.processors.StackInfoRenderer(),
     structlog.processors.format_exc_info,
-    structlog.processors.UnicodeDecoder(),
-    structlog.threadlocal.merge_threadlocal,
 )
 
+_METHOD_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+    "exception": logging.ERROR,
+    "critical": logging.CRITICAL,
+    "fatal": logging.CRITICAL,
+}
+
 _NOISY_LOG_SOURCES = (
     "boto",
     "urllib3",
@@ -48,7 +59,7 @@ def configure_logging(args: typing.Any) -> None:
     structlog.configure(
         processors=processors,
         context_class=dict,
-        wrapper_class=structlog.stdlib.BoundLogger,
+        wrapper_class=_LevelFilteringBoundLogger,
         logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
     )
@@ -62,5 +73,75 @@ def configure_logging(args: typing.Any) -> None:
 
     # Default bindings
     structlog.threadlocal.bind_threadlocal(
-        cluster=args.cluster, run_id=str(uuid.uuid4()),
+        cluster=getattr(args, "cluster", None), run_id=str(uuid.uuid4()),
     )
+
+
+def debug_enabled() -> bool:
+    """
+    Check whether debug events are logged.
+    Use this for skipping building expensive debug event payloads.
+
+    :returns: `True` if debug events are logged
+    """
+    return logging.getLogger("eks_auth_sync").isEnabledFor(logging.DEBUG)
+
+
+class _LevelFilteringBoundLogger(structlog.stdlib.BoundLogger):
+    """
+    Bound logger that drops events below the logging level
+    before the context is merged and any of the processors are run.
+    """
+
+    def _proxy_to_logger(self, method_name, event, *event_args, **event_kw):
+        level = _METHOD_LEVELS.get(method_name)
+        if level is not None and not self._logger.isEnabledFor(level):
+            return None
+        return super()._proxy_to_logger(method_name, event, *event_args, **event_kw)
+
+
+class RunSummary:
+    """
+    RunSummary collects counters and durations during a run,
+    so that they can be logged as a single event at the end of the run.
+    """
+
+    def __init__(self) -> None:
+        self._start = time.monotonic()
+        self._fields: typing.Dict[str, typing.Any] = {}
+
+    def update(self, **fields: typing.Any) -> None:
+        """ Add the given fields to the summary """
+        self._fields.update(fields)
+
+    @contextlib.contextmanager
+    def timed(self, name: str) -> typing.Iterator[None]:
+        """
+        Measure the duration of a block of code.
+        The duration is added to the summary as `{name}_seconds`.
+
+        :param name: Name of the measured step
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._fields[f"{name}_seconds"] = round(time.monotonic() - start, 3)
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns the summary fields in dictionary format.
+        The time since the summary was created is included as `total_seconds`.
+        """
+        fields = dict(self._fields)
+        fields["total_seconds"] = round(time.monotonic() - self._start, 3)
+        return fields
+
+    def log(self, logger: typing.Any, event: str = "run summary") -> None:
+        """
+        Log the summary as a single info event.
+
+        :param logger: Structlog logger to log the summary with
+        :param event: Name of the event
+        """
+        logger.info(event, **self.as_dict())
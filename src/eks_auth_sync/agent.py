@@ -0,0 +1,101 @@
+"""
+Agent updates a cluster with the AWS auth served by a hub.
+"""
+import json
+import ssl
+import time
+import typing
+import urllib.error
+import urllib.request
+import kubernetes  # type: ignore
+import structlog  # type: ignore
+from eks_auth_sync import k8s
+
+_LOG = structlog.get_logger()
+
+
+class Agent:  # pylint: disable=too-many-instance-attributes
+    """
+    Agent fetches the AWS auth for a cluster from a hub,
+    and updates the aws-auth ConfigMap when the AWS auth has changed.
+
+    :param hub_url: Base URL of the hub. Must use HTTPS.
+    :param cluster: Name of the EKS cluster
+    :param client_factory: Function for creating a Kubernetes client for the cluster
+    :param token: Bearer token for authenticating to the hub
+    :param ca_file: Name of the PEM file containing the CA certificates for
+        verifying the hub. The system CA certificates are used by default.
+    :param allow_empty: If enabled, the cluster is updated even when no mappings are found
+    :param timeout: Number of seconds to wait for the hub to respond
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        hub_url: str,
+        cluster: str,
+        client_factory: typing.Callable[[], kubernetes.client.ApiClient],
+        token: str,
+        ca_file: typing.Optional[str] = None,
+        allow_empty: bool = False,
+        timeout: float = 30.0,
+    ) -> None:
+        if not hub_url.lower().startswith("https://"):
+            raise ValueError(f"Hub URL must use HTTPS: {hub_url}")
+        if not token:
+            raise ValueError("Hub token must not be empty")
+        self._url = f"{hub_url.rstrip('/')}/clusters/{cluster}/aws-auth"
+        self._token = token
+        self._ssl_context = ssl.create_default_context(cafile=ca_file)
+        self._client_factory = client_factory
+        self._allow_empty = allow_empty
+        self._timeout = timeout
+        self._etag: typing.Optional[str] = None
+        self._log = _LOG.new(cluster=cluster, hub_url=hub_url)
+
+    def sync(self) -> bool:
+        """
+        Fetch the AWS auth from the hub, and update the cluster if it has changed.
+
+        :returns: `True` if the cluster was updated
+        """
+        request = urllib.request.Request(self._url)
+        request.add_header("Authorization", f"Bearer {self._token}")
+        if self._etag:
+            request.add_header("If-None-Match", self._etag)
+        try:
+            with urllib.request.urlopen(
+                request, timeout=self._timeout, context=self._ssl_context
+            ) as response:
+                etag = response.headers.get("ETag")
+                document = json.load(response)
+        except urllib.error.HTTPError as err:
+            if err.code == 304:
+                self._log.debug("aws auth not modified")
+                return False
+            raise
+
+        if not document["mappings"] and not self._allow_empty:
+            self._log.info("no mappings found. skipping update.")
+            return False
+
+        self._log.info("updating aws-auth configmap", etag=etag)
+        configmap = kubernetes.client.V1ConfigMap(
+            metadata={"name": k8s.AWS_AUTH_NAME}, data=document["data"]
+        )
+        k8s.update_aws_auth_configmap(self._client_factory(), configmap)
+        self._etag = etag
+        return True
+
+    def run(self, interval: float) -> None:
+        """
+        Keep the cluster in sync with the hub forever.
+        Failures are logged, and the sync is retried after the interval.
+
+        :param interval: Number of seconds between fetching the AWS auth from the hub
+        """
+        while True:
+            try:
+                self.sync()
+            except Exception:  # pylint: disable=broad-except
+                self._log.exception("failed to sync aws auth from hub")
+            time.sleep(interval)
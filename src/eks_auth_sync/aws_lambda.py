@@ -0,0 +1,287 @@
+"""
+AWS Lambda entrypoint.
+
+Use `eks_auth_sync.aws_lambda.handler` as the Lambda function handler.
+The AWS clients, the scanners, the tag cache, and the Kubernetes clients are kept
+between invocations, so warm invocations only scan AWS and update the clusters.
+
+The configuration is read from the invocation event, and the missing values are
+read from the environment variables:
+
+* `clusters` / `EKS_AUTH_SYNC_CLUSTERS`: Clusters to update. Required.
+* `roles_paths` / `EKS_AUTH_SYNC_ROLES_PATHS`: IAM role paths to scan
+* `users_paths` / `EKS_AUTH_SYNC_USERS_PATHS`: IAM user paths to scan
+* `rules_file` / `EKS_AUTH_SYNC_RULES_FILE`: YAML file containing the scanner rules
+* `auth_role_arn` / `EKS_AUTH_SYNC_AUTH_ROLE_ARN`: Role to assume for EKS authentication
+* `update` / `EKS_AUTH_SYNC_UPDATE`: Update the clusters. Default: true
+* `allow_empty` / `EKS_AUTH_SYNC_ALLOW_EMPTY`: Update even when no mappings are found.
+* `backend` / `EKS_AUTH_SYNC_BACKEND`: Either "configmap" or "crd". Default: configmap
+* `scan_concurrency` / `EKS_AUTH_SYNC_SCAN_CONCURRENCY`: Default: 4
+* `tag_cache_ttl` / `EKS_AUTH_SYNC_TAG_CACHE_TTL`: Seconds to reuse tags for. Default: 300
+* `log_level` / `EKS_AUTH_SYNC_LOG_LEVEL`: Logging level. Default: WARNING
+
+Lists are given as lists in the event, and as comma-separated values in the environment.
+
+Each invocation logs with the Lambda request ID as its `run_id`.
+The AWS and Kubernetes libraries are imported on the first invocation
+rather than when the handler is loaded.
+"""
+import logging
+import os
+import time
+import types
+import typing
+import uuid
+import structlog  # type: ignore
+from eks_auth_sync import _logging
+
+if typing.TYPE_CHECKING:
+    # Imported at runtime on the first invocation to keep loading the handler fast
+    import kubernetes  # type: ignore
+    from eks_auth_sync import scanner, _aws
+
+_LOG = structlog.get_logger()
+
+_ENV_PREFIX = "EKS_AUTH_SYNC_"
+
+# Kubernetes clients are recreated before their EKS token expires
+_K8S_CLIENT_TTL = 600.0
+
+# Time reserved for updating the clusters after the scan
+_UPDATE_MARGIN = 30.0
+
+
+class _Config(typing.NamedTuple):
+    clusters: typing.Tuple[str, ...]
+    roles_paths: typing.Tuple[str, ...]
+    users_paths: typing.Tuple[str, ...]
+    rules_file: typing.Optional[str]
+    auth_role_arn: typing.Optional[str]
+    update: bool
+    allow_empty: bool
+    backend: str
+    scan_concurrency: int
+    tag_cache_ttl: float
+    log_level: str
+
+    @classmethod
+    def from_event(cls, event: dict) -> "_Config":
+        """
+        Read the configuration from an invocation event and the environment.
+
+        :param event: Lambda invocation event
+        :returns: The configuration. Values missing from the event are read from
+            the environment variables.
+
+        Throws ValueError when no clusters are configured.
+        """
+
+        def get(name: str, default: typing.Any = None) -> typing.Any:
+            if name in event:
+                return event[name]
+            return os.environ.get(_ENV_PREFIX + name.upper(), default)
+
+        def get_list(name: str) -> typing.Tuple[str, ...]:
+            value = get(name, ())
+            if isinstance(value, str):
+                value = value.split(",")
+            return tuple(v.strip() for v in value if v.strip())
+
+        def get_bool(name: str, default: bool) -> bool:
+            value = get(name, default)
+            if isinstance(value, str):
+                return value.lower() in ("1", "true", "yes")
+            return bool(value)
+
+        config = cls(
+            clusters=get_list("clusters"),
+            roles_paths=get_list("roles_paths"),
+            users_paths=get_list("users_paths"),
+            rules_file=get("rules_file"),
+            auth_role_arn=get("auth_role_arn"),
+            update=get_bool("update", True),
+            allow_empty=get_bool("allow_empty", False),
+            backend=get("backend", "configmap"),
+            scan_concurrency=int(get("scan_concurrency", 4)),
+            tag_cache_ttl=float(get("tag_cache_ttl", 300)),
+            log_level=get("log_level", "WARNING"),
+        )
+        if not config.clusters:
+            raise ValueError("No clusters configured")
+        return config
+
+
+class _State:
+    """ State kept between the warm invocations """
+
+    def __init__(self) -> None:
+        self.clients: typing.Optional["_aws.ClientRegistry"] = None
+        self.tag_cache: typing.Optional["scanner.TagCache"] = None
+        self.scanners: typing.Dict[typing.Tuple[str, _Config], "scanner.Scanner"] = {}
+        self.k8s_clients: typing.Dict[
+            typing.Tuple[str, typing.Optional[str]],
+            typing.Tuple[float, "kubernetes.client.ApiClient"],
+        ] = {}
+        self.log_level: typing.Optional[str] = None
+
+    def evict(self, config: _Config) -> None:
+        """
+        Drop the scanners and Kubernetes clients that the configuration doesn't use,
+        so that invocations with changing events don't accumulate them.
+        """
+        self.scanners = {
+            key: scnr
+            for key, scnr in self.scanners.items()
+            if key[1] == config and key[0] in config.clusters
+        }
+        self.k8s_clients = {
+            key: cached
+            for key, cached in self.k8s_clients.items()
+            if key[0] in config.clusters and key[1] == config.auth_role_arn
+        }
+
+    def scanner(self, cluster: str, config: _Config) -> "scanner.Scanner":
+        """ Get a scanner for the cluster, and create one if needed """
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        import boto3  # type: ignore
+        from eks_auth_sync import rules, scanner, _aws
+
+        if self.clients is None:
+            self.clients = _aws.ClientRegistry(
+                boto3.Session(), concurrency=config.scan_concurrency
+            )
+        if self.tag_cache is None:
+            self.tag_cache = scanner.TagCache(ttl=config.tag_cache_ttl)
+        key = (cluster, config)
+        if key not in self.scanners:
+            ruleset = (
+                rules.RuleSet.from_file(config.rules_file)
+                if config.rules_file
+                else None
+            )
+            self.scanners[key] = scanner.Scanner(
+                session=self.clients.session,
+                cluster=cluster,
+                rules=ruleset,
+                tag_cache=self.tag_cache,
+                clients=self.clients,
+            )
+        return self.scanners[key]
+
+    def k8s_client(
+        self, cluster: str, role_arn: typing.Optional[str]
+    ) -> "kubernetes.client.ApiClient":
+        """ Get a Kubernetes client for the cluster, and create one if needed """
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        import kubernetes  # type: ignore
+        from eks_auth_sync import eks
+
+        key = (cluster, role_arn)
+        cached = self.k8s_clients.get(key)
+        if cached and time.monotonic() - cached[0] < _K8S_CLIENT_TTL:
+            return cached[1]
+        assert self.clients is not None
+        config = eks.api_config(
+            session=self.clients.session,
+            cluster=cluster,
+            role_arn=role_arn,
+            clients=self.clients,
+        )
+        client = kubernetes.client.ApiClient(configuration=config)
+        self.k8s_clients[key] = (time.monotonic(), client)
+        return client
+
+
+_STATE = _State()
+
+
+def handler(event: typing.Optional[dict], context: typing.Any) -> dict:
+    """
+    Scan AWS for EKS users, and update them to the configured clusters.
+
+    :param event: Lambda invocation event. See the module documentation for the fields.
+    :param context: Lambda context
+    :returns: A result for each cluster with the number of mappings found,
+        whether the cluster was updated, and the durations of each step.
+        A cluster that fails to be synced gets the error instead,
+        and the other clusters are still synced.
+    """
+    start = time.monotonic()
+    config = _Config.from_event(event or {})
+    cold_start = _STATE.clients is None
+    if _STATE.log_level != config.log_level:
+        _configure_logging(config.log_level)
+        _STATE.log_level = config.log_level
+    structlog.threadlocal.bind_threadlocal(
+        run_id=getattr(context, "aws_request_id", None) or str(uuid.uuid4())
+    )
+    _STATE.evict(config)
+
+    results = {}
+    for cluster in config.clusters:
+        try:
+            results[cluster] = _sync_cluster(cluster, config, context)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.exception("failed to sync cluster", cluster=cluster)
+            results[cluster] = {"cluster": cluster, "error": str(err)}
+    return {
+        "cold_start": cold_start,
+        "total_seconds": round(time.monotonic() - start, 3),
+        "clusters": results,
+    }
+
+
+def _sync_cluster(cluster: str, config: _Config, context: typing.Any) -> dict:
+    # pylint: disable=import-outside-toplevel,redefined-outer-name
+    from eks_auth_sync import k8s, mapping, scanner
+
+    summary = _logging.RunSummary()
+    summary.update(cluster=cluster, updated=False)
+    with summary.timed("setup"):
+        scnr = _STATE.scanner(cluster, config)
+
+    with summary.timed("scan"):
+        result = scnr.scan(
+            roles_paths=config.roles_paths,
+            users_paths=config.users_paths,
+            options=scanner.ScanOptions(
+                concurrency=config.scan_concurrency, deadline=_scan_deadline(context),
+            ),
+        )
+    summary.update(complete=result.complete, mappings=len(result.mappings))
+
+    if not config.update:
+        pass
+    elif not result.complete:
+        _LOG.error("scan did not complete in time. skipping update.", cluster=cluster)
+    elif not result.mappings and not config.allow_empty:
+        _LOG.info("no mappings found. skipping update.", cluster=cluster)
+    else:
+        with summary.timed("update"):
+            client = _STATE.k8s_client(cluster, config.auth_role_arn)
+            if config.backend == "crd":
+                changes = k8s.sync_iam_identity_mappings(client, result.mappings)
+                summary.update(**changes._asdict())
+            else:
+                k8s.update_aws_auth_configmap(
+                    client, mapping.to_aws_auth(result.mappings)
+                )
+        summary.update(updated=True)
+
+    summary.log(_LOG)
+    return summary.as_dict()
+
+
+def _scan_deadline(context: typing.Any) -> typing.Optional[float]:
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining_time is None:
+        return None
+    return max(0.0, get_remaining_time() / 1000.0 - _UPDATE_MARGIN)
+
+
+def _configure_logging(log_level: str) -> None:
+    _logging.configure_logging(
+        types.SimpleNamespace(log_format="json", log_level=log_level, cluster=None)
+    )
+    # The Lambda runtime configures the root logger before the handler is loaded
+    logging.getLogger().setLevel(log_level.upper())
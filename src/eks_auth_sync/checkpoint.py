@@ -0,0 +1,146 @@
+"""
+Checkpoints allow resuming interrupted IAM scans.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import typing
+import structlog  # type: ignore
+from eks_auth_sync.mapping import Mapping
+from eks_auth_sync._files import atomic_write
+
+# Version of the checkpoint file format
+VERSION = 1
+
+_LOG = structlog.get_logger()
+
+
+class ShardState(typing.NamedTuple):
+    """
+    Progress of scanning a single IAM path prefix.
+
+    :param marker: Pagination marker for the next page to scan or `None` to start over
+    :param done: `True` if all pages have been scanned
+    :param mappings: Mappings found so far
+    """
+
+    marker: typing.Optional[str] = None
+    done: bool = False
+    mappings: typing.Sequence[Mapping] = ()
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "ShardState":
+        """ Reads the shard state from a dictionary """
+        return cls(
+            marker=dictionary.get("marker"),
+            done=dictionary.get("done", False),
+            mappings=[Mapping.from_dict(m) for m in dictionary.get("mappings", [])],
+        )
+
+    def to_dict(self) -> dict:
+        """ Converts the shard state to a dictionary """
+        return {
+            "marker": self.marker,
+            "done": self.done,
+            "mappings": [m.to_dict() for m in self.mappings],
+        }
+
+
+def config_hash(config: dict) -> str:
+    """
+    Hash a scan configuration for `Checkpoint`.
+
+    :param config: Settings that affect the scan results in a JSON-compatible format
+    :returns: Hash of the settings
+    """
+    content = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Checkpoint stores the progress of a scan in a file.
+
+    :param filename: Name of the checkpoint file. The file is loaded if it exists.
+    :param cluster: Name of the EKS cluster.
+        Checkpoints saved for other clusters are ignored.
+    :param config: Hash of the scan configuration from `config_hash`.
+        Checkpoints saved with another scan configuration are ignored,
+        because their progress may not match the current paths, rules, or filters.
+    :param save_interval: Minimum number of seconds between saving the checkpoint
+        when it's updated. See `Checkpoint#save` for saving it immediately.
+    """
+
+    def __init__(
+        self, filename: str, cluster: str, config: str = "", save_interval: float = 5.0
+    ) -> None:
+        self._filename = filename
+        self._header = {"version": VERSION, "cluster": cluster, "config": config}
+        self._save_interval = save_interval
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._log = _LOG.new(cluster=cluster, checkpoint=filename)
+        self._shards = self._load()
+
+    def _load(self) -> typing.Dict[str, ShardState]:
+        try:
+            with open(self._filename, encoding="utf-8") as fp:
+                contents = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        if any(contents.get(k, "") != v for k, v in self._header.items()):
+            self._log.warning("ignoring incompatible checkpoint")
+            return {}
+        self._log.info("resuming from checkpoint")
+        return {
+            key: ShardState.from_dict(shard)
+            for key, shard in contents.get("shards", {}).items()
+        }
+
+    def shard(self, key: str) -> ShardState:
+        """
+        Get the progress of a shard.
+
+        :param key: Key identifying the shard
+        :returns: Progress of the shard or an empty state if the shard hasn't been scanned
+        """
+        with self._lock:
+            return self._shards.get(key, ShardState())
+
+    def update(self, key: str, state: ShardState) -> None:
+        """
+        Update the progress of a shard.
+        The checkpoint is saved if enough time has passed since it was last saved.
+
+        :param key: Key identifying the shard
+        :param state: New progress of the shard
+        """
+        with self._lock:
+            self._shards[key] = state
+            if time.monotonic() - self._last_save >= self._save_interval:
+                self._save()
+
+    def save(self) -> None:
+        """ Save the checkpoint to the file """
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        contents = {
+            **self._header,
+            "shards": {key: shard.to_dict() for key, shard in self._shards.items()},
+        }
+        atomic_write(self._filename, json.dumps(contents, separators=(",", ":")))
+        self._last_save = time.monotonic()
+        self._log.debug("saved checkpoint")
+
+    def clear(self) -> None:
+        """ Remove the checkpoint file """
+        with self._lock:
+            self._shards = {}
+            try:
+                os.unlink(self._filename)
+            except FileNotFoundError:
+                pass
@@ -8,12 +8,16 @@ import boto3  # type: ignore
 import kubernetes  # type: ignore
 import structlog  # type: ignore
 from eks_auth_sync import _eks_auth
+from eks_auth_sync._aws import ClientRegistry
 
 _LOG = structlog.get_logger()
 
 
 def api_config(
-    session: boto3.Session, cluster: str, role_arn: typing.Optional[str],
+    session: boto3.Session,
+    cluster: str,
+    role_arn: typing.Optional[str],
+    clients: typing.Optional[ClientRegistry] = None,
 ) -> kubernetes.client.Configuration:
     """
     Create a Kubernetes client configuration for EKS.
@@ -21,13 +25,15 @@ def api_config(
     :param session: Boto3 session to use as a context for interacting with AWS
     :param cluster: Name of the EKS cluster
     :param role_arn: Optional IAM role ARN to assume as for the authentication
+    :param clients: Optional registry to get the AWS clients from
     :returns: A configuration object that can be used with the Kubernetes client to login to EKS.
 
     Note that this will write the cluster CA to a temporary file,
     because that's the only way it can be provided to the Kubernetes client.
     """
     log = _LOG.new(cluster=cluster)
-    eks_client = session.client("eks")
+    clients = clients or ClientRegistry(session)
+    eks_client = clients.client("eks")
     log.debug("fetching cluster details")
     eks_details = eks_client.describe_cluster(name=cluster)["cluster"]
     endpoint = eks_details["endpoint"]
@@ -37,7 +43,7 @@ def api_config(
     conf.host = endpoint
     log.debug("fetching auth token", role_arn=role_arn)
     conf.api_key["authorization"] = _eks_auth.get_token(
-        session=session, cluster=cluster, role_arn=role_arn,
+        session=session, cluster=cluster, role_arn=role_arn, clients=clients,
     )
     conf.api_key_prefix["authorization"] = "Bearer"
     conf.ssl_ca_cert = _save_eks_ca_cert(log, ca_data)
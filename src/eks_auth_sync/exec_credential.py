@@ -0,0 +1,218 @@
+"""
+Exec credentials for authenticating kubectl and other Kubernetes clients to EKS.
+
+Tokens and the credentials of the assumed roles are cached on disk until shortly
+before they expire, so repeated invocations don't need to call AWS at all.
+The cache is keyed by the AWS profile and access key ID in the environment,
+so switching between AWS identities doesn't return tokens of another identity.
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+import typing
+from eks_auth_sync import _files
+
+API_VERSION = "client.authentication.k8s.io/v1beta1"
+
+# Environment variable Kubernetes clients pass the ExecCredential request in
+EXEC_INFO_ENV = "KUBERNETES_EXEC_INFO"
+
+# EKS accepts tokens for 15 minutes. Like in AWS CLI, a minute is left as a margin.
+TOKEN_LIFETIME = 14 * 60
+
+# Cached tokens and credentials are not used when they expire sooner than this
+REFRESH_MARGIN = 60
+
+VERSION = 1
+
+
+class Token(typing.NamedTuple):
+    """
+    EKS authentication token.
+
+    :param token: Bearer token for the cluster
+    :param expiration: Time when the token expires in seconds since the epoch
+    """
+
+    token: str
+    expiration: float
+
+    def to_exec_credential(self, api_version: str = API_VERSION) -> dict:
+        """
+        Converts the token to an ExecCredential that can be printed to Kubernetes clients.
+
+        :param api_version: API version requested by the client. See `exec_api_version`.
+        """
+        expiration = datetime.datetime.fromtimestamp(
+            self.expiration, datetime.timezone.utc
+        )
+        return {
+            "kind": "ExecCredential",
+            "apiVersion": api_version,
+            "spec": {},
+            "status": {
+                "expirationTimestamp": expiration.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "token": self.token,
+            },
+        }
+
+
+def exec_api_version(environ: typing.Mapping[str, str] = os.environ) -> str:
+    """
+    Returns the ExecCredential API version requested by the Kubernetes client.
+
+    :param environ: Environment variables to read `KUBERNETES_EXEC_INFO` from
+    :returns: The API version of the request, or `API_VERSION` if the client didn't
+        send one.
+    """
+    try:
+        exec_info = json.loads(environ.get(EXEC_INFO_ENV) or "{}")
+    except ValueError:
+        return API_VERSION
+    api_version = exec_info.get("apiVersion") if isinstance(exec_info, dict) else None
+    return api_version if isinstance(api_version, str) and api_version else API_VERSION
+
+
+def default_cache_dir() -> str:
+    """
+    Returns the default directory for caching the tokens and credentials.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "eks-auth-sync")
+
+
+class TokenCache:
+    """
+    TokenCache fetches EKS tokens, and caches them along with the credentials of
+    the assumed roles in a directory.
+    AWS is called only when there's no cached token that is valid long enough.
+
+    :param directory: Directory to cache the tokens and credentials in.
+        If `None`, nothing is cached.
+    :param region_name: AWS region to use
+    :param clock: Function for getting the current time in seconds since the epoch
+    """
+
+    def __init__(
+        self,
+        directory: typing.Optional[str] = None,
+        region_name: typing.Optional[str] = None,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self._directory = directory
+        self._region_name = region_name
+        self._clock = clock
+        self._client_registry: typing.Any = None
+        self._identity = (
+            os.environ.get("AWS_PROFILE") or os.environ.get("AWS_DEFAULT_PROFILE"),
+            os.environ.get("AWS_ACCESS_KEY_ID"),
+        )
+        self.hits = 0
+
+    def token(self, cluster: str, role_arn: typing.Optional[str] = None) -> Token:
+        """
+        Get an authentication token for an EKS cluster.
+
+        :param cluster: Name of the EKS cluster
+        :param role_arn: Optional IAM role ARN to assume as for the authentication
+        :returns: A token that is valid for at least `REFRESH_MARGIN` seconds
+        """
+        key = ("token", cluster, role_arn, self._region_name) + self._identity
+        cached = self._load(key)
+        if cached is not None:
+            return Token(**cached)
+
+        # Imported here to keep the startup fast when the token is cached
+        from eks_auth_sync import _eks_auth  # pylint: disable=import-outside-toplevel
+
+        expiration = self._clock() + TOKEN_LIFETIME
+        credentials = None
+        if role_arn is not None:
+            credentials = self.credentials(role_arn)
+            expiration = min(expiration, credentials["Expiration"])
+        token = Token(
+            token=_eks_auth.get_token(
+                session=self._clients().session,
+                cluster=cluster,
+                role_arn=role_arn,
+                credentials=credentials,
+                clients=self._clients(),
+            ),
+            expiration=expiration,
+        )
+        self._save(key, token._asdict(), token.expiration)
+        return token
+
+    def credentials(self, role_arn: str) -> dict:
+        """
+        Get temporary credentials for an IAM role.
+
+        :param role_arn: IAM role ARN to assume
+        :returns: The credentials in the format returned by STS.
+            The expiration time is given in seconds since the epoch.
+        """
+        key = ("credentials", role_arn, self._region_name) + self._identity
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+
+        from eks_auth_sync import _eks_auth  # pylint: disable=import-outside-toplevel
+
+        clients = self._clients()
+        credentials = dict(_eks_auth.assume_role(clients.session, role_arn, clients))
+        credentials["Expiration"] = credentials["Expiration"].timestamp()
+        self._save(key, credentials, credentials["Expiration"])
+        return credentials
+
+    def _clients(self) -> typing.Any:
+        if self._client_registry is None:
+            # pylint: disable=import-outside-toplevel
+            import boto3  # type: ignore
+            from eks_auth_sync._aws import ClientRegistry
+
+            self._client_registry = ClientRegistry(
+                boto3.Session(region_name=self._region_name)
+            )
+        return self._client_registry
+
+    def _filename(self, key: tuple) -> str:
+        assert self._directory is not None
+        digest = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, f"{key[0]}-{digest[:32]}.json")
+
+    def _load(self, key: tuple) -> typing.Optional[dict]:
+        if self._directory is None:
+            return None
+        try:
+            with open(self._filename(key), encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != VERSION or data.get("key") != list(key):
+            return None
+        if data["expiration"] - REFRESH_MARGIN <= self._clock():
+            return None
+        self.hits += 1
+        return data["value"]
+
+    def _save(self, key: tuple, value: dict, expiration: float) -> None:
+        if self._directory is None:
+            return
+        os.makedirs(self._directory, mode=0o700, exist_ok=True)
+        # The temporary files used for the atomic writes are only readable by the owner
+        _files.atomic_write(
+            self._filename(key),
+            json.dumps(
+                {
+                    "version": VERSION,
+                    "key": list(key),
+                    "expiration": expiration,
+                    "value": value,
+                },
+                separators=(",", ":"),
+            ),
+        )
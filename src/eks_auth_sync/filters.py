@@ -0,0 +1,76 @@
+"""
+Filters for selecting which IAM users and roles are scanned for Kubernetes users.
+"""
+import fnmatch
+import re
+import typing
+
+# Path used by the AWS service-linked roles. These roles can't be tagged.
+SERVICE_ROLE_PATH_PREFIX = "/aws-service-role/"
+
+# Prefix for marking filter patterns as regular expressions instead of globs
+REGEX_PREFIX = "regex:"
+
+_Pattern = typing.Optional[typing.Pattern[str]]
+
+
+class PrincipalFilter:
+    """
+    Filter IAM users and roles by their name and path.
+
+    :param include_names: Only names matching at least one of these patterns are accepted
+    :param exclude_names: Names matching any of these patterns are rejected
+    :param include_paths: Only paths matching at least one of these patterns are accepted
+    :param exclude_paths: Paths matching any of these patterns are rejected
+    :param exclude_service_roles: If enabled, AWS service-linked roles are rejected
+
+    Patterns are globs (for example `eks-*`) unless they are prefixed with `regex:`.
+    In both cases the pattern must match the whole name or path.
+    """
+
+    def __init__(
+        self,
+        include_names: typing.Iterable[str] = (),
+        exclude_names: typing.Iterable[str] = (),
+        include_paths: typing.Iterable[str] = (),
+        exclude_paths: typing.Iterable[str] = (),
+        exclude_service_roles: bool = True,
+    ) -> None:
+        self._include_names = _compile(include_names)
+        self._exclude_names = _compile(exclude_names)
+        self._include_paths = _compile(include_paths)
+        self._exclude_paths = _compile(exclude_paths)
+        self._exclude_service_roles = exclude_service_roles
+
+    def accepts(self, name: str, path: str) -> bool:
+        """
+        Check whether an IAM user or role should be scanned.
+
+        :param name: Name of the IAM user or role
+        :param path: Path of the IAM user or role
+        :returns: `True` if the user or role passes the filter
+        """
+        if self._exclude_service_roles and path.startswith(SERVICE_ROLE_PATH_PREFIX):
+            return False
+        if self._include_names and not self._include_names.fullmatch(name):
+            return False
+        if self._include_paths and not self._include_paths.fullmatch(path):
+            return False
+        if self._exclude_names and self._exclude_names.fullmatch(name):
+            return False
+        if self._exclude_paths and self._exclude_paths.fullmatch(path):
+            return False
+        return True
+
+
+def _compile(patterns: typing.Iterable[str]) -> _Pattern:
+    regexes = [_to_regex(p) for p in patterns]
+    if not regexes:
+        return None
+    return re.compile("|".join(f"(?:{r})" for r in regexes))
+
+
+def _to_regex(pattern: str) -> str:
+    if pattern.startswith(REGEX_PREFIX):
+        return pattern[len(REGEX_PREFIX) :]
+    return fnmatch.translate(pattern)
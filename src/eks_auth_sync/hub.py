@@ -0,0 +1,351 @@
+"""
+Hub scans AWS periodically for many clusters and serves the results over HTTP.
+
+Each cluster's AWS auth is served from `/clusters/{cluster}/aws-auth` as JSON.
+Responses carry an ETag, and requests with a matching `If-None-Match` header
+get an empty "304 Not Modified" response.
+
+The hub is served over HTTPS, and the agents authenticate with a bearer token
+shared between the hub and the agents. The health check at `/healthz` doesn't
+require authentication.
+"""
+import hashlib
+import hmac
+import http.server
+import json
+import re
+import socketserver
+import ssl
+import threading
+import time
+import typing
+import urllib.parse
+import structlog  # type: ignore
+from eks_auth_sync.mapping import Mapping, to_aws_auth
+from eks_auth_sync.scanner import Scanner, TagCache
+from eks_auth_sync.store import ConflictPolicy
+
+_LOG = structlog.get_logger()
+
+_AWS_AUTH_PATH = re.compile(r"^/clusters/(?P<cluster>[^/]+)/aws-auth$")
+
+# Number of seconds a client has for completing the TLS handshake
+HANDSHAKE_TIMEOUT = 10.0
+
+
+class Document(typing.NamedTuple):
+    """
+    AWS auth served for a single cluster.
+
+    :param etag: ETag of the document. Changes whenever the body changes.
+    :param body: AWS auth in JSON format. See `Hub#refresh` for the format.
+    """
+
+    etag: str
+    body: bytes
+
+    @classmethod
+    def create(cls, cluster: str, mappings: typing.Collection[Mapping]) -> "Document":
+        """
+        Create a document from the mappings of a cluster.
+
+        :param cluster: Name of the EKS cluster
+        :param mappings: Mappings for the cluster
+        :returns: A document containing the mappings in AWS auth ConfigMap format
+        """
+        body = json.dumps(
+            {
+                "cluster": cluster,
+                "mappings": len(mappings),
+                "data": to_aws_auth(mappings).data,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return cls(etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', body=body)
+
+
+class Hub:  # pylint: disable=too-many-instance-attributes
+    """
+    Hub keeps the latest AWS auth for many clusters in memory.
+
+    :param scanners: Scanners by cluster name. The scanners must use the same AWS
+        account, since the IAM roles and users are listed once for all the clusters.
+    :param tag_cache: Tag cache shared by the scanners.
+        The cache is cleared at the start of every refresh,
+        so each IAM user and role is looked up once per refresh regardless of
+        the number of clusters.
+    :param roles_paths: Path prefixes to scan IAM roles from
+    :param users_paths: Path prefixes to scan IAM users from
+    :param concurrency: Maximum number of path prefixes to scan at the same time
+    :param extra_mappings: Mappings to include for all clusters in addition to
+        the scanned ones
+    :param conflict_policy: How to resolve conflicting mappings. See `MappingStore`.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        scanners: typing.Dict[str, Scanner],
+        tag_cache: TagCache,
+        roles_paths: typing.Iterable[str] = (),
+        users_paths: typing.Iterable[str] = (),
+        concurrency: int = 4,
+        extra_mappings: typing.Iterable[Mapping] = (),
+        conflict_policy: ConflictPolicy = ConflictPolicy.Warn,
+    ) -> None:
+        self._scanners = scanners
+        self._tag_cache = tag_cache
+        self._roles_paths = list(roles_paths)
+        self._users_paths = list(users_paths)
+        self._concurrency = concurrency
+        self._extra_mappings = list(extra_mappings)
+        self._conflict_policy = conflict_policy
+        self._lock = threading.Lock()
+        self._documents: typing.Dict[str, Document] = {}
+
+    def document(self, cluster: str) -> typing.Optional[Document]:
+        """
+        Get the latest AWS auth for a cluster.
+
+        :param cluster: Name of the EKS cluster
+        :returns: The AWS auth document or `None` if the cluster hasn't been scanned yet
+        """
+        with self._lock:
+            return self._documents.get(cluster)
+
+    def refresh(self) -> None:
+        """
+        Scan AWS for all the clusters.
+
+        The IAM roles and users are listed once, and each cluster's tags and rules
+        are evaluated against the same listing.
+        Clusters that fail to be scanned keep serving their previous AWS auth.
+        The AWS auth is served in JSON format with the following fields:
+
+        * `cluster`: Name of the EKS cluster
+        * `mappings`: Number of mappings found for the cluster
+        * `data`: The data for the aws-auth ConfigMap
+        """
+        if not self._scanners:
+            return
+        self._tag_cache.clear()
+        try:
+            listing = next(iter(self._scanners.values())).list_principals(
+                roles_paths=self._roles_paths,
+                users_paths=self._users_paths,
+                concurrency=self._concurrency,
+            )
+        except Exception:  # pylint: disable=broad-except
+            _LOG.exception("failed to list iam roles and users")
+            return
+
+        for cluster, scnr in self._scanners.items():
+            log = _LOG.new(cluster=cluster)
+            try:
+                result = scnr.map_principals(
+                    listing,
+                    concurrency=self._concurrency,
+                    conflict_policy=self._conflict_policy,
+                    extra_mappings=self._extra_mappings,
+                )
+            except Exception:  # pylint: disable=broad-except
+                log.exception("failed to scan cluster")
+                continue
+            document = Document.create(cluster, result.mappings)
+            with self._lock:
+                previous = self._documents.get(cluster)
+                self._documents[cluster] = document
+            if previous is None or previous.etag != document.etag:
+                log.info("aws auth changed", etag=document.etag)
+
+    def run_refresh_loop(self, interval: float) -> None:
+        """
+        Refresh the AWS auth periodically forever.
+
+        :param interval: Number of seconds between the start of each refresh
+        """
+        while True:
+            start = time.monotonic()
+            self.refresh()
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+
+class _HubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    HTTP server that makes the TLS handshake in the request thread, so a client
+    stalling the handshake doesn't stop the server from accepting other clients.
+    """
+
+    daemon_threads = True
+    hub: Hub
+    token: str
+    ssl_context: typing.Optional[ssl.SSLContext] = None
+    handshake_timeout = HANDSHAKE_TIMEOUT
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        if self.ssl_context:
+            request = self.ssl_context.wrap_socket(
+                request, server_side=True, do_handshake_on_connect=False
+            )
+        return request, client_address
+
+    def finish_request(self, request, client_address):
+        if isinstance(request, ssl.SSLSocket):
+            request.settimeout(self.handshake_timeout)
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError) as err:
+                _LOG.debug(
+                    "tls handshake failed", client=client_address[0], error=str(err)
+                )
+                return
+            request.settimeout(None)
+        super().finish_request(request, client_address)
+
+
+class _HubRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: _HubServer
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ Serve the AWS auth documents and the health check """
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/healthz":
+            self._respond(200, b"ok", content_type="text/plain")
+            return
+
+        if not self._authorized():
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", "Bearer")
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "12")
+            self.end_headers()
+            self.wfile.write(b"unauthorized")
+            return
+
+        match = _AWS_AUTH_PATH.match(path)
+        document = (
+            self.server.hub.document(urllib.parse.unquote(match.group("cluster")))
+            if match
+            else None
+        )
+        if document is None:
+            self._respond(404, b"not found", content_type="text/plain")
+        elif _etag_matches(self.headers.get("If-None-Match"), document.etag):
+            self._respond(304, b"", etag=document.etag)
+        else:
+            self._respond(200, document.body, etag=document.etag)
+
+    def _authorized(self) -> bool:
+        scheme, _, credentials = self.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            credentials.strip().encode("utf-8"), self.server.token.encode("utf-8")
+        )
+
+    def _respond(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json",
+        etag: typing.Optional[str] = None,
+    ) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        _LOG.debug("http request", client=self.address_string(), request=format % args)
+
+
+def _etag_matches(header: typing.Optional[str], etag: str) -> bool:
+    """
+    Check an `If-None-Match` header against an ETag using weak comparison.
+
+    :param header: Value of the `If-None-Match` header
+    :param etag: Current ETag of the document
+    :returns: `True` if any of the ETags in the header matches or the header is `*`
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in header.split(","))
+
+
+def create_server(
+    hub: Hub,
+    address: str,
+    port: int,
+    token: str,
+    ssl_context: typing.Optional[ssl.SSLContext] = None,
+) -> http.server.HTTPServer:
+    """
+    Create an HTTPS server for serving the AWS auth from the hub.
+
+    :param hub: Hub to serve the AWS auth from
+    :param address: Address to listen to
+    :param port: Port to listen to. Use 0 to pick any free port.
+    :param token: Bearer token the agents must present
+    :param ssl_context: TLS settings of the server.
+        Without it, the server is plain HTTP, which is only meant for tests.
+    :returns: HTTP server that is ready to be started with `serve_forever`
+    """
+    if not token:
+        raise ValueError("Hub token must not be empty")
+    server = _HubServer((address, port), _HubRequestHandler)
+    server.ssl_context = ssl_context
+    server.hub = hub
+    server.token = token
+    return server
+
+
+def server_ssl_context(cert_file: str, key_file: str) -> ssl.SSLContext:
+    """
+    Create the TLS settings for serving the hub.
+
+    :param cert_file: Name of the PEM file containing the server certificate chain
+    :param key_file: Name of the PEM file containing the private key
+    :returns: TLS settings for `create_server`
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+def serve(  # pylint: disable=too-many-arguments
+    hub: Hub,
+    address: str,
+    port: int,
+    interval: float,
+    token: str,
+    ssl_context: ssl.SSLContext,
+) -> None:
+    """
+    Refresh the hub periodically, and serve the AWS auth over HTTPS forever.
+
+    :param hub: Hub to serve the AWS auth from
+    :param address: Address to listen to
+    :param port: Port to listen to
+    :param interval: Number of seconds between the start of each refresh
+    :param token: Bearer token the agents must present
+    :param ssl_context: TLS settings of the server. See `server_ssl_context`.
+    """
+    server = create_server(hub, address, port, token, ssl_context)
+    refresher = threading.Thread(
+        target=hub.run_refresh_loop, args=(interval,), daemon=True
+    )
+    refresher.start()
+    _LOG.info("serving aws auth", address=address, port=port)
+    server.serve_forever()
@@ -1,10 +1,33 @@
 """
 Functionality for interacting with Kubernetes
 """
+import concurrent.futures
+import hashlib
+import typing
 import kubernetes  # type: ignore
 import structlog  # type: ignore
+import yaml
+from eks_auth_sync.mapping import Mapping
 
 AWS_AUTH_NAMESPACE = "kube-system"
+AWS_AUTH_NAME = "aws-auth"
+
+# aws-iam-authenticator IAMIdentityMapping custom resource
+IAM_IDENTITY_MAPPING_GROUP = "iamauthenticator.k8s.aws"
+IAM_IDENTITY_MAPPING_VERSION = "v1alpha1"
+IAM_IDENTITY_MAPPING_PLURAL = "iamidentitymappings"
+IAM_IDENTITY_MAPPING_KIND = "IAMIdentityMapping"
+
+# Label for marking the custom resources managed by this app
+MANAGED_BY_LABEL = "app.kubernetes.io/managed-by"
+MANAGED_BY = "eks-auth-sync"
+
+# Number of times to try merging mappings to the aws-auth ConfigMap
+# when it's changed concurrently
+MERGE_ATTEMPTS = 5
+
+# aws-auth ConfigMap fields and the ARN field of their entries
+_AWS_AUTH_FIELDS = (("mapRoles", "rolearn"), ("mapUsers", "userarn"))
 
 _LOG = structlog.get_logger()
 
@@ -36,3 +59,274 @@ def update_aws_auth_configmap(
             v1_api.create_namespaced_config_map(namespace=AWS_AUTH_NAMESPACE, body=body)
         else:
             raise
+
+
+def merge_aws_auth_configmap(
+    client: kubernetes.client.ApiClient,
+    mappings: typing.Iterable[Mapping],
+    attempts: int = MERGE_ATTEMPTS,
+) -> int:
+    """
+    Add or update the given mappings in the AWS auth ConfigMap.
+    Unlike `update_aws_auth_configmap`, the other entries in the ConfigMap are kept.
+    If the ConfigMap doesn't exist, it's created.
+
+    :param client: Kubernetes client to use
+    :param mappings: Mappings to add or update by IAM user/role ARN
+    :param attempts: Number of times to try the update
+    :returns: Number of entries added or changed
+
+    The ConfigMap is replaced using the `resourceVersion` it was read with.
+    When the ConfigMap is changed by someone else in between,
+    the update fails with a conflict, and the mappings are merged again.
+    """
+    log = _LOG.new(k8s_host=client.configuration.host)
+    v1_api = kubernetes.client.CoreV1Api(client)
+    entries = {m.arn: m.to_aws_auth_entry() for m in mappings}
+
+    for attempt in range(1, attempts + 1):
+        configmap = read_aws_auth_configmap(client)
+        data, changed = _merge_aws_auth_data(
+            (configmap.data if configmap else None) or {}, entries
+        )
+        if not changed:
+            log.debug("aws-auth configmap already has the mappings")
+            return 0
+        try:
+            if configmap is None:
+                log.debug("creating new aws-auth configmap", changed=changed)
+                v1_api.create_namespaced_config_map(
+                    namespace=AWS_AUTH_NAMESPACE,
+                    body=kubernetes.client.V1ConfigMap(
+                        metadata={"name": AWS_AUTH_NAME}, data=data
+                    ),
+                )
+            else:
+                log.debug("merging mappings to aws-auth configmap", changed=changed)
+                configmap.data = data
+                v1_api.replace_namespaced_config_map(
+                    name=AWS_AUTH_NAME, namespace=AWS_AUTH_NAMESPACE, body=configmap
+                )
+            return changed
+        except kubernetes.client.rest.ApiException as err:
+            if err.status != 409 or attempt == attempts:
+                raise
+            log.debug("aws-auth configmap changed concurrently. retrying.")
+    raise ValueError(f"Invalid number of attempts: {attempts}")
+
+
+def _merge_aws_auth_data(
+    data: typing.Dict[str, str], entries: typing.Dict[str, dict]
+) -> typing.Tuple[typing.Dict[str, str], int]:
+    """ Upsert entries to the aws-auth data. Returns the new data and the change count """
+    merged = dict(data)
+    changed = 0
+    for field, arn_field in _AWS_AUTH_FIELDS:
+        pending = {arn: e for arn, e in entries.items() if arn_field in e}
+        if not pending:
+            continue
+        field_entries = yaml.load(data.get(field) or "[]", yaml.SafeLoader) or []
+        for i, entry in enumerate(field_entries):
+            new_entry = pending.pop(entry.get(arn_field), None)
+            if new_entry is not None and new_entry != entry:
+                field_entries[i] = new_entry
+                changed += 1
+        field_entries.extend(pending.values())
+        changed += len(pending)
+        merged[field] = yaml.dump(field_entries)
+    return merged, changed
+
+
+def read_aws_auth_configmap(
+    client: kubernetes.client.ApiClient,
+) -> typing.Optional[kubernetes.client.V1ConfigMap]:
+    """
+    Read the AWS auth ConfigMap from Kubernetes.
+
+    :param client: Kubernetes client to use
+    :returns: The current aws-auth ConfigMap or `None` if it doesn't exist
+    """
+    log = _LOG.new(k8s_host=client.configuration.host)
+    v1_api = kubernetes.client.CoreV1Api(client)
+    try:
+        log.debug("reading aws-auth configmap")
+        return v1_api.read_namespaced_config_map(
+            name=AWS_AUTH_NAME, namespace=AWS_AUTH_NAMESPACE
+        )
+    except kubernetes.client.rest.ApiException as err:
+        if err.status == 404:
+            return None
+        raise
+
+
+class IdentityMappingChanges(typing.NamedTuple):
+    """
+    Number of IAMIdentityMapping resources changed.
+
+    :param created: Resources created for new IAM users and roles
+    :param updated: Resources updated for changed mappings
+    :param deleted: Resources deleted for IAM users and roles no longer mapped
+    """
+
+    created: int
+    updated: int
+    deleted: int
+
+
+def sync_iam_identity_mappings(
+    client: kubernetes.client.ApiClient,
+    mappings: typing.Iterable[Mapping],
+    concurrency: int = 4,
+) -> IdentityMappingChanges:
+    """
+    Synchronize mappings to aws-iam-authenticator IAMIdentityMapping resources.
+
+    :param client: Kubernetes client to use
+    :param mappings: The mappings the cluster should have
+    :param concurrency: Maximum number of resources to change at the same time
+    :returns: Number of resources changed
+
+    Only the resources labeled as managed by this app are changed or deleted.
+    IAM users and roles already mapped by other resources are skipped.
+    The existing resources are listed once, and only the resources that differ
+    from the mappings are changed.
+    """
+    log = _LOG.new(k8s_host=client.configuration.host)
+    api = kubernetes.client.CustomObjectsApi(client)
+
+    log.debug("listing iam identity mappings")
+    diff = _diff_identity_mappings(
+        api.list_cluster_custom_object(
+            IAM_IDENTITY_MAPPING_GROUP,
+            IAM_IDENTITY_MAPPING_VERSION,
+            IAM_IDENTITY_MAPPING_PLURAL,
+        ).get("items", []),
+        mappings,
+        log,
+    )
+
+    def create(spec: dict) -> None:
+        body = {
+            "apiVersion": f"{IAM_IDENTITY_MAPPING_GROUP}/{IAM_IDENTITY_MAPPING_VERSION}",
+            "kind": IAM_IDENTITY_MAPPING_KIND,
+            "metadata": {
+                "name": _identity_mapping_name(spec["arn"]),
+                "labels": {MANAGED_BY_LABEL: MANAGED_BY},
+            },
+            "spec": spec,
+        }
+        api.create_cluster_custom_object(
+            IAM_IDENTITY_MAPPING_GROUP,
+            IAM_IDENTITY_MAPPING_VERSION,
+            IAM_IDENTITY_MAPPING_PLURAL,
+            body,
+        )
+
+    def update(name_and_spec: typing.Tuple[str, dict]) -> None:
+        name, spec = name_and_spec
+        api.patch_cluster_custom_object(
+            IAM_IDENTITY_MAPPING_GROUP,
+            IAM_IDENTITY_MAPPING_VERSION,
+            IAM_IDENTITY_MAPPING_PLURAL,
+            name,
+            {"spec": spec},
+        )
+
+    def delete(name: str) -> None:
+        api.delete_cluster_custom_object(
+            IAM_IDENTITY_MAPPING_GROUP,
+            IAM_IDENTITY_MAPPING_VERSION,
+            IAM_IDENTITY_MAPPING_PLURAL,
+            name,
+            kubernetes.client.V1DeleteOptions(),
+        )
+
+    log.debug(
+        "applying iam identity mapping changes",
+        created=len(diff.to_create),
+        updated=len(diff.to_update),
+        deleted=len(diff.to_delete),
+    )
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, concurrency)
+    ) as executor:
+        futures = [executor.submit(create, spec) for spec in diff.to_create]
+        futures += [executor.submit(update, change) for change in diff.to_update]
+        futures += [executor.submit(delete, name) for name in diff.to_delete]
+        for future in futures:
+            future.result()
+
+    return IdentityMappingChanges(
+        created=len(diff.to_create),
+        updated=len(diff.to_update),
+        deleted=len(diff.to_delete),
+    )
+
+
+class _IdentityMappingDiff(typing.NamedTuple):
+    to_create: typing.List[dict]
+    to_update: typing.List[typing.Tuple[str, dict]]
+    to_delete: typing.List[str]
+
+
+def _diff_identity_mappings(
+    items: typing.List[dict], mappings: typing.Iterable[Mapping], log: typing.Any
+) -> _IdentityMappingDiff:
+    """
+    Find the IAMIdentityMapping resources to create, update and delete.
+
+    :param items: The existing resources
+    :param mappings: The mappings the cluster should have
+    :param log: Logger for the skipped mappings
+    :returns: Specs of the resources to create, names and specs of the resources
+        to update, and names of the resources to delete
+
+    When many managed resources map the same ARN, the one named after the ARN
+    is kept and the others are deleted.
+    """
+    managed: typing.Dict[str, typing.List[dict]] = {}
+    unmanaged: typing.Set[str] = set()
+    for item in items:
+        labels = item["metadata"].get("labels") or {}
+        if labels.get(MANAGED_BY_LABEL) == MANAGED_BY:
+            managed.setdefault(item["spec"]["arn"], []).append(item)
+        else:
+            unmanaged.add(item["spec"]["arn"])
+
+    desired: typing.Dict[str, dict] = {}
+    for mapping in mappings:
+        if mapping.arn in unmanaged:
+            log.warning("skipping arn mapped by an unmanaged resource", arn=mapping.arn)
+        else:
+            desired[mapping.arn] = _identity_mapping_spec(mapping)
+
+    diff = _IdentityMappingDiff([], [], [])
+    for arn, spec in desired.items():
+        if arn not in managed:
+            diff.to_create.append(spec)
+    for arn, arn_items in managed.items():
+        arn_items.sort(
+            key=lambda item: (
+                item["metadata"]["name"] != _identity_mapping_name(item["spec"]["arn"]),
+                item["metadata"]["name"],
+            )
+        )
+        if arn in desired:
+            kept = arn_items.pop(0)
+            if kept["spec"] != desired[arn]:
+                diff.to_update.append((kept["metadata"]["name"], desired[arn]))
+        diff.to_delete.extend(item["metadata"]["name"] for item in arn_items)
+    return diff
+
+
+def _identity_mapping_spec(mapping: Mapping) -> dict:
+    entry = mapping.to_aws_auth_entry()
+    return {
+        "arn": mapping.arn,
+        "username": entry["username"],
+        "groups": list(entry["groups"]),
+    }
+
+
+def _identity_mapping_name(arn: str) -> str:
+    return f"{MANAGED_BY}-{hashlib.sha256(arn.encode('utf-8')).hexdigest()[:20]}"
@@ -44,6 +44,20 @@ class MappingType(enum.Enum):
         raise ValueError(f"Invalid IAM type: {mapping_type_str}")
 
 
+class MappingSource(enum.Enum):
+    """
+    Describes where a mapping was found from.
+
+    * Tag: IAM user or role tags
+    * Rule: Rules matching the IAM user or role name and path
+    * File: A file containing the mappings
+    """
+
+    Tag = "tag"
+    Rule = "rule"
+    File = "file"
+
+
 class Mapping(typing.NamedTuple):
     """
     Mapping describes a common mapping format from IAM users and roles to Kubernetes users.
@@ -51,13 +65,15 @@ class Mapping(typing.NamedTuple):
     :param arn: IAM user/role ARN string
     :param mapping_type: Describes the mapping from AWS IAM user or role to a user in Kubernetes.
     :param username: Kubernetes username for the IAM user/role
-    :param groups: A list of groups for the Kubernetes user
+    :param groups: Groups for the Kubernetes user
+    :param source: Where the mapping was found from
     """
 
     arn: str
     mapping_type: MappingType
     username: str
-    groups: typing.List[str]
+    groups: typing.Sequence[str]
+    source: MappingSource = MappingSource.Tag
 
     @classmethod
     def from_dict(cls, dictionary: dict) -> "Mapping":
@@ -73,14 +89,31 @@ class Mapping(typing.NamedTuple):
            See `MappingType#from_string` for more information.
         * `username`: Kubernetes username in string format
         * `groups`: A list of groups for the Kubernetes user
+        * `source`: Optional source of the mapping. Default: tag
         """
         return cls(
             arn=dictionary["arn"],
             mapping_type=MappingType.from_string(dictionary["mapping_type"]),
             username=dictionary["username"],
             groups=dictionary["groups"],
+            source=MappingSource(dictionary.get("source", MappingSource.Tag.value)),
         )
 
+    def to_dict(self) -> dict:
+        """
+        Converts the mapping to a dictionary.
+        This is the inverse of `Mapping#from_dict`.
+
+        :returns: Mapping contents in dictionary format
+        """
+        return {
+            "arn": self.arn,
+            "mapping_type": self.mapping_type.value,
+            "username": self.username,
+            "groups": list(self.groups),
+            "source": self.source.value,
+        }
+
     @property
     def is_iam_user_mapping(self) -> bool:
         """ Returns `True` if the mapping is for an IAM user """
@@ -101,13 +134,13 @@ class Mapping(typing.NamedTuple):
             return {
                 "userarn": self.arn,
                 "username": self.username,
-                "groups": self.groups,
+                "groups": list(self.groups),
             }
         if self.mapping_type == MappingType.RoleToUser:
             return {
                 "rolearn": self.arn,
                 "username": self.username,
-                "groups": self.groups,
+                "groups": list(self.groups),
             }
         if self.mapping_type == MappingType.RoleToNode:
             return {
@@ -118,11 +151,26 @@ class Mapping(typing.NamedTuple):
         raise NotImplementedError("Unexpected condition")
 
 
-def to_aws_auth(mappings: typing.List[Mapping]) -> V1ConfigMap:
+def from_file(filename: str) -> typing.List[Mapping]:
+    """
+    Load mappings from a YAML file.
+
+    :param filename: Name of the file containing a list of mappings.
+        See `Mapping#from_dict` for the format of each mapping.
+    :returns: Mappings found from the file
+    """
+    with open(filename, encoding="utf-8") as fp:
+        dictionaries = yaml.load(fp, Loader=yaml.SafeLoader) or []
+    return [
+        Mapping.from_dict(d)._replace(source=MappingSource.File) for d in dictionaries
+    ]
+
+
+def to_aws_auth(mappings: typing.Collection[Mapping]) -> V1ConfigMap:
     """
-    Converts the given list of mappings to a AWS auth ConfigMap.
+    Converts the given mappings to a AWS auth ConfigMap.
 
-    :param mappings: list of mappings
+    :param mappings: A list or a `MappingStore` of mappings
     :returns: a ConfigMap containing the mappings in AWS auth format.
     """
     return V1ConfigMap(
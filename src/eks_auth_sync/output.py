@@ -0,0 +1,89 @@
+"""
+Output formats for the mappings found.
+"""
+import json
+import threading
+import typing
+import yaml
+
+if typing.TYPE_CHECKING:
+    # Not imported at runtime to keep the CLI argument parsing light
+    from eks_auth_sync.mapping import Mapping
+
+YAML = "yaml"
+JSON = "json"
+NDJSON = "ndjson"
+FORMATS = (YAML, JSON, NDJSON)
+
+
+def to_record(mapping: "Mapping") -> dict:
+    """
+    Converts the mapping to a machine-readable record.
+
+    :param mapping: Mapping to convert
+    :returns: The mapping ARN, type, Kubernetes username and groups,
+        and where the mapping was found from in dictionary format.
+    """
+    return {
+        "arn": mapping.arn,
+        "type": mapping.mapping_type.value,
+        "username": mapping.username,
+        "groups": list(mapping.groups),
+        "source": mapping.source.value,
+    }
+
+
+def write(
+    output_format: str, mappings: typing.List["Mapping"], stream: typing.TextIO
+) -> None:
+    """
+    Write all the given mappings to a stream.
+
+    :param output_format: One of the formats listed in `FORMATS`
+    :param mappings: Mappings to write
+    :param stream: Stream to write to
+
+    The YAML format contains the mappings as AWS auth entries,
+    while the JSON and NDJSON formats contain the mappings as records.
+    See `to_record` for more information.
+    """
+    if output_format == YAML:
+        stream.write(yaml.dump([m.to_aws_auth_entry() for m in mappings]))
+    elif output_format == JSON:
+        json.dump([to_record(m) for m in mappings], stream, separators=(",", ":"))
+        stream.write("\n")
+    elif output_format == NDJSON:
+        writer = NdjsonWriter(stream)
+        for mapping in mappings:
+            writer.write(mapping)
+    else:
+        raise ValueError(f"Invalid output format: {output_format}")
+
+
+class NdjsonWriter:
+    """
+    Writes mappings to a stream as newline-delimited JSON records as they are found.
+    Each IAM user and role is written only once. See `to_record` for the record format.
+
+    :param stream: Stream to write to
+    """
+
+    def __init__(self, stream: typing.TextIO) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._written: typing.Set[str] = set()
+
+    def write(self, mapping: "Mapping") -> None:
+        """
+        Write a single mapping to the stream.
+        This method is safe to call from multiple threads.
+
+        :param mapping: Mapping to write
+        """
+        line = json.dumps(to_record(mapping), separators=(",", ":")) + "\n"
+        with self._lock:
+            if mapping.arn in self._written:
+                return
+            self._written.add(mapping.arn)
+            self._stream.write(line)
+            self._stream.flush()
@@ -0,0 +1,114 @@
+"""
+Plan describes the changes an update would make to the AWS auth ConfigMap.
+"""
+import typing
+import yaml
+from kubernetes.client import V1ConfigMap  # type: ignore
+from eks_auth_sync.mapping import Mapping
+
+
+class Change(typing.NamedTuple):
+    """
+    Change to a single AWS auth entry.
+
+    :param arn: IAM user/role ARN string
+    :param before: The current AWS auth entry or `None` if the entry is added
+    :param after: The new AWS auth entry or `None` if the entry is removed
+    """
+
+    arn: str
+    before: typing.Optional[dict]
+    after: typing.Optional[dict]
+
+
+class Plan(typing.NamedTuple):
+    """
+    Changes an update would make to the AWS auth ConfigMap.
+
+    :param added: Entries for IAM users and roles not in the current ConfigMap
+    :param removed: Entries in the current ConfigMap that are no longer mapped
+    :param changed: Entries that are mapped differently
+    """
+
+    added: typing.List[Change]
+    removed: typing.List[Change]
+    changed: typing.List[Change]
+
+    @property
+    def has_changes(self) -> bool:
+        """ Returns `True` if the update would change the ConfigMap """
+        return bool(self.added or self.removed or self.changed)
+
+    def format(self) -> str:
+        """
+        Formats the plan in a human-readable format.
+
+        :returns: A line for each change and a summary line
+        """
+        lines = [f"+ {c.arn} {_format_entry(c.after)}" for c in self.added]
+        lines += [f"- {c.arn} {_format_entry(c.before)}" for c in self.removed]
+        lines += [
+            f"~ {c.arn} {_format_entry(c.before)} -> {_format_entry(c.after)}"
+            for c in self.changed
+        ]
+        lines.append(
+            f"{len(self.added)} to add, {len(self.changed)} to change, "
+            f"{len(self.removed)} to remove."
+        )
+        return "\n".join(lines)
+
+
+def configmap_entries(
+    configmap: typing.Optional[V1ConfigMap],
+) -> typing.Dict[str, dict]:
+    """
+    Read the AWS auth entries from an AWS auth ConfigMap.
+
+    :param configmap: The AWS auth ConfigMap or `None` if it doesn't exist
+    :returns: AWS auth entries by IAM user/role ARN
+    """
+    if configmap is None or not configmap.data:
+        return {}
+    entries: typing.Dict[str, dict] = {}
+    for field, arn_field in (("mapRoles", "rolearn"), ("mapUsers", "userarn")):
+        field_entries = yaml.load(configmap.data.get(field) or "[]", yaml.SafeLoader)
+        for entry in field_entries or []:
+            entries[entry[arn_field]] = entry
+    return entries
+
+
+def create(
+    configmap: typing.Optional[V1ConfigMap], mappings: typing.Iterable[Mapping]
+) -> Plan:
+    """
+    Compare the AWS auth ConfigMap against the mappings.
+
+    :param configmap: The current AWS auth ConfigMap or `None` if it doesn't exist
+    :param mappings: Mappings the ConfigMap should be updated with
+    :returns: Changes an update with the mappings would make to the ConfigMap
+    """
+    current = configmap_entries(configmap)
+    desired = {m.arn: m.to_aws_auth_entry() for m in mappings}
+    return Plan(
+        added=[
+            Change(arn, None, entry)
+            for arn, entry in desired.items()
+            if arn not in current
+        ],
+        removed=[
+            Change(arn, entry, None)
+            for arn, entry in current.items()
+            if arn not in desired
+        ],
+        changed=[
+            Change(arn, current[arn], entry)
+            for arn, entry in desired.items()
+            if arn in current and current[arn] != entry
+        ],
+    )
+
+
+def _format_entry(entry: typing.Optional[dict]) -> str:
+    if entry is None:
+        return ""
+    return f"username={entry.get('username', '')} groups={','.join(entry.get('groups', []))}"
@@ -0,0 +1,330 @@
+"""
+Query index for looking up the mappings saved in snapshots without scanning AWS.
+
+The index is saved next to the snapshot file it was built from.
+It contains the offsets of the snapshot's mappings and IAM user/role details
+in the snapshot file, and the mappings' positions by IAM user/role ARN,
+Kubernetes username and Kubernetes group. A lookup is a couple of dictionary
+lookups, and only the matching mappings are decoded from the snapshot.
+"""
+import json
+import os
+import re
+import typing
+import structlog  # type: ignore
+from eks_auth_sync._files import atomic_write
+
+_LOG = structlog.get_logger()
+
+# Version of the index file format
+VERSION = 2
+
+# Version of the snapshot file format the index is built from.
+# Same as `snapshot.VERSION`, which isn't imported to keep the query command fast.
+_SNAPSHOT_VERSION = 1
+
+# Criteria the mappings can be queried by
+KEYS = ("arn", "username", "group", "cluster")
+
+_ROLE_TO_NODE = "role-to-node"
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_Positions = typing.Dict[str, typing.Dict[str, typing.List[int]]]
+
+
+def index_filename(snapshot_filename: str) -> str:
+    """
+    Name of the index file for a snapshot.
+
+    :param snapshot_filename: Name of the snapshot file
+    :returns: Name of the index file next to the snapshot file
+    """
+    return f"{snapshot_filename}.index"
+
+
+class QueryIndex:
+    """
+    Index of the mappings found in a scan.
+
+    :param cluster: Name of the EKS cluster the snapshot was made for
+    :param offsets: Offsets of each mapping and the details of its IAM user or role
+        in the snapshot file. The details are `None` when the snapshot doesn't have them.
+    :param positions: Positions of the mappings in `offsets`
+        by ARN, Kubernetes username and Kubernetes group
+    :param source: Modification time and size of the snapshot file
+        the index was built from
+    """
+
+    def __init__(
+        self,
+        cluster: str,
+        offsets: typing.List[typing.List[typing.Optional[int]]],
+        positions: _Positions,
+        source: typing.Optional[typing.List[int]] = None,
+    ) -> None:
+        self.cluster = cluster
+        self.offsets = offsets
+        self.positions = positions
+        self.source = source
+        self._snapshot_filename: typing.Optional[str] = None
+        self._text: typing.Optional[str] = None
+
+    @classmethod
+    def build(cls, snapshot_filename: str) -> "QueryIndex":
+        """
+        Build an index from a snapshot file.
+
+        :param snapshot_filename: Name of the snapshot file saved by the sync command
+        :returns: Index of the mappings in the snapshot
+
+        Throws ValueError when the snapshot was saved using an unsupported
+        format version.
+        """
+        source, text = _read(snapshot_filename)
+        members, _ = _members(text, _skip(text, 0), walk=("mappings", "principals"))
+        contents = {key: value for key, _, value in members}
+        if contents.get("version") != _SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version in {snapshot_filename}: "
+                f"{contents.get('version')}"
+            )
+        principals = {arn: offset for arn, offset, _ in contents.get("principals", [])}
+        offsets: typing.List[typing.List[typing.Optional[int]]] = [
+            [offset, principals.get(mapping["arn"])]
+            for _, offset, mapping in contents["mappings"]
+        ]
+        positions = _positions([mapping for _, _, mapping in contents["mappings"]])
+
+        index = cls(contents["cluster"], offsets, positions, source)
+        index._snapshot_filename = snapshot_filename
+        index._text = text
+        return index
+
+    @classmethod
+    def open(cls, snapshot_filename: str) -> "QueryIndex":
+        """
+        Load the index of a snapshot.
+        When the index is missing or older than the snapshot,
+        it's rebuilt from the snapshot and saved if the directory is writable.
+
+        :param snapshot_filename: Name of the snapshot file
+        :returns: Index of the mappings in the snapshot
+        """
+        source = _file_version(snapshot_filename)
+        filename = index_filename(snapshot_filename)
+        try:
+            index = cls.load(filename)
+            if index.source == source:
+                index._snapshot_filename = snapshot_filename
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = cls.build(snapshot_filename)
+        try:
+            index.save(filename)
+        except OSError as err:
+            _LOG.warning(
+                "failed to save query index. continuing without saving.",
+                filename=filename,
+                error=str(err),
+            )
+        return index
+
+    @classmethod
+    def load(cls, filename: str) -> "QueryIndex":
+        """
+        Load an index from a file.
+
+        :param filename: Name of the index file
+        :returns: The index stored in the file
+
+        Throws ValueError when the file was saved using an unsupported format version.
+        """
+        with open(filename, encoding="utf-8") as fp:
+            contents = json.load(fp)
+        if contents.get("version") != VERSION:
+            raise ValueError(
+                f"Unsupported index version in {filename}: {contents.get('version')}"
+            )
+        return cls(
+            cluster=contents["cluster"],
+            offsets=contents["offsets"],
+            positions=contents["positions"],
+            source=contents.get("source"),
+        )
+
+    def save(self, filename: str) -> None:
+        """
+        Save the index to a file atomically.
+
+        :param filename: Name of the index file
+        """
+        contents = {
+            "version": VERSION,
+            "source": self.source,
+            "cluster": self.cluster,
+            "offsets": self.offsets,
+            "positions": self.positions,
+        }
+        atomic_write(filename, json.dumps(contents, separators=(",", ":")))
+
+    def save_for(self, snapshot_filename: str) -> None:
+        """
+        Save the index next to the snapshot file it was built from.
+
+        :param snapshot_filename: Name of the snapshot file
+        """
+        self.save(index_filename(snapshot_filename))
+
+    def query(self, **criteria: typing.Optional[str]) -> typing.List[dict]:
+        """
+        Find mappings matching all the given criteria.
+
+        :param criteria: Values to look up by key. See `KEYS` for the keys.
+            Criteria with the value `None` are ignored.
+        :returns: Matching mappings as records in the order they were found
+            in the scan. Each record contains the cluster, the IAM user/role ARN,
+            the mapping type and source, the Kubernetes username and groups as they
+            appear in AWS auth, and the details of the IAM user or role.
+        """
+        matches: typing.Optional[typing.Set[int]] = None
+        for key, value in criteria.items():
+            if value is None:
+                continue
+            if key not in KEYS:
+                raise ValueError(f"Unknown query key: {key}")
+            if key == "cluster":
+                found = (
+                    set(range(len(self.offsets))) if value == self.cluster else set()
+                )
+            else:
+                found = set(self.positions[key].get(value, ()))
+            matches = found if matches is None else matches & found
+        if matches is None:
+            matches = set(range(len(self.offsets)))
+        if not matches:
+            return []
+
+        text = self._snapshot_text()
+        decoder = json.JSONDecoder()
+        records = []
+        for i in sorted(matches):
+            mapping_offset, principal_offset = self.offsets[i]
+            records.append(
+                _record(
+                    self.cluster,
+                    decoder.raw_decode(text, typing.cast(int, mapping_offset))[0],
+                    decoder.raw_decode(text, principal_offset)[0]
+                    if principal_offset is not None
+                    else {},
+                )
+            )
+        return records
+
+    def _snapshot_text(self) -> str:
+        """ Read the snapshot the offsets point to on first use """
+        if self._text is None:
+            if self._snapshot_filename is None:
+                raise ValueError("Index is not attached to a snapshot. Use `open`.")
+            source, text = _read(self._snapshot_filename)
+            if source != self.source:
+                raise ValueError(
+                    f"Snapshot {self._snapshot_filename} changed during the query"
+                )
+            self._text = text
+        return self._text
+
+
+def _aws_auth_user(mapping: dict) -> typing.Tuple[str, typing.List[str]]:
+    """ Get the Kubernetes username and groups of a mapping as they appear in AWS auth """
+    if mapping["mapping_type"] == _ROLE_TO_NODE:
+        # Imported only for node roles to keep the query command fast
+        # pylint: disable=import-outside-toplevel
+        from eks_auth_sync.mapping import NODE_USERNAME, NODE_GROUPS
+
+        return NODE_USERNAME, list(NODE_GROUPS)
+    return mapping["username"], list(mapping["groups"])
+
+
+def _positions(mappings: typing.List[dict]) -> _Positions:
+    positions: _Positions = {"arn": {}, "username": {}, "group": {}}
+    for i, mapping in enumerate(mappings):
+        username, groups = _aws_auth_user(mapping)
+        positions["arn"].setdefault(mapping["arn"], []).append(i)
+        positions["username"].setdefault(username, []).append(i)
+        for group in groups:
+            positions["group"].setdefault(group, []).append(i)
+    return positions
+
+
+def _record(cluster: str, mapping: dict, principal: dict) -> dict:
+    username, groups = _aws_auth_user(mapping)
+    return {
+        "cluster": cluster,
+        "arn": mapping["arn"],
+        "type": mapping["mapping_type"],
+        "username": username,
+        "groups": groups,
+        "source": mapping.get("source", "tag"),
+        "principal": principal,
+    }
+
+
+def _members(
+    text: str, pos: int, walk: typing.Collection[str] = ()
+) -> typing.Tuple[
+    typing.List[typing.Tuple[typing.Optional[str], int, typing.Any]], int
+]:
+    """
+    Decode the members of the JSON object or array starting at `pos`.
+
+    :param text: JSON document
+    :param pos: Offset of the object or array in the document
+    :param walk: Keys of the object members that are decoded member by member too,
+        so that the offsets of their members are known
+    :returns: The key (`None` in arrays), offset and value of each member,
+        and the offset after the object or array
+    """
+    decoder = json.JSONDecoder()
+    closing = "}" if text[pos] == "{" else "]"
+    members = []
+    pos = _skip(text, pos + 1)
+    while text[pos] != closing:
+        key = None
+        if closing == "}":
+            key, pos = decoder.raw_decode(text, pos)
+            pos = _skip(text, pos, ":")
+        offset = pos
+        if key in walk:
+            value, pos = _members(text, pos)
+        else:
+            value, pos = decoder.raw_decode(text, pos)
+        members.append((key, offset, value))
+        pos = _skip(text, pos)
+        if text[pos] == ",":
+            pos = _skip(text, pos + 1)
+    return members, pos + 1
+
+
+def _skip(text: str, pos: int, separator: typing.Optional[str] = None) -> int:
+    """ Skip whitespace and the separator if given """
+    if text[pos : pos + 1].isspace():
+        pos = _WHITESPACE.match(text, pos).end()  # type: ignore
+    if separator is not None:
+        if text[pos : pos + 1] != separator:
+            raise ValueError(f"Expected {separator!r} at offset {pos}")
+        pos = _skip(text, pos + 1)
+    return pos
+
+
+def _read(filename: str) -> typing.Tuple[typing.List[int], str]:
+    """ Read a file, and get its modification time and size at the time of reading """
+    with open(filename, encoding="utf-8") as fp:
+        return _file_version(fp.fileno()), fp.read()
+
+
+def _file_version(file: typing.Union[str, int]) -> typing.List[int]:
+    stat = os.stat(file)
+    return [stat.st_mtime_ns, stat.st_size]
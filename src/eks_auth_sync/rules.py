@@ -0,0 +1,196 @@
+"""
+Rules map IAM users and roles to Kubernetes users based on their name and path alone.
+
+Principals matching a rule don't need their tags fetched from IAM, which makes rules
+useful for large sets of similarly named roles such as the AWS SSO roles.
+"""
+import re
+import string
+import typing
+import yaml
+from eks_auth_sync.mapping import MappingType, Mapping, MappingSource
+
+# Fields that are always available in the username and group templates
+_TEMPLATE_FIELDS = ("name", "path")
+
+
+class Rule(typing.NamedTuple):
+    """
+    Rule describes how IAM users or roles are mapped to Kubernetes users
+    based on their name and path.
+
+    :param mapping_type: Type of mapping the rule produces.
+        This also decides whether the rule applies to IAM users or IAM roles.
+    :param name: Regular expression the whole user/role name must match
+    :param path: Regular expression the whole user/role path must match
+    :param username: Template for the Kubernetes username
+    :param groups: Templates for the Kubernetes groups
+
+    The username and groups are templated using the `string.Template` syntax
+    (for example `sso-${name}`). The available fields are `name`, `path`,
+    and the named groups in the name and path regular expressions.
+    """
+
+    mapping_type: MappingType
+    name: str = ".*"
+    path: str = ".*"
+    username: str = ""
+    groups: typing.Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "Rule":
+        """
+        Reads rule contents from a dictionary.
+
+        :param dictionary: The dictionary containing the rule information.
+        :returns: A rule based on the dictionary contents
+
+        The dictionary should have the following entries:
+        * `mapping_type`: A mapping type in string format.
+           See `MappingType#from_string` for more information.
+        * `name`: Optional regular expression for the user/role name
+        * `path`: Optional regular expression for the user/role path
+        * `username`: Kubernetes username template.
+           Required for all mapping types except `role-to-node`.
+        * `groups`: Optional list of Kubernetes group templates
+        """
+        return cls(
+            mapping_type=MappingType.from_string(dictionary["mapping_type"]),
+            name=dictionary.get("name", ".*"),
+            path=dictionary.get("path", ".*"),
+            username=dictionary.get("username", ""),
+            groups=tuple(dictionary.get("groups", ())),
+        )
+
+
+class _CompiledRule:
+    def __init__(self, rule: Rule) -> None:
+        self.mapping_type = rule.mapping_type
+        self.name_re = re.compile(rule.name)
+        self.path_re = re.compile(rule.path)
+        self.username = string.Template(rule.username)
+        self.groups = tuple(string.Template(g) for g in rule.groups)
+
+        if not rule.username and rule.mapping_type != MappingType.RoleToNode:
+            raise ValueError(f"Rule for {rule.name} has no username")
+
+        # Validate the templates up front, so that errors are caught when loading rules
+        fields = dict.fromkeys(
+            _TEMPLATE_FIELDS
+            + tuple(self.name_re.groupindex)
+            + tuple(self.path_re.groupindex),
+            "",
+        )
+        for template in (self.username,) + self.groups:
+            try:
+                template.substitute(fields)
+            except (KeyError, ValueError) as err:
+                raise ValueError(
+                    f"Invalid template in rule for {rule.name}: {template.template}"
+                ) from err
+
+    def apply(self, arn: str, name: str, path: str) -> typing.Optional[Mapping]:
+        """
+        Map an IAM user or role using the rule.
+
+        :param arn: ARN of the IAM user or role
+        :param name: Name of the IAM user or role
+        :param path: Path of the IAM user or role
+        :returns: A mapping or `None` if the name or path doesn't match the rule
+        """
+        name_match = self.name_re.fullmatch(name)
+        if not name_match:
+            return None
+        path_match = self.path_re.fullmatch(path)
+        if not path_match:
+            return None
+
+        if self.mapping_type == MappingType.RoleToNode:
+            return Mapping(
+                arn=arn,
+                mapping_type=self.mapping_type,
+                username="",
+                groups=[],
+                source=MappingSource.Rule,
+            )
+
+        fields = {"name": name, "path": path}
+        fields.update(path_match.groupdict(default=""))
+        fields.update(name_match.groupdict(default=""))
+        return Mapping(
+            arn=arn,
+            mapping_type=self.mapping_type,
+            username=self.username.substitute(fields),
+            groups=[g.substitute(fields) for g in self.groups],
+            source=MappingSource.Rule,
+        )
+
+
+class RuleSet:
+    """
+    A compiled set of rules.
+    Rules are tried in the order they are given, and the first matching rule wins.
+
+    :param rules: Rules to compile
+    """
+
+    def __init__(self, rules: typing.Iterable[Rule]) -> None:
+        self._user_rules: typing.List[_CompiledRule] = []
+        self._role_rules: typing.List[_CompiledRule] = []
+        for rule in rules:
+            compiled = _CompiledRule(rule)
+            if rule.mapping_type == MappingType.UserToUser:
+                self._user_rules.append(compiled)
+            else:
+                self._role_rules.append(compiled)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "RuleSet":
+        """
+        Load rules from a YAML file.
+
+        :param filename: Name of the file containing a list of rules.
+            See `Rule#from_dict` for the format of each rule.
+        :returns: Compiled rules
+        """
+        with open(filename, encoding="utf-8") as fp:
+            rules = yaml.load(fp, Loader=yaml.SafeLoader) or []
+        return cls(Rule.from_dict(r) for r in rules)
+
+    def __bool__(self) -> bool:
+        return bool(self._user_rules or self._role_rules)
+
+    @property
+    def has_node_rules(self) -> bool:
+        """ Returns `True` if any of the rules maps IAM roles to worker nodes """
+        return any(r.mapping_type == MappingType.RoleToNode for r in self._role_rules)
+
+    def match_user(self, user: dict, arn: str) -> typing.Optional[Mapping]:
+        """
+        Find a mapping for an IAM user.
+
+        :param user: IAM user details as returned by `list_users`
+        :param arn: ARN of the IAM user
+        :returns: A mapping from the first matching rule or `None` if no rule matches
+        """
+        return _first_match(self._user_rules, arn, user["UserName"], user["Path"])
+
+    def match_role(self, role: dict, arn: str) -> typing.Optional[Mapping]:
+        """
+        Find a mapping for an IAM role.
+
+        :param role: IAM role details as returned by `list_roles`
+        :param arn: ARN of the IAM role
+        :returns: A mapping from the first matching rule or `None` if no rule matches
+        """
+        return _first_match(self._role_rules, arn, role["RoleName"], role["Path"])
+
+
+def _first_match(
+    rules: typing.List[_CompiledRule], arn: str, name: str, path: str
+) -> typing.Optional[Mapping]:
+    for rule in rules:
+        mapping = rule.apply(arn, name, path)
+        if mapping:
+            return mapping
+    return None
@@ -1,13 +1,31 @@
 """
 Scanner is used for scanning AWS APIs for EKS cluster users.
 """
+import concurrent.futures
+import threading
+import time
 import typing
 import boto3  # type: ignore
+import botocore.exceptions  # type: ignore
 import structlog  # type: ignore
 from eks_auth_sync.mapping import MappingType, Mapping
+from eks_auth_sync.store import (
+    Conflict,
+    ConflictPolicy,
+    MappingConflict,
+    MappingStore,
+)
+from eks_auth_sync.rules import RuleSet
+from eks_auth_sync.filters import PrincipalFilter
+from eks_auth_sync.checkpoint import Checkpoint, ShardState
+from eks_auth_sync._aws import ClientRegistry
+from eks_auth_sync._logging import debug_enabled
 
 _LOG = structlog.get_logger()
 
+_ROLES = "roles"
+_USERS = "users"
+
 
 class Scanner:
     """
@@ -15,21 +33,236 @@ class Scanner:
 
     :param session: Boto3 session to use as a context for interacting with AWS
     :param cluster: Name of the EKS cluster
+    :param rules: Optional rules for mapping users and roles without looking up their tags
+    :param principal_filter: Optional filter for skipping users and roles before
+        their tags are looked up. By default, only AWS service-linked roles are skipped.
+    :param tag_cache: Optional cache for the user and role tags.
+        The same cache can be shared between scanners for different clusters.
+    :param clients: Optional registry to get the AWS clients from.
+        The same registry can be shared between scanners for different clusters.
     """
 
-    def __init__(self, session: boto3.Session, cluster: str) -> None:
-        self._sts_client = session.client("sts")
-        self._iam_client = session.client("iam")
-        self._account_id_v = ""
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        session: boto3.Session,
+        cluster: str,
+        rules: typing.Optional[RuleSet] = None,
+        principal_filter: typing.Optional[PrincipalFilter] = None,
+        tag_cache: typing.Optional["TagCache"] = None,
+        clients: typing.Optional[ClientRegistry] = None,
+    ) -> None:
+        clients = clients or ClientRegistry(session)
+        self._iam_client = clients.client("iam")
         self._cluster = cluster
+        self._rules = rules or RuleSet([])
+        self._filter = principal_filter or PrincipalFilter()
+        self._tag_cache = tag_cache
+        self.stats = ScanStats()
         self._log = _LOG.new(cluster=cluster)
 
-    @property
-    def _account_id(self) -> str:
-        if not self._account_id_v:
-            self._account_id_v = self._sts_client.get_caller_identity()["Account"]
-            self._log.debug("found AWS account ID", account_id=self._account_id_v)
-        return self._account_id_v
+    def scan(
+        self,
+        roles_paths: typing.Iterable[str] = (),
+        users_paths: typing.Iterable[str] = (),
+        options: typing.Optional["ScanOptions"] = None,
+    ) -> "ScanResult":
+        """
+        Scan IAM roles and users under multiple path prefixes concurrently.
+
+        :param roles_paths: Path prefixes to scan IAM roles from
+        :param users_paths: Path prefixes to scan IAM users from
+        :param options: Options for the scan. See `ScanOptions`.
+        :returns: IAM role and user to K8s user mappings found,
+            whether all the path prefixes were scanned completely,
+            the conflicts found between the mappings,
+            and the ARNs of the users and roles whose tags could not be looked up.
+
+        Each path prefix is scanned as described in `from_iam_roles` and `from_iam_users`.
+        Path prefixes covered by other path prefixes are skipped,
+        and each IAM role and user is included only once in the results.
+        The users and roles are scanned one list page at a time.
+
+        Users and roles deleted during the scan are skipped.
+
+        The priority tier includes the roles under the priority paths and
+        the roles mapped to worker nodes by the rules. The priority paths are
+        scanned first. When the priority tier is reported with `on_priority`
+        and there are node rules, the role path prefixes are listed in full
+        before their tags are looked up, so that the mappings needed for new worker
+        nodes to join the cluster can be applied without waiting for the whole scan.
+        The priority tier isn't saved to the checkpoint.
+        """
+        options = options or ScanOptions()
+        roles_paths = _collapse_path_prefixes(roles_paths)
+        priority_paths = _intersect_path_prefixes(options.priority_paths, roles_paths)
+        shard_options = _ShardOptions(
+            deadline_at=time.monotonic() + options.deadline
+            if options.deadline is not None
+            else None,
+            checkpoint=options.checkpoint,
+            on_mapping=options.on_mapping,
+            fallback={m.arn: m for m in options.fallback}
+            if options.fallback is not None
+            else None,
+        )
+        tier = None
+        nodes_listed = None
+        if options.on_priority and (priority_paths or self._rules.has_node_rules):
+            tier = _PriorityTier(
+                len(priority_paths)
+                + (len(roles_paths) if self._rules.has_node_rules else 0),
+                options,
+                self._log,
+            )
+            if self._rules.has_node_rules:
+                nodes_listed = tier.nodes_listed
+
+        tasks = (
+            [
+                (_ROLES, p, shard_options._replace(checkpoint=None), tier)
+                for p in priority_paths
+            ]
+            + [
+                (
+                    _ROLES,
+                    p,
+                    shard_options._replace(
+                        skip_paths=priority_paths, on_nodes_listed=nodes_listed
+                    ),
+                    None,
+                )
+                for p in roles_paths
+            ]
+            + [
+                (_USERS, p, shard_options, None)
+                for p in _collapse_path_prefixes(users_paths)
+            ]
+        )
+        try:
+            results = self._scan_shards(tasks, options.concurrency)
+        finally:
+            if options.checkpoint:
+                options.checkpoint.save()
+        return _merge_shards(results, options)
+
+    def _scan_shards(
+        self,
+        tasks: typing.List[
+            typing.Tuple[str, str, "_ShardOptions", typing.Optional["_PriorityTier"]]
+        ],
+        concurrency: int,
+    ) -> typing.List["_ShardResult"]:
+        """
+        Scan the shards concurrently. The shards given a priority tier are
+        reported to the tier as soon as they're done.
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, concurrency)
+        ) as executor:
+            futures = []
+            for kind, path, shard_options, tier in tasks:
+                future = executor.submit(self._scan_shard, kind, path, shard_options)
+                if tier:
+                    future.add_done_callback(tier.shard_done)
+                futures.append(future)
+            return [future.result() for future in futures]
+
+    def list_principals(
+        self,
+        roles_paths: typing.Iterable[str] = (),
+        users_paths: typing.Iterable[str] = (),
+        concurrency: int = 4,
+    ) -> "Listing":
+        """
+        List IAM roles and users under multiple path prefixes concurrently
+        without looking up their tags.
+
+        :param roles_paths: Path prefixes to list IAM roles from
+        :param users_paths: Path prefixes to list IAM users from
+        :param concurrency: Maximum number of path prefixes to list at the same time
+        :returns: The roles and users in the format returned by IAM
+
+        The listing doesn't depend on the cluster, so it can be mapped for many
+        clusters using `map_principals`. Each role and user is listed only once.
+        """
+        shards = [(_ROLES, p) for p in _collapse_path_prefixes(roles_paths)] + [
+            (_USERS, p) for p in _collapse_path_prefixes(users_paths)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, concurrency)
+        ) as executor:
+            futures = [
+                executor.submit(self._list_shard, kind, path) for kind, path in shards
+            ]
+            pages = [
+                (kind, future.result()) for (kind, _), future in zip(shards, futures)
+            ]
+        principals: typing.Dict[str, typing.Dict[str, dict]] = {_ROLES: {}, _USERS: {}}
+        for kind, listed in pages:
+            for principal in listed:
+                principals[kind].setdefault(principal["Arn"], principal)
+        return Listing(
+            roles=list(principals[_ROLES].values()),
+            users=list(principals[_USERS].values()),
+        )
+
+    def map_principals(
+        self,
+        listing: "Listing",
+        concurrency: int = 4,
+        conflict_policy: ConflictPolicy = ConflictPolicy.Warn,
+        extra_mappings: typing.Iterable[Mapping] = (),
+    ) -> "ScanResult":
+        """
+        Map IAM roles and users listed with `list_principals` for the cluster.
+
+        :param listing: The roles and users to map
+        :param concurrency: Maximum number of tag lookups to make at the same time
+        :param conflict_policy: How to resolve mappings that conflict on the ARN
+            or on the Kubernetes username. See `MappingStore`.
+        :param extra_mappings: Mappings to add to the results before the mapped
+            ones. See `ScanOptions`.
+        :returns: IAM role and user to K8s user mappings found
+            and the conflicts found between the mappings.
+
+        Roles and users are mapped as described in `from_iam_roles` and
+        `from_iam_users`. Use a tag cache shared between the scanners to look up
+        the tags of each role and user only once for all the clusters.
+        """
+        work = [(_ROLES, p) for p in listing.roles] + [
+            (_USERS, p) for p in listing.users
+        ]
+
+        def to_mapping(item: typing.Tuple[str, dict]) -> typing.Optional[Mapping]:
+            mapping = self._map_principal(item[0], item[1], None, [])
+            if mapping:
+                self.stats.increment("mappings")
+            return mapping
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, concurrency)
+        ) as executor:
+            mappings = list(executor.map(to_mapping, work))
+
+        store = MappingStore(conflict_policy, extra_mappings)
+        principals: typing.Dict[str, dict] = {}
+        for (kind, principal), mapping in zip(work, mappings):
+            if mapping:
+                store.add(mapping)
+                principals[mapping.arn] = _principal_details(kind, principal)
+        return ScanResult(
+            mappings=list(store),
+            complete=True,
+            principals=principals,
+            conflicts=store.conflicts,
+        )
+
+    def _list_shard(self, kind: str, path_prefix: str) -> typing.List[dict]:
+        return [
+            principal
+            for listed_page, _ in self._pages(kind, path_prefix)
+            for principal in listed_page
+        ]
 
     def from_iam_roles(self, path_prefix: str) -> typing.List[Mapping]:
         """
@@ -38,8 +271,9 @@ class Scanner:
         :param path_prefix: Path prefix to use as a filter. Use "/" to scan all roles.
         :returns: List of IAM role to K8s user mappings found.
 
-        Each IAM role is scanned for the following tags (`{cluster}` is replaced with the
-        cluster name):
+        Roles matching one of the scanner rules are mapped using the rule.
+        The rest of the roles are scanned for the following tags
+        (`{cluster}` is replaced with the cluster name):
 
         * `eks/{cluster}/username`:
           Username in the Kubernetes cluster.
@@ -48,17 +282,12 @@ class Scanner:
           List of groups for the user in Kubernetes in comma-separated format.
         * `eks/{cluster}/type`:
           Type of the role. "user" = normal k8s user. "node" = a worker node user.
+
+        Roles are mapped with their ARNs without the path
+        (`arn:aws:iam::{account}:role/{name}`), since EKS authenticates the sessions
+        of the assumed roles by the role ARN without the path.
         """
-        self._log.info("fetching IAM roles", path_prefix=path_prefix)
-        paginator = self._iam_client.get_paginator("list_roles")
-        mappings: typing.List[Mapping] = []
-        for roles in paginator.paginate(PathPrefix=path_prefix):
-            for role in roles.get("Roles", []):
-                mapping = self._role_to_mappings(role)
-                if mapping:
-                    self._log.debug("found role mapping", mapping=mapping._asdict())
-                    mappings.append(mapping)
-        return mappings
+        return self._scan_shard(_ROLES, path_prefix).mappings
 
     def from_iam_users(self, path_prefix: str) -> typing.List[Mapping]:
         """
@@ -67,8 +296,9 @@ class Scanner:
         :param path_prefix: Path prefix to use as a filter. Use "/" to scan all users.
         :returns: List of IAM users to K8s user mappings found.
 
-        Each IAM user is scanned for the following tags (`{cluster}` is replaced with the
-        cluster name):
+        Users matching one of the scanner rules are mapped using the rule.
+        The rest of the users are scanned for the following tags
+        (`{cluster}` is replaced with the cluster name):
 
         * `eks/{cluster}/username`:
           Username in the Kubernetes cluster.
@@ -76,24 +306,221 @@ class Scanner:
         * `eks/{cluster}/groups`:
           List of groups for the user in Kubernetes in comma-separated format.
         """
-        self._log.info("fetching IAM users", path_prefix=path_prefix)
-        paginator = self._iam_client.get_paginator("list_users")
-        mappings: typing.List[Mapping] = []
-        for users in paginator.paginate(PathPrefix=path_prefix):
-            for user in users.get("Users", []):
-                mapping = self._user_to_mappings(user)
-                if mapping:
-                    self._log.debug("found user mapping", mapping=mapping._asdict())
-                    mappings.append(mapping)
-        return mappings
+        return self._scan_shard(_USERS, path_prefix).mappings
+
+    def _scan_shard(
+        self,
+        kind: str,
+        path_prefix: str,
+        options: typing.Optional["_ShardOptions"] = None,
+    ) -> "_ShardResult":
+        options = options or _ShardOptions()
+        key = f"{kind}:{path_prefix}"
+        state = options.checkpoint.shard(key) if options.checkpoint else ShardState()
+        result = _ShardResult(
+            mappings=list(state.mappings), principals={}, done=state.done, degraded=[]
+        )
+        log = self._log.bind(path_prefix=path_prefix)
+        log.debug(f"fetching IAM {kind}", resume=state.marker is not None)
+        if options.on_mapping:
+            for resumed in result.mappings:
+                options.on_mapping(resumed)
+
+        pages: typing.Iterable[_Page] = (
+            () if state.done else self._pages(kind, path_prefix, state.marker, options)
+        )
+        if options.on_nodes_listed:
+            # The roles are listed in full before looking up their tags,
+            # so that the roles mapped by the node rules are known early.
+            pages = list(pages)
+            options.on_nodes_listed(
+                state.done or bool(pages) and pages[-1][1] is None,
+                [m for m in result.mappings if m.mapping_type == MappingType.RoleToNode]
+                + [
+                    m
+                    for listed_page, _ in pages
+                    for m in map(self._node_rule_mapping, listed_page)
+                    if m
+                ],
+            )
+
+        done = state.done
+        for listed_page, marker in pages:
+            if (
+                options.deadline_at is not None
+                and time.monotonic() >= options.deadline_at
+            ):
+                break
+            self._scan_page(kind, listed_page, options, result)
+            done = marker is None
+            if options.checkpoint:
+                options.checkpoint.update(
+                    key, ShardState(marker, done, list(result.mappings))
+                )
+        if not done:
+            log.warning(f"scan deadline reached while fetching IAM {kind}")
+        return result._replace(done=done)
+
+    def _scan_page(
+        self,
+        kind: str,
+        listed_page: typing.List[dict],
+        options: "_ShardOptions",
+        result: "_ShardResult",
+    ) -> None:
+        """ Map the users or roles of a list page, and add them to the shard result """
+        debug = debug_enabled()
+        for principal in listed_page:
+            mapping = self._map_principal(
+                kind, principal, options.fallback, result.degraded
+            )
+            if mapping:
+                self.stats.increment("mappings")
+                if debug:
+                    self._log.debug("found mapping", mapping=mapping.to_dict())
+                result.mappings.append(mapping)
+                result.principals[mapping.arn] = _principal_details(kind, principal)
+                if options.on_mapping:
+                    options.on_mapping(mapping)
+
+    def _map_principal(
+        self,
+        kind: str,
+        principal: dict,
+        fallback: typing.Optional[typing.Dict[str, Mapping]],
+        degraded: typing.List[str],
+    ) -> typing.Optional[Mapping]:
+        """
+        Map a user or role, and fall back to its last known good mapping
+        when its tags can't be looked up. The ARNs of the users and roles that
+        fell back are added to `degraded`.
+        """
+        try:
+            if kind == _ROLES:
+                return self._role_to_mappings(principal)
+            return self._user_to_mappings(principal)
+        except _PrincipalDeleted:
+            self.stats.increment("deleted")
+            self._log.info(f"IAM {kind[:-1]} deleted during scan", arn=principal["Arn"])
+            return None
+        except (
+            botocore.exceptions.ClientError,
+            botocore.exceptions.BotoCoreError,
+        ) as err:
+            if fallback is None:
+                raise
+            arn = _mapping_arn(kind, principal)
+            degraded.append(arn)
+            return self._fall_back(arn, err, fallback)
+
+    def _pages(
+        self,
+        kind: str,
+        path_prefix: str,
+        marker: typing.Optional[str] = None,
+        options: typing.Optional["_ShardOptions"] = None,
+    ) -> typing.Iterator["_Page"]:
+        """
+        List the IAM roles or users under a path prefix one page at a time,
+        starting from the marker. Each page is given with the marker of the next page.
+        The listing is stopped at the deadline.
+        """
+        options = options or _ShardOptions()
+        if kind == _ROLES:
+            list_fn, result_key = self._iam_client.list_roles, "Roles"
+        else:
+            list_fn, result_key = self._iam_client.list_users, "Users"
+        skip_paths = tuple(options.skip_paths)
+        while True:
+            if (
+                options.deadline_at is not None
+                and time.monotonic() >= options.deadline_at
+            ):
+                return
+            params = {"PathPrefix": path_prefix}
+            if marker:
+                params["Marker"] = marker
+            page = list_fn(**params)
+            marker = page.get("Marker") if page.get("IsTruncated") else None
+            yield (
+                [
+                    principal
+                    for principal in page.get(result_key, [])
+                    if not principal["Path"].startswith(skip_paths)
+                ],
+                marker,
+            )
+            if marker is None:
+                return
+
+    def _node_rule_mapping(self, role: dict) -> typing.Optional[Mapping]:
+        """ Map a role to a worker node if a node rule matches it """
+        if not self._filter.accepts(role["RoleName"], role["Path"]):
+            return None
+        mapping = self._rules.match_role(role, _mapping_arn(_ROLES, role))
+        if mapping and mapping.mapping_type == MappingType.RoleToNode:
+            return mapping
+        return None
+
+    def _fall_back(
+        self, arn: str, err: Exception, fallback: typing.Dict[str, Mapping]
+    ) -> typing.Optional[Mapping]:
+        self.stats.increment("degraded")
+        mapping = fallback.get(arn)
+        if mapping:
+            self.stats.increment("fallbacks")
+        self._log.warning(
+            "tag lookup failed. using last known good mapping.",
+            arn=arn,
+            error=str(err),
+            mapped=mapping is not None,
+        )
+        return mapping
+
+    def _tags(self, key: typing.Tuple[str, str], fetch: "_FetchTags") -> list:
+        if self._tag_cache:
+            tags = self._tag_cache.get(key)
+            if tags is not None:
+                self.stats.increment("tag_cache_hits")
+                return tags
+        self.stats.increment("tag_lookups")
+        tags = self._fetch_tags(fetch)
+        if self._tag_cache:
+            self._tag_cache.put(key, tags)
+        return tags
+
+    @staticmethod
+    def _fetch_tags(fetch: "_FetchTags") -> list:
+        """
+        Look up tags. Throttled and failed calls are retried by Botocore, so
+        the error raised here is final.
+        """
+        try:
+            return fetch()
+        except botocore.exceptions.ClientError as err:
+            if _error_code(err) == "NoSuchEntity":
+                raise _PrincipalDeleted() from err
+            raise
 
     def _user_to_mappings(self, user: dict) -> typing.Optional[Mapping]:
         username = user["UserName"]
-        arn = f"arn:aws:iam::{self._account_id}:user/{username}"
+        self.stats.increment("principals")
+        if not self._filter.accepts(username, user["Path"]):
+            self.stats.increment("filtered")
+            return None
+        arn = user["Arn"]
+        rule_mapping = self._rules.match_user(user, arn)
+        if rule_mapping:
+            self.stats.increment("rule_matches")
+            return rule_mapping
+
         tags = _Tags(
             log=self._log,
-            tags=self._iam_client.list_user_tags(UserName=username, MaxItems=100).get(
-                "Tags", []
+            tags=self._tags(
+                ("user", username),
+                lambda: self._iam_client.list_user_tags(
+                    UserName=username, MaxItems=100
+                ).get("Tags", []),
             ),
             cluster=self._cluster,
         )
@@ -111,11 +538,23 @@ class Scanner:
 
     def _role_to_mappings(self, role: dict) -> typing.Optional[Mapping]:
         rolename = role["RoleName"]
-        arn = f"arn:aws:iam::{self._account_id}:role/{rolename}"
+        self.stats.increment("principals")
+        if not self._filter.accepts(rolename, role["Path"]):
+            self.stats.increment("filtered")
+            return None
+        arn = _mapping_arn(_ROLES, role)
+        rule_mapping = self._rules.match_role(role, arn)
+        if rule_mapping:
+            self.stats.increment("rule_matches")
+            return rule_mapping
+
         tags = _Tags(
             log=self._log,
-            tags=self._iam_client.list_role_tags(RoleName=rolename, MaxItems=100,).get(
-                "Tags", []
+            tags=self._tags(
+                ("role", rolename),
+                lambda: self._iam_client.list_role_tags(
+                    RoleName=rolename, MaxItems=100
+                ).get("Tags", []),
             ),
             cluster=self._cluster,
         )
@@ -134,6 +573,357 @@ class Scanner:
         return None
 
 
+class ScanResult(typing.NamedTuple):
+    """
+    Result of scanning IAM for Kubernetes users.
+
+    :param mappings: Mappings found
+    :param complete: `False` if the scan was stopped before all IAM users and roles
+        were scanned. In that case, the mappings contain only some of the users and roles.
+    :param principals: Details of the mapped IAM users and roles by ARN.
+        Includes the kind ("role" or "user"), name, path, and ID of each user and role.
+        Details are not available for mappings resumed from a checkpoint.
+        `None` if the details were not collected.
+    :param conflicts: Conflicts found between the mappings
+    :param degraded: ARNs of the users and roles whose tags couldn't be looked up.
+        These are mapped using the fallback mappings given to the scan.
+    """
+
+    mappings: typing.List[Mapping]
+    complete: bool
+    principals: typing.Optional[typing.Dict[str, dict]] = None
+    conflicts: typing.Sequence[Conflict] = ()
+    degraded: typing.Sequence[str] = ()
+
+
+class Listing(typing.NamedTuple):
+    """
+    IAM roles and users listed for mapping them for many clusters.
+
+    :param roles: IAM roles as returned by `list_roles`
+    :param users: IAM users as returned by `list_users`
+    """
+
+    roles: typing.List[dict]
+    users: typing.List[dict]
+
+
+class ScanOptions(typing.NamedTuple):
+    """
+    Options for `Scanner#scan`.
+
+    :param concurrency: Maximum number of path prefixes to scan at the same time
+    :param deadline: Optional number of seconds after which the scan is stopped.
+        The deadline is checked between the IAM list pages.
+    :param checkpoint: Optional checkpoint for resuming the scan from
+        and for saving the scan progress to.
+    :param on_mapping: Optional function to call for each mapping as soon as it's found.
+        The function is called from multiple threads,
+        and it may be called more than once for the same IAM user or role.
+    :param conflict_policy: How to resolve mappings that conflict on the ARN
+        or on the Kubernetes username. See `MappingStore`.
+    :param fallback: Optional last known good mappings, usually from the
+        previous successful scan. When given, a user or role whose tags can't
+        be looked up is mapped using its last known good mapping
+        instead of failing the whole scan.
+    :param priority_paths: IAM role path prefixes to scan before the rest of
+        the users and roles. Only the parts inside the scanned role paths are scanned.
+    :param on_priority: Optional function to call with the mappings of
+        the priority tier as soon as the tier is scanned completely.
+        The function is called from one of the scanning threads while the rest
+        of the users and roles are still being scanned. The priority tier
+        leaves out the users and roles whose tags couldn't be looked up
+        and the mappings overridden by `extra_mappings`.
+    :param extra_mappings: Mappings to add to the results before the scanned
+        ones, e.g. the mappings from the mapping files.
+        Conflicts with them are resolved and reported like the scanned ones.
+    """
+
+    concurrency: int = 4
+    deadline: typing.Optional[float] = None
+    checkpoint: typing.Optional[Checkpoint] = None
+    on_mapping: typing.Optional[typing.Callable[[Mapping], None]] = None
+    conflict_policy: ConflictPolicy = ConflictPolicy.Warn
+    fallback: typing.Optional[typing.Sequence[Mapping]] = None
+    priority_paths: typing.Sequence[str] = ()
+    on_priority: typing.Optional[typing.Callable[[typing.List[Mapping]], None]] = None
+    extra_mappings: typing.Sequence[Mapping] = ()
+
+
+class _ShardOptions(typing.NamedTuple):
+    deadline_at: typing.Optional[float] = None
+    checkpoint: typing.Optional[Checkpoint] = None
+    on_mapping: typing.Optional[typing.Callable[[Mapping], None]] = None
+    fallback: typing.Optional[typing.Dict[str, Mapping]] = None
+    skip_paths: typing.Sequence[str] = ()
+    on_nodes_listed: typing.Optional[
+        typing.Callable[[bool, typing.List[Mapping]], None]
+    ] = None
+
+
+class _PriorityTier:
+    """
+    Collects the priority tier from the shards scanned concurrently,
+    and reports it once all the shards of the tier are complete.
+
+    :param pending: Number of shards the tier waits for
+    :param options: Options of the scan. The tier is reported with `on_priority`.
+        Tier mappings for the same ARN or username as `extra_mappings` are left out.
+    :param log: Logger to use
+    """
+
+    def __init__(self, pending: int, options: ScanOptions, log: typing.Any) -> None:
+        self._pending = pending
+        self._options = options
+        self._log = log
+        self._lock = threading.Lock()
+        # None once any of the shards is incomplete
+        self._mappings: typing.Optional[typing.List[Mapping]] = []
+
+    def shard_done(self, future: "concurrent.futures.Future[_ShardResult]") -> None:
+        """ Add the result of a priority path shard to the tier """
+        if future.cancelled() or future.exception() is not None:
+            self._add(False, [])
+            return
+        shard = future.result()
+        degraded = set(shard.degraded)
+        self._add(shard.done, [m for m in shard.mappings if m.arn not in degraded])
+
+    def nodes_listed(self, done: bool, mappings: typing.List[Mapping]) -> None:
+        """ Add the roles mapped by the node rules while listing a shard to the tier """
+        self._add(done, mappings)
+
+    def _add(self, done: bool, mappings: typing.List[Mapping]) -> None:
+        with self._lock:
+            self._pending -= 1
+            if self._mappings is None or not done:
+                self._mappings = None
+                return
+            self._mappings.extend(mappings)
+            if self._pending > 0:
+                return
+            mappings = self._mappings
+
+        tier = MappingStore(self._options.conflict_policy)
+        try:
+            claimed = MappingStore(
+                self._options.conflict_policy, self._options.extra_mappings
+            )
+            tier.extend(
+                m
+                for m in mappings
+                if m.arn not in claimed and claimed.by_username(m.username) is None
+            )
+        except MappingConflict as err:
+            self._log.warning(
+                "conflicting priority mappings. skipping.", error=str(err)
+            )
+            return
+        self._log.debug("priority tier scanned", mappings=len(tier))
+        assert self._options.on_priority is not None
+        try:
+            self._options.on_priority(list(tier))
+        except Exception:  # pylint: disable=broad-except
+            # The whole scan is applied after the tier, so it's not failed here
+            self._log.exception("failed to apply the priority tier")
+
+
+class _ShardResult(typing.NamedTuple):
+    mappings: typing.List[Mapping]
+    principals: typing.Dict[str, dict]
+    done: bool
+    degraded: typing.List[str]
+
+
+def _merge_shards(
+    results: typing.List[_ShardResult], options: ScanOptions
+) -> ScanResult:
+    store = MappingStore(options.conflict_policy, options.extra_mappings)
+    principals: typing.Dict[str, dict] = {}
+    degraded: typing.List[str] = []
+    for shard in results:
+        store.extend(shard.mappings)
+        principals.update(shard.principals)
+        degraded.extend(shard.degraded)
+    return ScanResult(
+        mappings=list(store),
+        complete=all(shard.done for shard in results),
+        principals=principals,
+        conflicts=store.conflicts,
+        degraded=degraded,
+    )
+
+
+class _PrincipalDeleted(Exception):
+    """ IAM user or role was deleted before its tags were looked up """
+
+
+def _principal_details(kind: str, principal: dict) -> dict:
+    if kind == _ROLES:
+        return {
+            "kind": "role",
+            "name": principal["RoleName"],
+            "path": principal["Path"],
+            "id": principal.get("RoleId"),
+        }
+    return {
+        "kind": "user",
+        "name": principal["UserName"],
+        "path": principal["Path"],
+        "id": principal.get("UserId"),
+    }
+
+
+def _mapping_arn(kind: str, principal: dict) -> str:
+    """
+    ARN to map an IAM user or role with.
+
+    Role ARNs are built without the role's path, because aws-iam-authenticator
+    matches the role ARN of the assumed role session, which doesn't include the path.
+    User ARNs are used as they are.
+    """
+    if kind == _USERS:
+        return principal["Arn"]
+    prefix, _, _ = principal["Arn"].partition(":role/")
+    return f"{prefix}:role/{principal['RoleName']}"
+
+
+def _intersect_path_prefixes(
+    path_prefixes: typing.Iterable[str], within: typing.Iterable[str]
+) -> typing.List[str]:
+    """ Narrow the path prefixes to the parts covered by the other path prefixes """
+    intersection: typing.List[str] = []
+    for path_prefix in path_prefixes:
+        for other in within:
+            if path_prefix.startswith(other):
+                intersection.append(path_prefix)
+            elif other.startswith(path_prefix):
+                intersection.append(other)
+    return _collapse_path_prefixes(intersection)
+
+
+def _error_code(err: Exception) -> typing.Optional[str]:
+    return getattr(err, "response", {}).get("Error", {}).get("Code")
+
+
+def _collapse_path_prefixes(path_prefixes: typing.Iterable[str]) -> typing.List[str]:
+    """ Remove path prefixes that are covered by other path prefixes in the list """
+    collapsed: typing.List[str] = []
+    for path_prefix in sorted(set(path_prefixes)):
+        if not any(path_prefix.startswith(p) for p in collapsed):
+            collapsed.append(path_prefix)
+    return collapsed
+
+
+_FetchTags = typing.Callable[[], list]
+
+# Users or roles of a list page, and the marker for listing the next page
+_Page = typing.Tuple[typing.List[dict], typing.Optional[str]]
+
+
+class TagCache:
+    """
+    Cache for IAM user and role tags.
+    The cache is safe to share between threads and scanners.
+
+    :param ttl: Optional number of seconds to keep the tags in the cache.
+        By default, tags are kept until the cache is cleared.
+    """
+
+    def __init__(self, ttl: typing.Optional[float] = None) -> None:
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: typing.Dict[
+            typing.Tuple[str, str], typing.Tuple[float, list]
+        ] = {}
+
+    def get(self, key: typing.Tuple[str, str]) -> typing.Optional[list]:
+        """
+        Get the cached tags.
+
+        :param key: The kind ("user" or "role") and the name of the user or role
+        :returns: The cached tags or `None` if they are not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, tags = entry
+        if self._ttl is not None and time.monotonic() - created > self._ttl:
+            return None
+        return tags
+
+    def put(self, key: typing.Tuple[str, str], tags: list) -> None:
+        """
+        Store tags to the cache.
+
+        :param key: The kind ("user" or "role") and the name of the user or role
+        :param tags: The tags in the format returned by IAM
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), tags)
+
+    def clear(self) -> None:
+        """ Remove all tags from the cache """
+        with self._lock:
+            self._entries = {}
+
+
+class ScanStats:
+    """
+    Counters describing the work done by a scanner.
+
+    * `principals`: IAM users and roles listed
+    * `filtered`: Users and roles skipped by the principal filter
+    * `rule_matches`: Users and roles mapped using the rules
+    * `tag_lookups`: Users and roles that had their tags looked up
+    * `tag_cache_hits`: Users and roles that had their tags found from the tag cache
+    * `deleted`: Users and roles deleted before their tags were looked up
+    * `degraded`: Users and roles whose tags couldn't be looked up
+    * `fallbacks`: Degraded users and roles mapped using the last known good mapping
+    * `mappings`: Mappings found
+    """
+
+    FIELDS = (
+        "principals",
+        "filtered",
+        "rule_matches",
+        "tag_lookups",
+        "tag_cache_hits",
+        "deleted",
+        "degraded",
+        "fallbacks",
+        "mappings",
+    )
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def increment(self, field: str, amount: int = 1) -> None:
+        """ Increment the given counter """
+        with self._lock:
+            self._counts[field] += amount
+
+    def __getitem__(self, field: str) -> int:
+        return self._counts[field]
+
+    def as_dict(self) -> typing.Dict[str, int]:
+        """
+        Returns the counters in dictionary format.
+        The number of tag lookups avoided using the filter, the rules, and the tag cache
+        is included as `tag_lookups_saved`, and the number of users and roles
+        without a mapping is included as `skipped`.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        counts["tag_lookups_saved"] = (
+            counts["filtered"] + counts["rule_matches"] + counts["tag_cache_hits"]
+        )
+        counts["skipped"] = counts["principals"] - counts["mappings"]
+        return counts
+
+
 class _Tags:
     def __init__(self, log, tags: list, cluster: str) -> None:
         self._log = log
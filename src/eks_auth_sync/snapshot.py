@@ -0,0 +1,88 @@
+"""
+Snapshots store the results of a scan, so that they can be used without scanning AWS again.
+"""
+import datetime
+import json
+import typing
+from eks_auth_sync.mapping import Mapping
+from eks_auth_sync._files import atomic_write
+
+# Version of the snapshot file format
+VERSION = 1
+
+
+class Snapshot(typing.NamedTuple):
+    """
+    Snapshot of the results of a scan.
+
+    :param cluster: Name of the EKS cluster the scan was made for
+    :param mappings: Mappings found
+    :param principals: Details of the mapped IAM users and roles by ARN.
+        See `scanner.ScanResult` for more information.
+    :param created: Time when the snapshot was created in ISO 8601 format
+    """
+
+    cluster: str
+    mappings: typing.List[Mapping]
+    principals: typing.Dict[str, dict]
+    created: str = ""
+
+    @classmethod
+    def create(
+        cls,
+        cluster: str,
+        mappings: typing.List[Mapping],
+        principals: typing.Optional[typing.Dict[str, dict]] = None,
+    ) -> "Snapshot":
+        """
+        Create a new snapshot timestamped with the current time.
+
+        :param cluster: Name of the EKS cluster the scan was made for
+        :param mappings: Mappings found
+        :param principals: Optional details of the mapped IAM users and roles by ARN.
+        :returns: A new snapshot
+        """
+        return cls(
+            cluster=cluster,
+            mappings=mappings,
+            principals=principals or {},
+            created=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        )
+
+    @classmethod
+    def load(cls, filename: str) -> "Snapshot":
+        """
+        Load a snapshot from a file.
+
+        :param filename: Name of the snapshot file
+        :returns: The snapshot stored in the file
+
+        Throws ValueError when the file was saved using an unsupported format version.
+        """
+        with open(filename, encoding="utf-8") as fp:
+            contents = json.load(fp)
+        if contents.get("version") != VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version in {filename}: {contents.get('version')}"
+            )
+        return cls(
+            cluster=contents["cluster"],
+            mappings=[Mapping.from_dict(m) for m in contents["mappings"]],
+            principals=contents.get("principals", {}),
+            created=contents.get("created", ""),
+        )
+
+    def save(self, filename: str) -> None:
+        """
+        Save the snapshot to a file atomically.
+
+        :param filename: Name of the snapshot file
+        """
+        contents = {
+            "version": VERSION,
+            "cluster": self.cluster,
+            "created": self.created,
+            "mappings": [m.to_dict() for m in self.mappings],
+            "principals": self.principals,
+        }
+        atomic_write(filename, json.dumps(contents, separators=(",", ":")))
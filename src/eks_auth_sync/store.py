@@ -0,0 +1,202 @@
+"""
+Store keeps mappings indexed by IAM user/role ARN and by Kubernetes username.
+"""
+import enum
+import typing
+import structlog  # type: ignore
+from eks_auth_sync.mapping import Mapping, MappingType
+
+_LOG = structlog.get_logger()
+
+
+class ConflictPolicy(enum.Enum):
+    """
+    Describes how conflicting mappings are resolved.
+
+    * Warn: Conflicts are logged. The first mapping for each ARN is kept,
+      and all the mappings claiming the same username are kept.
+    * Error: `MappingConflict` is raised for the first conflict
+    * First: The mapping added first is kept
+    * Last: The mapping added last is kept
+    """
+
+    Warn = "warn"
+    Error = "error"
+    First = "first"
+    Last = "last"
+
+
+class Conflict(typing.NamedTuple):
+    """
+    Conflict between two mappings.
+
+    :param key: Either "arn" when the mappings are for the same IAM user or role,
+        or "username" when the mappings claim the same Kubernetes username.
+    :param value: The ARN or the username the mappings conflict on
+    :param existing: The mapping that was already in the store
+    :param new: The mapping that was added to the store
+    """
+
+    key: str
+    value: str
+    existing: Mapping
+    new: Mapping
+
+
+class MappingConflict(ValueError):
+    """
+    Raised when conflicting mappings are added with the "error" conflict policy.
+
+    :param conflict: The conflict that was found
+    """
+
+    def __init__(self, conflict: Conflict) -> None:
+        super().__init__(
+            f"Mappings {conflict.existing.arn} and {conflict.new.arn} "
+            f"conflict on {conflict.key} {conflict.value}"
+        )
+        self.conflict = conflict
+
+
+class MappingStore:
+    """
+    MappingStore keeps each IAM user and role mapped only once.
+
+    Mappings are looked up by ARN and by username in constant time,
+    so adding mappings and finding conflicts between them takes linear time.
+    Identical mappings for the same IAM user or role are silently deduplicated.
+    Group lists are stored as tuples that are shared between the mappings.
+
+    Node mappings and usernames containing templates (e.g. `{{SessionName}}`)
+    are not checked for username conflicts,
+    because they map to different Kubernetes users for each session.
+
+    :param policy: How conflicting mappings are resolved. Default: warn
+    :param mappings: Mappings to add to the store
+    """
+
+    def __init__(
+        self,
+        policy: ConflictPolicy = ConflictPolicy.Warn,
+        mappings: typing.Iterable[Mapping] = (),
+    ) -> None:
+        self._policy = policy
+        self._by_arn: typing.Dict[str, Mapping] = {}
+        self._by_username: typing.Dict[str, str] = {}
+        self._groups: typing.Dict[typing.Tuple[str, ...], typing.Tuple[str, ...]] = {}
+        self.conflicts: typing.List[Conflict] = []
+        self.extend(mappings)
+
+    def __iter__(self) -> typing.Iterator[Mapping]:
+        return iter(self._by_arn.values())
+
+    def __len__(self) -> int:
+        return len(self._by_arn)
+
+    def __contains__(self, arn: object) -> bool:
+        return arn in self._by_arn
+
+    def get(self, arn: str) -> typing.Optional[Mapping]:
+        """
+        Find a mapping by IAM user/role ARN.
+
+        :param arn: IAM user/role ARN string
+        :returns: The mapping or `None` if the IAM user or role isn't mapped
+        """
+        return self._by_arn.get(arn)
+
+    def by_username(self, username: str) -> typing.Optional[Mapping]:
+        """
+        Find a mapping by Kubernetes username.
+
+        :param username: Kubernetes username
+        :returns: The first mapping in the store for the username or `None` if
+            no mapping uses the username. Node mappings and templated usernames
+            are not indexed.
+        """
+        arn = self._by_username.get(username)
+        return self._by_arn[arn] if arn is not None else None
+
+    def extend(self, mappings: typing.Iterable[Mapping]) -> None:
+        """
+        Add many mappings to the store.
+
+        :param mappings: Mappings to add. See `MappingStore#add`.
+        """
+        for mapping in mappings:
+            self.add(mapping)
+
+    def add(self, mapping: Mapping) -> bool:
+        """
+        Add a mapping to the store.
+
+        :param mapping: Mapping to add
+        :returns: `True` if the mapping was stored, and `False` if it was
+            a duplicate or lost a conflict.
+
+        Throws `MappingConflict` when the mapping conflicts with another mapping
+        and the conflict policy is "error".
+        """
+        groups = tuple(mapping.groups)
+        mapping = mapping._replace(groups=self._groups.setdefault(groups, groups))
+
+        existing = self._by_arn.get(mapping.arn)
+        if existing is not None:
+            if _same_mapping(existing, mapping):
+                return False
+            if not self._resolve(Conflict("arn", mapping.arn, existing, mapping)):
+                return False
+            self._remove(existing)
+
+        username = _indexed_username(mapping)
+        claimant = self._by_username.get(username) if username else None
+        if username and claimant is not None and claimant != mapping.arn:
+            conflict = Conflict("username", username, self._by_arn[claimant], mapping)
+            if not self._resolve(conflict):
+                return False
+            if self._policy == ConflictPolicy.Last:
+                self._remove(conflict.existing)
+
+        self._by_arn[mapping.arn] = mapping
+        if username:
+            self._by_username.setdefault(username, mapping.arn)
+        return True
+
+    def _resolve(self, conflict: Conflict) -> bool:
+        """ Record the conflict, and return `True` if the new mapping should be kept """
+        self.conflicts.append(conflict)
+        _LOG.warning(
+            "conflicting mappings",
+            key=conflict.key,
+            value=conflict.value,
+            existing=conflict.existing.arn,
+            new=conflict.new.arn,
+            policy=self._policy.value,
+        )
+        if self._policy == ConflictPolicy.Error:
+            raise MappingConflict(conflict)
+        if self._policy == ConflictPolicy.Last:
+            return True
+        if self._policy == ConflictPolicy.Warn:
+            return conflict.key == "username"
+        return False
+
+    def _remove(self, mapping: Mapping) -> None:
+        del self._by_arn[mapping.arn]
+        username = _indexed_username(mapping)
+        if username and self._by_username.get(username) == mapping.arn:
+            del self._by_username[username]
+
+
+def _same_mapping(a: Mapping, b: Mapping) -> bool:
+    return (a.mapping_type, a.username, a.groups) == (
+        b.mapping_type,
+        b.username,
+        b.groups,
+    )
+
+
+def _indexed_username(mapping: Mapping) -> typing.Optional[str]:
+    if mapping.mapping_type == MappingType.RoleToNode or "{{" in mapping.username:
+        return None
+    return mapping.username
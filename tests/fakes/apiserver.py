@@ -0,0 +1,206 @@
+"""
+In-process fake of the Kubernetes API for the ConfigMaps.
+
+A single server fakes many clusters. Each cluster is served under its own
+path prefix, so a Kubernetes client can be pointed to a cluster using
+`FakeApiServer#url` as the host.
+"""
+import http.server
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+import typing
+import uuid
+import kubernetes  # type: ignore
+
+_CONFIGMAPS_PATH = re.compile(
+    r"^/clusters/(?P<cluster>[^/]+)/api/v1/namespaces/(?P<namespace>[^/]+)"
+    r"/configmaps(?:/(?P<name>[^/?]+))?(?:\?.*)?$"
+)
+
+
+class FakeApiServer:  # pylint: disable=too-many-instance-attributes
+    """
+    Fake Kubernetes API server supporting the ConfigMap CRUD operations.
+
+    Every change to a ConfigMap bumps its `resourceVersion`. Replacing a
+    ConfigMap with a stale `resourceVersion` fails with "409 Conflict" like in
+    Kubernetes, and so does creating a ConfigMap that already exists.
+
+    :param latency: Number of seconds to wait before responding to each request
+    :param error_rate: Share of the requests that fail with "500 Internal Server Error"
+    :param seed: Seed for picking the failing requests
+    """
+
+    def __init__(
+        self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._objects: typing.Dict[typing.Tuple[str, str, str], dict] = {}
+        self._resource_version = 0
+        self._failures: typing.List[int] = []
+        self.requests: typing.List[typing.Tuple[str, str]] = []
+        self._server = _Server(("127.0.0.1", 0), _RequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FakeApiServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, cluster: str) -> str:
+        """ Base URL of the Kubernetes API for the given cluster """
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/clusters/{cluster}"
+
+    def client(self, cluster: str) -> kubernetes.client.ApiClient:
+        """ Create a Kubernetes client for the given cluster """
+        config = kubernetes.client.Configuration()
+        config.host = self.url(cluster)
+        return kubernetes.client.ApiClient(configuration=config)
+
+    def fail_next(self, *statuses: int) -> None:
+        """ Fail the next requests with the given HTTP statuses """
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def get(self, cluster: str, namespace: str, name: str) -> typing.Optional[dict]:
+        """ Get a ConfigMap stored in the fake server """
+        with self._lock:
+            obj = self._objects.get((cluster, namespace, name))
+            return json.loads(json.dumps(obj)) if obj else None
+
+    def put(self, cluster: str, namespace: str, obj: dict) -> dict:
+        """ Store a ConfigMap in the fake server directly """
+        with self._lock:
+            return self._store(cluster, namespace, obj)
+
+    def handle(
+        self, method: str, path: str, body: typing.Optional[dict]
+    ) -> typing.Tuple[int, dict]:
+        """ Handle an API request. Returns the HTTP status and the response body. """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests.append((method, path))
+            if self._failures:
+                return _status(self._failures.pop(0), "Injected failure")
+            if self.error_rate and self._random.random() < self.error_rate:
+                return _status(500, "Injected failure")
+
+            match = _CONFIGMAPS_PATH.match(path)
+            if not match:
+                return _status(404, "Unknown path")
+            cluster, namespace, name = match.group("cluster", "namespace", "name")
+            handler = {
+                ("GET", True): self._get,
+                ("POST", False): self._create,
+                ("PUT", True): self._replace,
+                ("DELETE", True): self._delete,
+            }.get((method, bool(name)))
+            if handler is None:
+                return _status(405, "Method not allowed")
+            return handler(cluster, namespace, name, body)
+
+    def _get(
+        self, cluster: str, namespace: str, name: str, body: typing.Optional[dict]
+    ) -> typing.Tuple[int, dict]:
+        # pylint: disable=unused-argument
+        key = (cluster, namespace, name)
+        if key not in self._objects:
+            return _status(404, f"configmaps {name} not found")
+        return 200, self._objects[key]
+
+    def _create(
+        self, cluster: str, namespace: str, name: str, body: typing.Optional[dict]
+    ) -> typing.Tuple[int, dict]:
+        assert body is not None
+        name = body["metadata"]["name"]
+        if (cluster, namespace, name) in self._objects:
+            return _status(409, f"configmaps {name} already exists")
+        return 201, self._store(cluster, namespace, body)
+
+    def _replace(
+        self, cluster: str, namespace: str, name: str, body: typing.Optional[dict]
+    ) -> typing.Tuple[int, dict]:
+        assert body is not None
+        key = (cluster, namespace, name)
+        if key not in self._objects:
+            return _status(404, f"configmaps {name} not found")
+        expected = body["metadata"].get("resourceVersion")
+        current = self._objects[key]["metadata"]["resourceVersion"]
+        if expected and expected != current:
+            return _status(409, f"configmaps {name} has been modified")
+        return 200, self._store(cluster, namespace, body)
+
+    def _delete(
+        self, cluster: str, namespace: str, name: str, body: typing.Optional[dict]
+    ) -> typing.Tuple[int, dict]:
+        # pylint: disable=unused-argument
+        if self._objects.pop((cluster, namespace, name), None) is None:
+            return _status(404, f"configmaps {name} not found")
+        return _status(200, "Deleted")
+
+    def _store(self, cluster: str, namespace: str, obj: dict) -> dict:
+        self._resource_version += 1
+        metadata = dict(obj.get("metadata") or {})
+        metadata["namespace"] = namespace
+        metadata["resourceVersion"] = str(self._resource_version)
+        metadata.setdefault("uid", str(uuid.uuid4()))
+        stored = {
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": metadata,
+            "data": obj.get("data") or {},
+        }
+        self._objects[(cluster, namespace, metadata["name"])] = stored
+        return stored
+
+
+def _status(code: int, message: str) -> typing.Tuple[int, dict]:
+    return (
+        code,
+        {
+            "apiVersion": "v1",
+            "kind": "Status",
+            "status": "Success" if code < 400 else "Failure",
+            "message": message,
+            "code": code,
+        },
+    )
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    fake: FakeApiServer
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    server: _Server
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        status, response = self.server.fake.handle(self.command, self.path, body)
+        content = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle  # pylint: disable=invalid-name
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
@@ -0,0 +1,223 @@
+"""
+In-process fake of the AWS IAM API.
+
+The fake is installed to real Boto3 IAM clients, so the requests go through
+the whole botocore stack including the retries. Only the responses come from the fake.
+"""
+import io
+import random
+import threading
+import time
+import typing
+import urllib.parse
+import uuid
+from xml.sax.saxutils import escape
+import boto3  # type: ignore
+import botocore.awsrequest  # type: ignore
+from eks_auth_sync._aws import ClientRegistry
+
+ACCOUNT_ID = "123456789012"
+
+_NAMESPACE = "https://iam.amazonaws.com/doc/2010-05-08/"
+
+
+class FakeIam:  # pylint: disable=too-many-instance-attributes
+    """
+    Fake IAM API with users, roles, and their tags.
+
+    :param page_size: Maximum number of users or roles to return per list request
+    :param latency: Number of seconds to wait before responding to each request
+    :param throttle_rate: Share of the requests that fail with a throttling error
+    :param seed: Seed for picking the throttled requests
+    """
+
+    def __init__(
+        self,
+        page_size: int = 100,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._principals: typing.Dict[str, typing.List[dict]] = {
+            "Role": [],
+            "User": [],
+        }
+        self.calls: typing.Dict[str, int] = {}
+        self.throttled = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._throttle_next = 0
+        self._tag_failures: typing.Dict[str, typing.Tuple[int, str, int]] = {}
+
+    def add_role(self, name: str, path: str = "/", tags: dict = None) -> str:
+        """ Add a role to the fake. Returns the ARN of the role. """
+        return self._add("Role", name, path, tags or {})
+
+    def add_user(self, name: str, path: str = "/", tags: dict = None) -> str:
+        """ Add a user to the fake. Returns the ARN of the user. """
+        return self._add("User", name, path, tags or {})
+
+    def throttle_next(self, count: int) -> None:
+        """ Throttle the next requests """
+        with self._lock:
+            self._throttle_next += count
+
+    def fail_tags(
+        self, name: str, status: int = 403, code: str = "AccessDenied", count: int = -1
+    ) -> None:
+        """
+        Fail the tag lookups of the given user or role.
+        By default, all the lookups fail. Otherwise, only the next `count` lookups fail.
+        """
+        with self._lock:
+            self._tag_failures[name] = (status, code, count)
+
+    def install(self, client: typing.Any) -> None:
+        """ Serve the requests of the given Boto3 IAM client from the fake """
+        client.meta.events.register("before-send.iam", self._before_send)
+
+    def clients(self, concurrency: int = 1) -> ClientRegistry:
+        """ Create a client registry with the fake installed to its IAM client """
+        session = boto3.Session(
+            aws_access_key_id="fake",
+            aws_secret_access_key="fake",
+            region_name="us-east-1",
+        )
+        clients = ClientRegistry(session, concurrency=concurrency)
+        self.install(clients.client("iam"))
+        return clients
+
+    def _add(self, kind: str, name: str, path: str, tags: dict) -> str:
+        arn = f"arn:aws:iam::{ACCOUNT_ID}:{kind.lower()}{path}{name}"
+        self._principals[kind].append(
+            {
+                f"{kind}Name": name,
+                f"{kind}Id": f"A{kind[0]}OA{uuid.uuid4().hex[:17].upper()}",
+                "Path": path,
+                "Arn": arn,
+                "CreateDate": "2020-01-01T00:00:00Z",
+                "Tags": tags,
+            }
+        )
+        return arn
+
+    def _before_send(self, request, **kwargs):
+        params = {
+            k: v[0] for k, v in urllib.parse.parse_qs(_text(request.body)).items()
+        }
+        action = params["Action"]
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._in_flight -= 1
+            self.calls[action] = self.calls.get(action, 0) + 1
+            throttled = self._throttle_next > 0 or bool(
+                self.throttle_rate and self._random.random() < self.throttle_rate
+            )
+            if throttled:
+                self._throttle_next = max(0, self._throttle_next - 1)
+                self.throttled += 1
+        if throttled:
+            return _response(request, 400, _error("Throttling", "Rate exceeded"))
+        if action in ("ListRoles", "ListUsers"):
+            return _response(request, 200, self._list(action[4:-1], params))
+        if action in ("ListRoleTags", "ListUserTags"):
+            return _response(request, *self._list_tags(action[4:-4], params))
+        return _response(request, 400, _error("InvalidAction", action))
+
+    def _list(self, kind: str, params: dict) -> str:
+        start = int(params.get("Marker") or 0)
+        principals = [
+            p
+            for p in self._principals[kind]
+            if p["Path"].startswith(params.get("PathPrefix", "/"))
+        ]
+        page = principals[start : start + self.page_size]
+        truncated = start + self.page_size < len(principals)
+        members = "".join(
+            "<member>"
+            + "".join(
+                f"<{k}>{escape(v)}</{k}>" for k, v in principal.items() if k != "Tags"
+            )
+            + "</member>"
+            for principal in page
+        )
+        marker = f"<Marker>{start + self.page_size}</Marker>" if truncated else ""
+        return _result(
+            f"List{kind}s",
+            f"<{kind}s>{members}</{kind}s>"
+            f"<IsTruncated>{str(truncated).lower()}</IsTruncated>{marker}",
+        )
+
+    def _list_tags(self, kind: str, params: dict) -> typing.Tuple[int, str]:
+        name = params[f"{kind}Name"]
+        with self._lock:
+            status, code, count = self._tag_failures.get(name, (0, "", 0))
+            if count > 0:
+                self._tag_failures[name] = (status, code, count - 1)
+        if count:
+            return status, _error(code, f"Tag lookup failed for {name}")
+        matches = [p for p in self._principals[kind] if p[f"{kind}Name"] == name]
+        if not matches:
+            return (
+                404,
+                _error("NoSuchEntity", f"The {kind.lower()} {name} cannot be found"),
+            )
+        members = "".join(
+            f"<member><Key>{escape(k)}</Key><Value>{escape(v)}</Value></member>"
+            for k, v in matches[0]["Tags"].items()
+        )
+        return (
+            200,
+            _result(
+                f"List{kind}Tags",
+                f"<Tags>{members}</Tags><IsTruncated>false</IsTruncated>",
+            ),
+        )
+
+
+def _text(body: typing.Union[bytes, str, None]) -> str:
+    if isinstance(body, bytes):
+        return body.decode("utf-8")
+    return body or ""
+
+
+def _result(action: str, content: str) -> str:
+    return (
+        f'<{action}Response xmlns="{_NAMESPACE}">'
+        f"<{action}Result>{content}</{action}Result>"
+        f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+        f"</{action}Response>"
+    )
+
+
+def _error(code: str, message: str) -> str:
+    return (
+        f'<ErrorResponse xmlns="{_NAMESPACE}">'
+        f"<Error><Type>Sender</Type><Code>{code}</Code>"
+        f"<Message>{escape(message)}</Message></Error>"
+        f"<RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>"
+    )
+
+
+class _RawResponse(io.BytesIO):
+    def stream(self, **kwargs):  # pylint: disable=unused-argument
+        """ Yield the response body like urllib3 responses do """
+        contents = self.read()
+        while contents:
+            yield contents
+            contents = self.read()
+
+
+def _response(request, status: int, body: str) -> botocore.awsrequest.AWSResponse:
+    return botocore.awsrequest.AWSResponse(
+        request.url, status, {}, _RawResponse(body.encode("utf-8"))
+    )
@@ -44,7 +44,7 @@ class TestScanner(unittest.TestCase):
                     groups=["backend", "frontend"],
                 ),
                 Mapping(
-                    arn=f"arn:aws:iam::{ACCOUNT_ID}:user/teppo",
+                    arn=f"arn:aws:iam::{ACCOUNT_ID}:user/alt/teppo",
                     mapping_type=MappingType.UserToUser,
                     username="k8s-teppo",
                     groups=["admin"],
@@ -0,0 +1,172 @@
+# pylint: disable=missing-docstring
+"""
+Load tests for syncing many clusters against the fake Kubernetes API and IAM.
+
+The load tests are slow, so they're only run when the `RUN_LOAD_TESTS`
+environment variable is set to a non-empty value.
+
+The size of the tests can be changed with the following environment variables:
+
+* `LOAD_CLUSTERS`: Number of clusters to sync. Default: 20
+* `LOAD_ROLES`: Number of IAM roles. Default: 300
+* `LOAD_USERS`: Number of IAM users. Default: 100
+* `LOAD_CONCURRENCY`: Number of clusters to sync at the same time. Default: 8
+"""
+import concurrent.futures
+import math
+import os
+import sys
+import time
+import typing
+import unittest
+import kubernetes
+from eks_auth_sync import k8s, mapping, scanner
+from eks_auth_sync.store import MappingStore
+from tests.fakes.apiserver import FakeApiServer
+from tests.fakes.iam import FakeIam
+
+CLUSTERS = int(os.environ.get("LOAD_CLUSTERS", "20"))
+ROLES = int(os.environ.get("LOAD_ROLES", "300"))
+USERS = int(os.environ.get("LOAD_USERS", "100"))
+CONCURRENCY = int(os.environ.get("LOAD_CONCURRENCY", "8"))
+
+# With 10% of the Kubernetes requests failing, most of the clusters still sync
+MIN_SUCCESS_RATIO = 0.5
+
+
+def _cluster(i: int) -> str:
+    return f"cluster-{i % CLUSTERS}"
+
+
+def _fake_iam(**kwargs) -> FakeIam:
+    """ Each role and user is mapped to one cluster, and the admin role to all of them """
+    iam = FakeIam(**kwargs)
+    iam.add_role(
+        "admin",
+        tags={
+            f"eks/{_cluster(i)}/{key}": value
+            for i in range(CLUSTERS)
+            for key, value in (("type", "user"), ("username", "admin"))
+        },
+    )
+    for i in range(ROLES):
+        iam.add_role(
+            f"role-{i}",
+            path=f"/team-{i % 7}/",
+            tags={
+                f"eks/{_cluster(i)}/type": "user",
+                f"eks/{_cluster(i)}/username": f"role-{i}",
+                f"eks/{_cluster(i)}/groups": "viewer",
+            },
+        )
+    for i in range(USERS):
+        iam.add_user(f"user-{i}", tags={f"eks/{_cluster(i)}/username": f"user-{i}"})
+    return iam
+
+
+def _percentiles(samples: typing.List[float]) -> typing.Dict[str, float]:
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "p50": round(percentile(50), 3),
+        "p90": round(percentile(90), 3),
+        "p99": round(percentile(99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class _Syncer:
+    """ Syncs each cluster end-to-end like the sync command does """
+
+    def __init__(self, iam: FakeIam, server: FakeApiServer) -> None:
+        self.clients = iam.clients(concurrency=CONCURRENCY * 4)
+        self.tag_cache = scanner.TagCache()
+        self.server = server
+
+    def sync(self, cluster: str) -> float:
+        start = time.monotonic()
+        scnr = scanner.Scanner(
+            self.clients.session,
+            cluster,
+            tag_cache=self.tag_cache,
+            clients=self.clients,
+        )
+        result = scnr.scan(roles_paths=["/"], users_paths=["/"])
+        store = MappingStore(mappings=result.mappings)
+        k8s.update_aws_auth_configmap(
+            self.server.client(cluster), mapping.to_aws_auth(store)
+        )
+        return time.monotonic() - start
+
+    def sync_all(self) -> typing.Tuple[typing.List[float], typing.List[Exception]]:
+        clusters = [f"cluster-{i}" for i in range(CLUSTERS)]
+        latencies: typing.List[float] = []
+        errors: typing.List[Exception] = []
+        with concurrent.futures.ThreadPoolExecutor(CONCURRENCY) as executor:
+            futures = [executor.submit(self.sync, cluster) for cluster in clusters]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception as err:  # pylint: disable=broad-except
+                    errors.append(err)
+        return latencies, errors
+
+
+def _report(name: str, latencies: typing.List[float], **fields) -> None:
+    report = " ".join(
+        f"{k}={v}" for k, v in dict(fields, **_percentiles(latencies)).items()
+    )
+    print(f"\n{name}: clusters={len(latencies)} {report}", file=sys.stderr)
+
+
+@unittest.skipUnless(os.environ.get("RUN_LOAD_TESTS"), "RUN_LOAD_TESTS is not set")
+class TestSyncLoad(unittest.TestCase):
+    def test_sync_many_clusters(self):
+        iam = _fake_iam(latency=0.002)
+        with FakeApiServer(latency=0.005) as server:
+            syncer = _Syncer(iam, server)
+            latencies, errors = syncer.sync_all()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(latencies), CLUSTERS)
+        for i in range(CLUSTERS):
+            configmap = server.get(f"cluster-{i}", k8s.AWS_AUTH_NAMESPACE, "aws-auth")
+            self.assertIn("username: admin", configmap["data"]["mapRoles"])
+            self.assertIn(f"role-{i}\n", configmap["data"]["mapRoles"])
+        # The tags are shared between the clusters through the tag cache
+        tag_lookups = iam.calls["ListRoleTags"] + iam.calls["ListUserTags"]
+        self.assertLess(tag_lookups, (ROLES + 1 + USERS) * CLUSTERS)
+        _report(
+            "sync",
+            latencies,
+            iam_calls=sum(iam.calls.values()),
+            tag_lookups=tag_lookups,
+            k8s_requests=len(server.requests),
+        )
+
+    def test_sync_with_injected_failures(self):
+        iam = _fake_iam(throttle_rate=0.01, seed=1)
+        with FakeApiServer(latency=0.005, error_rate=0.1, seed=1) as server:
+            syncer = _Syncer(iam, server)
+            latencies, errors = syncer.sync_all()
+
+        self.assertGreater(iam.throttled, 0)
+        self.assertEqual(len(latencies) + len(errors), CLUSTERS)
+        self.assertGreaterEqual(len(latencies), math.ceil(CLUSTERS * MIN_SUCCESS_RATIO))
+        for err in errors:
+            self.assertIsInstance(err, kubernetes.client.rest.ApiException)
+            self.assertEqual(err.status, 500)
+        if latencies:
+            _report(
+                "sync with failures",
+                latencies,
+                failed=len(errors),
+                throttled=iam.throttled,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+"""
+Mappings shared by the unit tests.
+"""
+from eks_auth_sync.mapping import MappingType, Mapping, MappingSource
+
+# IAM role mapped to a Kubernetes user by tags
+MAPPING = Mapping(
+    arn="<rolearn>",
+    mapping_type=MappingType.RoleToUser,
+    username="dev",
+    groups=["viewer"],
+)
+
+# IAM role mapped to Kubernetes nodes by a rule
+NODE_MAPPING = Mapping(
+    arn="<rolearn>",
+    mapping_type=MappingType.RoleToNode,
+    username="",
+    groups=[],
+    source=MappingSource.Rule,
+)
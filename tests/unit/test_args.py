@@ -0,0 +1,24 @@
+# pylint: disable=missing-docstring
+import unittest
+from eks_auth_sync import _args
+
+
+class TestParseArgs(unittest.TestCase):
+    def test_defaults_to_sync(self):
+        args = _args.parse_args(["--cluster", "testing"])
+        self.assertEqual(args.command, _args.SYNC)
+        self.assertEqual(args.cluster, "testing")
+        self.assertFalse(args.update)
+
+    def test_command(self):
+        args = _args.parse_args(["render", "--cluster", "testing"])
+        self.assertEqual(args.command, _args.RENDER)
+        self.assertIsNone(args.from_snapshot)
+
+    def test_no_arguments(self):
+        with self.assertRaises(SystemExit):
+            _args.parse_args([])
+
+
+if __name__ == "__main__":
+    unittest.main()
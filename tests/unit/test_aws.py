@@ -0,0 +1,60 @@
+# pylint: disable=missing-docstring
+import unittest
+import boto3
+from botocore.stub import Stubber
+from eks_auth_sync import _aws
+
+SESSION = boto3.Session(
+    aws_access_key_id="key", aws_secret_access_key="secret", region_name="eu-west-1"
+)
+
+CREDENTIALS = {
+    "AccessKeyId": "assumed-key",
+    "SecretAccessKey": "assumed-secret",
+    "SessionToken": "assumed-session",
+}
+
+
+class TestClientRegistry(unittest.TestCase):
+    def test_reuses_clients(self):
+        clients = _aws.ClientRegistry(SESSION)
+
+        self.assertIs(clients.client("sts"), clients.client("sts"))
+        self.assertIs(clients.client("sts"), clients.client("sts", "eu-west-1"))
+        self.assertIsNot(clients.client("sts"), clients.client("iam"))
+        self.assertIsNot(clients.client("sts"), clients.client("sts", "us-east-1"))
+        self.assertIs(
+            clients.client("sts", credentials=CREDENTIALS),
+            clients.client("sts", credentials=dict(CREDENTIALS)),
+        )
+        self.assertIsNot(
+            clients.client("sts"), clients.client("sts", credentials=CREDENTIALS),
+        )
+
+    def test_client_config(self):
+        client = _aws.ClientRegistry(SESSION, concurrency=32).client("iam")
+        config = client.meta.config
+
+        self.assertEqual(config.max_pool_connections, 32)
+        self.assertEqual(config.retries["mode"], "adaptive")
+        self.assertEqual(config.connect_timeout, _aws.CONNECT_TIMEOUT)
+        self.assertEqual(
+            _aws.client_config(1).max_pool_connections, _aws.MIN_POOL_CONNECTIONS
+        )
+
+    def test_api_call_budget(self):
+        clients = _aws.ClientRegistry(SESSION, max_api_calls=2)
+        iam = clients.client("iam")
+        with Stubber(iam) as stubber:
+            stubber.add_response("list_roles", {"Roles": []})
+            stubber.add_response("list_users", {"Users": []})
+            stubber.add_response("list_roles", {"Roles": []})
+            iam.list_roles()
+            iam.list_users()
+            with self.assertRaises(_aws.ApiCallBudgetExceeded):
+                iam.list_roles()
+        self.assertEqual(clients.api_calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
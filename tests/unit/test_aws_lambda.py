@@ -0,0 +1,107 @@
+# pylint: disable=missing-docstring
+import unittest
+from unittest import mock
+from eks_auth_sync import aws_lambda
+from eks_auth_sync.scanner import ScanOptions, ScanResult
+from tests.unit.fixtures import MAPPING
+
+
+class _FakeContext:
+    def __init__(self, remaining_millis, request_id="request-1"):
+        self.remaining_millis = remaining_millis
+        self.aws_request_id = request_id
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+
+class TestHandler(unittest.TestCase):
+    def setUp(self):
+        self.state = aws_lambda._State()  # pylint: disable=protected-access
+        self.scanner = mock.Mock()
+        self.scanner.scan.return_value = ScanResult(mappings=[MAPPING], complete=True)
+        patches = [
+            mock.patch.object(aws_lambda, "_STATE", self.state),
+            mock.patch.object(aws_lambda, "_configure_logging"),
+            mock.patch("boto3.Session"),
+            mock.patch("eks_auth_sync.eks.api_config"),
+            mock.patch("kubernetes.client.ApiClient"),
+            mock.patch("eks_auth_sync.scanner.Scanner", return_value=self.scanner),
+            mock.patch("eks_auth_sync.k8s.update_aws_auth_configmap"),
+        ]
+        self.mocks = [p.start() for p in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def test_reuses_clients_when_warm(self):
+        event = {"clusters": ["testing"], "roles_paths": ["/"]}
+        first = aws_lambda.handler(event, _FakeContext(60000))
+        second = aws_lambda.handler(event, _FakeContext(60000))
+
+        self.assertTrue(first["cold_start"])
+        self.assertFalse(second["cold_start"])
+        self.assertTrue(second["clusters"]["testing"]["updated"])
+        self.assertEqual(second["clusters"]["testing"]["mappings"], 1)
+        self.assertIn("scan_seconds", second["clusters"]["testing"])
+        self.assertEqual(self.mocks[2].call_count, 1)  # boto3.Session
+        self.assertEqual(self.mocks[3].call_count, 1)  # eks.api_config
+        self.assertEqual(self.mocks[5].call_count, 1)  # Scanner
+        self.assertEqual(self.mocks[6].call_count, 2)  # update_aws_auth_configmap
+        self.scanner.scan.assert_called_with(
+            roles_paths=("/",),
+            users_paths=(),
+            options=ScanOptions(concurrency=4, deadline=30.0),
+        )
+
+    def test_binds_request_id(self):
+        with mock.patch("structlog.threadlocal.bind_threadlocal") as bind:
+            aws_lambda.handler({"clusters": ["testing"]}, _FakeContext(60000, "req-1"))
+            aws_lambda.handler({"clusters": ["testing"]}, _FakeContext(60000, "req-2"))
+
+        self.assertEqual(
+            [c[1]["run_id"] for c in bind.call_args_list], ["req-1", "req-2"]
+        )
+
+    def test_evicts_unused_scanners(self):
+        aws_lambda.handler({"clusters": ["a", "b"]}, _FakeContext(60000))
+        aws_lambda.handler({"clusters": ["b"]}, _FakeContext(60000))
+
+        self.assertEqual([key[0] for key in self.state.scanners], ["b"])
+        self.assertEqual([key[0] for key in self.state.k8s_clients], ["b"])
+
+    def test_skips_update_for_partial_scan(self):
+        self.scanner.scan.return_value = ScanResult(mappings=[MAPPING], complete=False)
+        result = aws_lambda.handler({"clusters": "testing"}, None)
+
+        self.assertFalse(result["clusters"]["testing"]["complete"])
+        self.assertFalse(result["clusters"]["testing"]["updated"])
+        self.mocks[6].assert_not_called()
+
+    def test_isolates_failing_cluster(self):
+        self.mocks[6].side_effect = [RuntimeError("forbidden"), None]
+
+        result = aws_lambda.handler({"clusters": ["a", "b"]}, _FakeContext(60000))
+
+        self.assertEqual(
+            result["clusters"]["a"], {"cluster": "a", "error": "forbidden"}
+        )
+        self.assertTrue(result["clusters"]["b"]["updated"])
+        self.assertEqual(self.mocks[6].call_count, 2)
+
+    def test_reads_config_from_environment(self):
+        with mock.patch.dict(
+            "os.environ",
+            {"EKS_AUTH_SYNC_CLUSTERS": "a, b", "EKS_AUTH_SYNC_UPDATE": "false"},
+        ):
+            result = aws_lambda.handler({}, None)
+
+        self.assertEqual(sorted(result["clusters"]), ["a", "b"])
+        self.mocks[6].assert_not_called()
+
+    def test_requires_clusters(self):
+        with self.assertRaises(ValueError):
+            aws_lambda.handler({}, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
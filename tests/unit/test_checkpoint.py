@@ -0,0 +1,66 @@
+# pylint: disable=missing-docstring
+import os
+import tempfile
+import unittest
+from eks_auth_sync.checkpoint import Checkpoint, ShardState, config_hash
+from tests.unit.fixtures import MAPPING
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "checkpoint.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_empty(self):
+        checkpoint = Checkpoint(self.filename, "testing")
+        self.assertEqual(checkpoint.shard("roles:/"), ShardState())
+
+    def test_save_and_load(self):
+        state = ShardState(marker="next", done=False, mappings=[MAPPING])
+        checkpoint = Checkpoint(self.filename, "testing")
+        checkpoint.update("roles:/", state)
+        checkpoint.save()
+
+        self.assertEqual(Checkpoint(self.filename, "testing").shard("roles:/"), state)
+        self.assertEqual(
+            Checkpoint(self.filename, "production").shard("roles:/"), ShardState()
+        )
+
+    def test_update_saves_periodically(self):
+        state = ShardState(marker=None, done=True, mappings=[MAPPING])
+        Checkpoint(self.filename, "testing", save_interval=0).update("users:/", state)
+        self.assertEqual(Checkpoint(self.filename, "testing").shard("users:/"), state)
+
+    def test_ignores_other_scan_config(self):
+        config = config_hash({"roles_paths": ["/"], "rules": None})
+        state = ShardState(marker="next", done=False, mappings=[MAPPING])
+        checkpoint = Checkpoint(self.filename, "testing", config)
+        checkpoint.update("roles:/", state)
+        checkpoint.save()
+
+        self.assertEqual(
+            Checkpoint(self.filename, "testing", config).shard("roles:/"), state
+        )
+        other_config = config_hash({"roles_paths": ["/teams/"], "rules": None})
+        self.assertEqual(
+            Checkpoint(self.filename, "testing", other_config).shard("roles:/"),
+            ShardState(),
+        )
+        self.assertEqual(
+            config, config_hash({"rules": None, "roles_paths": ["/"]}),
+        )
+
+    def test_clear(self):
+        checkpoint = Checkpoint(self.filename, "testing")
+        checkpoint.save()
+        self.assertTrue(os.path.exists(self.filename))
+        checkpoint.clear()
+        self.assertFalse(os.path.exists(self.filename))
+        checkpoint.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
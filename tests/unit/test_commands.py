@@ -0,0 +1,128 @@
+# pylint: disable=missing-docstring
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import yaml
+from eks_auth_sync import _args, _commands, _logging
+from eks_auth_sync.scanner import ScanResult, ScanStats
+from eks_auth_sync.snapshot import Snapshot
+from tests.unit.fixtures import MAPPING
+
+
+class _CommandTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scanner = mock.Mock()
+        self.scanner.stats = ScanStats()
+        self.stdout = io.StringIO()
+        self.clients = mock.Mock()
+        patches = [
+            mock.patch.object(_commands, "_clients", self.clients),
+            mock.patch.object(
+                _commands,
+                "_scanners",
+                side_effect=lambda clients, args, clusters, *rest: {
+                    clusters[0]: self.scanner
+                },
+            ),
+            mock.patch("sys.stdout", self.stdout),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _run(self, *argv):
+        args = _args.parse_args(list(argv))
+        _logging.configure_logging(args)
+        _commands.COMMANDS[args.command](args, _logging.RunSummary())
+
+
+class TestSync(_CommandTestCase):
+    def _scan_returns(self, result):
+        def scan(options, **kwargs):
+            if options.on_mapping:
+                for found in result.mappings:
+                    options.on_mapping(found)
+            return result
+
+        self.scanner.scan.side_effect = scan
+
+    def _sync(self, *argv):
+        self._run("sync", "--cluster", "testing", *argv)
+
+    def test_ndjson_waits_for_checks(self):
+        self._scan_returns(ScanResult(mappings=[MAPPING], complete=False))
+
+        with self.assertRaises(SystemExit):
+            self._sync("--output", "ndjson")
+        self.assertEqual(self.stdout.getvalue(), "")
+
+    def test_ndjson_streams_with_allow_partial(self):
+        self._scan_returns(ScanResult(mappings=[MAPPING], complete=False))
+
+        self._sync("--output", "ndjson", "--allow-partial")
+
+        lines = self.stdout.getvalue().splitlines()
+        self.assertEqual([json.loads(line)["arn"] for line in lines], ["<rolearn>"])
+
+    def test_ndjson_waits_for_conflict_resolution(self):
+        self._scan_returns(ScanResult(mappings=[MAPPING], complete=False))
+
+        self._sync("--output", "ndjson", "--allow-partial", "--conflict-policy", "last")
+
+        self.assertIsNone(self.scanner.scan.call_args[1]["options"].on_mapping)
+        lines = self.stdout.getvalue().splitlines()
+        self.assertEqual([json.loads(line)["arn"] for line in lines], ["<rolearn>"])
+
+    def test_ndjson_after_complete_scan(self):
+        self._scan_returns(ScanResult(mappings=[MAPPING], complete=True))
+
+        self._sync("--output", "ndjson")
+
+        self.assertEqual(json.loads(self.stdout.getvalue())["username"], "dev")
+
+    def test_degraded_ratio_leaves_out_principals_without_tag_lookups(self):
+        self._scan_returns(
+            ScanResult(mappings=[MAPPING], complete=True, degraded=["<rolearn>"])
+        )
+        self.scanner.stats.increment("principals", 100)
+        self.scanner.stats.increment("filtered", 80)
+        self.scanner.stats.increment("rule_matches", 10)
+        self.scanner.stats.increment("tag_lookups", 6)
+        self.scanner.stats.increment("tag_cache_hits", 4)
+
+        self._sync("--max-degraded-ratio", "0.1")
+        self.assertIn("<rolearn>", self.stdout.getvalue())
+
+        with self.assertRaises(SystemExit):
+            self._sync("--max-degraded-ratio", "0.09")
+
+
+class TestRender(_CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.filename = os.path.join(tmpdir, "snapshot.json")
+        Snapshot.create("testing", [MAPPING]).save(self.filename)
+
+    def test_render_from_snapshot(self):
+        self._run("render", "--cluster", "testing", "--from-snapshot", self.filename)
+
+        manifest = yaml.load(self.stdout.getvalue(), Loader=yaml.SafeLoader)
+        self.assertEqual(manifest["kind"], "ConfigMap")
+        self.assertEqual(manifest["metadata"]["name"], "aws-auth")
+        self.assertIn("rolearn: <rolearn>", manifest["data"]["mapRoles"])
+        self.clients.assert_not_called()
+        self.scanner.scan.assert_not_called()
+
+    def test_render_from_snapshot_of_other_cluster(self):
+        with self.assertRaises(ValueError):
+            self._run("render", "--cluster", "other", "--from-snapshot", self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
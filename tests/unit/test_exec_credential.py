@@ -0,0 +1,130 @@
+# pylint: disable=missing-docstring
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+from eks_auth_sync import exec_credential
+
+NOW = 1600000000.0
+
+CREDENTIALS = {
+    "AccessKeyId": "key",
+    "SecretAccessKey": "secret",
+    "SessionToken": "session",
+    "Expiration": datetime.datetime.fromtimestamp(NOW + 600, datetime.timezone.utc),
+}
+
+
+class TestToken(unittest.TestCase):
+    def test_to_exec_credential(self):
+        token = exec_credential.Token(token="k8s-aws-v1.abc", expiration=NOW)
+        self.assertEqual(
+            token.to_exec_credential(),
+            {
+                "kind": "ExecCredential",
+                "apiVersion": "client.authentication.k8s.io/v1beta1",
+                "spec": {},
+                "status": {
+                    "expirationTimestamp": "2020-09-13T12:26:40Z",
+                    "token": "k8s-aws-v1.abc",
+                },
+            },
+        )
+
+    def test_exec_api_version(self):
+        self.assertEqual(
+            exec_credential.exec_api_version({}), exec_credential.API_VERSION
+        )
+        self.assertEqual(
+            exec_credential.exec_api_version(
+                {
+                    "KUBERNETES_EXEC_INFO": '{"apiVersion": "client.authentication.k8s.io/v1"}'
+                }
+            ),
+            "client.authentication.k8s.io/v1",
+        )
+        self.assertEqual(
+            exec_credential.exec_api_version({"KUBERNETES_EXEC_INFO": "{"}),
+            exec_credential.API_VERSION,
+        )
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.now = NOW
+        patches = [
+            mock.patch("boto3.Session"),
+            mock.patch(
+                "eks_auth_sync._eks_auth.get_token", return_value="k8s-aws-v1.abc"
+            ),
+            mock.patch("eks_auth_sync._eks_auth.assume_role", return_value=CREDENTIALS),
+        ]
+        _, self.get_token, self.assume_role = [p.start() for p in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def _cache(self):
+        return exec_credential.TokenCache(
+            directory=self.directory.name, clock=lambda: self.now
+        )
+
+    def test_caches_tokens_on_disk(self):
+        first = self._cache().token("testing")
+        cache = self._cache()
+        second = cache.token("testing")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first.expiration, NOW + exec_credential.TOKEN_LIFETIME)
+        self.assertEqual(cache.hits, 1)
+        self.get_token.assert_called_once()
+
+    def test_refreshes_expiring_tokens(self):
+        self._cache().token("testing")
+        self.now += exec_credential.TOKEN_LIFETIME - exec_credential.REFRESH_MARGIN
+        self._cache().token("testing")
+        self.assertEqual(self.get_token.call_count, 2)
+
+    def test_caches_role_credentials_across_clusters(self):
+        first = self._cache().token("first", role_arn="<rolearn>")
+        self._cache().token("second", role_arn="<rolearn>")
+
+        self.assume_role.assert_called_once()
+        self.assertEqual(first.expiration, NOW + 600)
+        credentials = self.get_token.call_args[1]["credentials"]
+        self.assertEqual(credentials["SessionToken"], "session")
+        self.assertEqual(credentials["Expiration"], NOW + 600)
+
+    def test_separates_aws_identities(self):
+        with mock.patch.dict(os.environ, {"AWS_PROFILE": "first"}):
+            self._cache().token("testing", role_arn="<rolearn>")
+        with mock.patch.dict(os.environ, {"AWS_PROFILE": "second"}):
+            cache = self._cache()
+            cache.token("testing", role_arn="<rolearn>")
+
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(self.get_token.call_count, 2)
+        self.assertEqual(self.assume_role.call_count, 2)
+
+    def test_ignores_corrupted_cache_files(self):
+        self._cache().token("testing")
+        for filename in os.listdir(self.directory.name):
+            with open(
+                os.path.join(self.directory.name, filename), "w", encoding="utf-8"
+            ) as fp:
+                fp.write("{")
+        self._cache().token("testing")
+        self.assertEqual(self.get_token.call_count, 2)
+
+    def test_without_directory(self):
+        cache = exec_credential.TokenCache(clock=lambda: self.now)
+        cache.token("testing")
+        cache.token("testing")
+        self.assertEqual(self.get_token.call_count, 2)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
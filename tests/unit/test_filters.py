@@ -0,0 +1,55 @@
+# pylint: disable=missing-docstring
+import unittest
+from eks_auth_sync.filters import PrincipalFilter
+
+
+class TestPrincipalFilter(unittest.TestCase):
+    def test_default(self):
+        pfilter = PrincipalFilter()
+        self.assertTrue(pfilter.accepts("developers", "/"))
+        self.assertFalse(
+            pfilter.accepts(
+                "AWSServiceRoleForSupport", "/aws-service-role/support.amazonaws.com/"
+            )
+        )
+
+    def test_service_roles(self):
+        pfilter = PrincipalFilter(exclude_service_roles=False)
+        self.assertTrue(
+            pfilter.accepts(
+                "AWSServiceRoleForSupport", "/aws-service-role/support.amazonaws.com/"
+            )
+        )
+
+    def test_globs(self):
+        pfilter = PrincipalFilter(
+            include_names=["eks-*", "k8s-*"],
+            exclude_names=["*-legacy"],
+            exclude_paths=["/tmp/*"],
+        )
+        cases = (
+            ("eks-admins", "/", True),
+            ("k8s-developers", "/teams/", True),
+            ("developers", "/", False),
+            ("eks-admins-legacy", "/", False),
+            ("eks-admins", "/tmp/", False),
+        )
+        for name, path, expected in cases:
+            self.assertEqual(pfilter.accepts(name, path), expected, (name, path))
+
+    def test_regexes(self):
+        pfilter = PrincipalFilter(
+            include_paths=["regex:/teams/[a-z]+/"], exclude_names=["regex:.*[0-9]"]
+        )
+        cases = (
+            ("developers", "/teams/backend/", True),
+            ("developers", "/teams/", False),
+            ("developers", "/teams/backend/x/", False),
+            ("developers2", "/teams/backend/", False),
+        )
+        for name, path, expected in cases:
+            self.assertEqual(pfilter.accepts(name, path), expected, (name, path))
+
+
+if __name__ == "__main__":
+    unittest.main()
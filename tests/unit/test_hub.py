@@ -0,0 +1,230 @@
+# pylint: disable=missing-docstring
+import json
+import os
+import socket
+import threading
+import ssl
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+from eks_auth_sync import agent, hub
+from eks_auth_sync.scanner import Listing, ScanResult, Scanner, TagCache
+from tests.fakes.iam import FakeIam
+from tests.unit.fixtures import MAPPING
+
+CERTS = os.path.join(os.path.dirname(__file__), "..", "fakes", "certs")
+CERT_FILE = os.path.join(CERTS, "hub.pem")
+KEY_FILE = os.path.join(CERTS, "hub-key.pem")
+TOKEN = "s3cret"
+
+
+class _FakeScanner:
+    def __init__(self, mappings):
+        self.mappings = mappings
+
+    def list_principals(self, **kwargs):
+        return Listing(roles=[], users=[])
+
+    def map_principals(self, listing, **kwargs):
+        return ScanResult(mappings=list(self.mappings), complete=True)
+
+
+class _FailingScanner(_FakeScanner):
+    def __init__(self):
+        super().__init__([])
+
+    def map_principals(self, listing, **kwargs):
+        raise RuntimeError("scan failed")
+
+
+class TestHub(unittest.TestCase):
+    def setUp(self):
+        self.scanner = _FakeScanner([MAPPING])
+        self.hub = hub.Hub(
+            scanners={"testing": self.scanner, "broken": _FailingScanner()},
+            tag_cache=TagCache(),
+        )
+        self.hub.refresh()
+        self.server = hub.create_server(
+            self.hub,
+            "127.0.0.1",
+            0,
+            TOKEN,
+            hub.server_ssl_context(CERT_FILE, KEY_FILE),
+        )
+        self.base_url = f"https://127.0.0.1:{self.server.server_address[1]}"
+        self.ssl_context = ssl.create_default_context(cafile=CERT_FILE)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _agent(self):
+        return agent.Agent(
+            self.base_url,
+            "testing",
+            client_factory=lambda: None,
+            token=TOKEN,
+            ca_file=CERT_FILE,
+        )
+
+    def _get(self, path, etag=None, token=TOKEN):
+        request = urllib.request.Request(self.base_url + path)
+        if token:
+            request.add_header("Authorization", f"Bearer {token}")
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(
+                request, timeout=5, context=self.ssl_context
+            ) as response:
+                return response.status, response.headers.get("ETag"), response.read()
+        except urllib.error.HTTPError as err:
+            return err.code, err.headers.get("ETag"), b""
+
+    def test_document(self):
+        status, etag, body = self._get("/clusters/testing/aws-auth")
+        self.assertEqual(status, 200)
+        self.assertEqual(etag, self.hub.document("testing").etag)
+        document = json.loads(body)
+        self.assertEqual(document["cluster"], "testing")
+        self.assertEqual(document["mappings"], 1)
+        self.assertIn("mapRoles", document["data"])
+
+    def test_not_modified(self):
+        _, etag, _ = self._get("/clusters/testing/aws-auth")
+        status, _, _ = self._get("/clusters/testing/aws-auth", etag=etag)
+        self.assertEqual(status, 304)
+
+        self.scanner.mappings = []
+        self.hub.refresh()
+        status, new_etag, _ = self._get("/clusters/testing/aws-auth", etag=etag)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_etag, etag)
+
+    def test_query_string(self):
+        status, _, body = self._get("/clusters/testing/aws-auth?watch=1")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["cluster"], "testing")
+
+    def test_if_none_match_list(self):
+        etag = self.hub.document("testing").etag
+        for header in (f'"other", {etag}', f"W/{etag}", "*"):
+            status, _, _ = self._get("/clusters/testing/aws-auth", etag=header)
+            self.assertEqual(status, 304, header)
+        status, _, _ = self._get("/clusters/testing/aws-auth", etag='"other"')
+        self.assertEqual(status, 200)
+
+    def test_unauthorized(self):
+        self.assertEqual(self._get("/clusters/testing/aws-auth", token=None)[0], 401)
+        self.assertEqual(self._get("/clusters/testing/aws-auth", token="wrong")[0], 401)
+        self.assertEqual(self._get("/healthz", token=None)[0], 200)
+
+    def test_not_found(self):
+        self.assertEqual(self._get("/clusters/broken/aws-auth")[0], 404)
+        self.assertEqual(self._get("/clusters/unknown/aws-auth")[0], 404)
+        self.assertEqual(self._get("/healthz")[0], 200)
+
+    def test_stalled_handshake(self):
+        self.server.handshake_timeout = 0.5
+        with socket.create_connection(self.server.server_address[:2]) as stalled:
+            stalled.settimeout(5)
+            self.assertEqual(self._get("/clusters/testing/aws-auth")[0], 200)
+            self.assertEqual(stalled.recv(1), b"")
+
+    def test_agent(self):
+        hub_agent = self._agent()
+        with mock.patch("eks_auth_sync.k8s.update_aws_auth_configmap") as update:
+            self.assertTrue(hub_agent.sync())
+            self.assertFalse(hub_agent.sync())
+            self.assertEqual(update.call_count, 1)
+            configmap = update.call_args[0][1]
+            self.assertEqual(configmap.metadata["name"], "aws-auth")
+            self.assertEqual(
+                configmap.data, json.loads(self.hub.document("testing").body)["data"]
+            )
+
+    def test_agent_skips_empty(self):
+        self.scanner.mappings = []
+        self.hub.refresh()
+        hub_agent = self._agent()
+        with mock.patch("eks_auth_sync.k8s.update_aws_auth_configmap") as update:
+            self.assertFalse(hub_agent.sync())
+            self.assertEqual(update.call_count, 0)
+
+    def test_agent_requires_https(self):
+        with self.assertRaises(ValueError):
+            agent.Agent(
+                self.base_url.replace("https", "http"),
+                "testing",
+                client_factory=lambda: None,
+                token=TOKEN,
+            )
+
+    def test_agent_verifies_server(self):
+        hub_agent = agent.Agent(
+            self.base_url, "testing", client_factory=lambda: None, token=TOKEN
+        )
+        with self.assertRaises(urllib.error.URLError):
+            hub_agent.sync()
+
+
+class TestHubRefresh(unittest.TestCase):
+    def test_lists_principals_once(self):
+        iam = FakeIam(page_size=2)
+        for i in range(5):
+            iam.add_role(
+                f"dev-{i}",
+                tags={
+                    "eks/testing/type": "user",
+                    "eks/staging/type": "user",
+                    "eks/testing/username": f"dev-{i}",
+                    "eks/staging/username": f"dev-{i}",
+                },
+            )
+        iam.add_role("node", tags={"eks/staging/type": "node"})
+        iam.add_user("teppo", tags={"eks/testing/username": "teppo"})
+        clients = iam.clients()
+        tag_cache = TagCache()
+        scanners = {
+            cluster: Scanner(
+                clients.session, cluster, tag_cache=tag_cache, clients=clients
+            )
+            for cluster in ("testing", "staging")
+        }
+        mapping_hub = hub.Hub(
+            scanners=scanners, tag_cache=tag_cache, roles_paths=["/"], users_paths=["/"]
+        )
+
+        mapping_hub.refresh()
+
+        self.assertEqual(iam.calls["ListRoles"], 3)
+        self.assertEqual(iam.calls["ListUsers"], 1)
+        self.assertEqual(iam.calls["ListRoleTags"], 6)
+        self.assertEqual(
+            json.loads(mapping_hub.document("testing").body)["mappings"], 6
+        )
+        self.assertEqual(
+            json.loads(mapping_hub.document("staging").body)["mappings"], 6
+        )
+
+
+class TestTagCache(unittest.TestCase):
+    def test_cache(self):
+        cache = TagCache()
+        self.assertIsNone(cache.get(("role", "dev")))
+        cache.put(("role", "dev"), [])
+        self.assertEqual(cache.get(("role", "dev")), [])
+        cache.clear()
+        self.assertIsNone(cache.get(("role", "dev")))
+
+    def test_ttl(self):
+        cache = TagCache(ttl=-1)
+        cache.put(("role", "dev"), [])
+        self.assertIsNone(cache.get(("role", "dev")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+# pylint: disable=missing-docstring
+import unittest
+from unittest import mock
+import kubernetes
+from eks_auth_sync import k8s
+from eks_auth_sync.mapping import MappingType, Mapping, to_aws_auth
+from tests.fakes.apiserver import FakeApiServer
+
+
+def _item(name: str, arn: str, username: str, managed: bool = True) -> dict:
+    labels = {k8s.MANAGED_BY_LABEL: k8s.MANAGED_BY} if managed else {}
+    return {
+        "metadata": {"name": name, "labels": labels},
+        "spec": {"arn": arn, "username": username, "groups": []},
+    }
+
+
+def _role(arn: str, username: str) -> Mapping:
+    return Mapping(
+        arn=arn, mapping_type=MappingType.RoleToUser, username=username, groups=[]
+    )
+
+
+class TestSyncIamIdentityMappings(unittest.TestCase):
+    def test_sync(self):
+        client = mock.Mock()
+        api = mock.Mock()
+        api.list_cluster_custom_object.return_value = {
+            "items": [
+                _item("kept", "<kept>", "kept"),
+                _item("changed", "<changed>", "old"),
+                _item("removed", "<removed>", "removed"),
+                _item("manual", "<manual>", "manual", managed=False),
+            ]
+        }
+        mappings = [
+            _role("<kept>", "kept"),
+            _role("<changed>", "new"),
+            _role("<added>", "added"),
+            _role("<manual>", "other"),
+        ]
+        with mock.patch("kubernetes.client.CustomObjectsApi", return_value=api):
+            changes = k8s.sync_iam_identity_mappings(client, mappings)
+
+        self.assertEqual(changes, k8s.IdentityMappingChanges(1, 1, 1))
+        self.assertEqual(api.list_cluster_custom_object.call_count, 1)
+
+        created = api.create_cluster_custom_object.call_args[0][3]
+        self.assertEqual(
+            created["spec"], {"arn": "<added>", "username": "added", "groups": []}
+        )
+        self.assertEqual(
+            created["metadata"]["labels"], {k8s.MANAGED_BY_LABEL: k8s.MANAGED_BY}
+        )
+
+        patched_name, patch = api.patch_cluster_custom_object.call_args[0][3:5]
+        self.assertEqual(patched_name, "changed")
+        self.assertEqual(patch["spec"]["username"], "new")
+
+        self.assertEqual(api.delete_cluster_custom_object.call_args[0][3], "removed")
+
+    def test_sync_deletes_duplicates(self):
+        client = mock.Mock()
+        api = mock.Mock()
+        # pylint: disable=protected-access
+        own_name = k8s._identity_mapping_name("<dup>")
+        api.list_cluster_custom_object.return_value = {
+            "items": [
+                _item("copy-a", "<dup>", "old"),
+                _item(own_name, "<dup>", "dev"),
+                _item("copy-b", "<dup>", "dev"),
+                _item("gone-a", "<gone>", "gone"),
+                _item("gone-b", "<gone>", "gone"),
+            ]
+        }
+        with mock.patch("kubernetes.client.CustomObjectsApi", return_value=api):
+            changes = k8s.sync_iam_identity_mappings(client, [_role("<dup>", "dev")])
+
+        self.assertEqual(changes, k8s.IdentityMappingChanges(0, 0, 4))
+        api.create_cluster_custom_object.assert_not_called()
+        api.patch_cluster_custom_object.assert_not_called()
+        self.assertEqual(
+            sorted(c[0][3] for c in api.delete_cluster_custom_object.call_args_list),
+            ["copy-a", "copy-b", "gone-a", "gone-b"],
+        )
+
+
+class TestAwsAuthConfigMap(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeApiServer()
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.client = self.server.client("testing")
+
+    def _configmap(self):
+        return self.server.get("testing", k8s.AWS_AUTH_NAMESPACE, k8s.AWS_AUTH_NAME)
+
+    def test_update_creates_missing_configmap(self):
+        self.assertIsNone(k8s.read_aws_auth_configmap(self.client))
+
+        k8s.update_aws_auth_configmap(self.client, to_aws_auth([_role("<a>", "a")]))
+
+        self.assertIn("rolearn: <a>", self._configmap()["data"]["mapRoles"])
+        self.assertEqual(
+            [method for method, _ in self.server.requests], ["GET", "GET", "POST"]
+        )
+
+    def test_update_replaces_existing_configmap(self):
+        k8s.update_aws_auth_configmap(self.client, to_aws_auth([_role("<a>", "a")]))
+        version = self._configmap()["metadata"]["resourceVersion"]
+
+        k8s.update_aws_auth_configmap(self.client, to_aws_auth([_role("<b>", "b")]))
+
+        configmap = k8s.read_aws_auth_configmap(self.client)
+        self.assertIn("rolearn: <b>", configmap.data["mapRoles"])
+        self.assertNotEqual(configmap.metadata.resource_version, version)
+
+    def test_update_fails_on_server_errors(self):
+        self.server.fail_next(500)
+
+        with self.assertRaises(kubernetes.client.rest.ApiException) as ctx:
+            k8s.update_aws_auth_configmap(self.client, to_aws_auth([]))
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertIsNone(self._configmap())
+
+    def test_merge_keeps_other_entries(self):
+        k8s.update_aws_auth_configmap(
+            self.client, to_aws_auth([_role("<a>", "a"), _role("<b>", "b")])
+        )
+        node = Mapping(
+            arn="<node>", mapping_type=MappingType.RoleToNode, username="", groups=[]
+        )
+
+        changed = k8s.merge_aws_auth_configmap(
+            self.client, [_role("<b>", "new-b"), node]
+        )
+
+        self.assertEqual(changed, 2)
+        map_roles = self._configmap()["data"]["mapRoles"]
+        self.assertIn("username: a\n", map_roles)
+        self.assertIn("username: new-b\n", map_roles)
+        self.assertNotIn("username: b\n", map_roles)
+        self.assertIn("rolearn: <node>", map_roles)
+
+    def test_merge_skips_unchanged(self):
+        k8s.merge_aws_auth_configmap(self.client, [_role("<a>", "a")])
+        requests = len(self.server.requests)
+
+        self.assertEqual(
+            k8s.merge_aws_auth_configmap(self.client, [_role("<a>", "a")]), 0
+        )
+        self.assertEqual(
+            [method for method, _ in self.server.requests[requests:]], ["GET"]
+        )
+
+    def test_merge_retries_on_conflict(self):
+        k8s.update_aws_auth_configmap(self.client, to_aws_auth([_role("<a>", "a")]))
+        read = k8s.read_aws_auth_configmap
+        concurrent_changes = [to_aws_auth([_role("<a>", "a"), _role("<c>", "c")])]
+
+        def read_and_change(client):
+            configmap = read(client)
+            if concurrent_changes:
+                k8s.update_aws_auth_configmap(self.client, concurrent_changes.pop())
+            return configmap
+
+        with mock.patch.object(k8s, "read_aws_auth_configmap", read_and_change):
+            changed = k8s.merge_aws_auth_configmap(self.client, [_role("<b>", "b")])
+
+        self.assertEqual(changed, 1)
+        map_roles = self._configmap()["data"]["mapRoles"]
+        for arn in ("<a>", "<b>", "<c>"):
+            self.assertIn(f"rolearn: {arn}", map_roles)
+        self.assertEqual([method for method, _ in self.server.requests].count("PUT"), 3)
+
+    def test_clusters_are_separate(self):
+        k8s.update_aws_auth_configmap(self.client, to_aws_auth([_role("<a>", "a")]))
+
+        other = k8s.read_aws_auth_configmap(self.server.client("other"))
+        self.assertIsNone(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# pylint: disable=missing-docstring
+import logging
+import unittest
+import structlog
+from eks_auth_sync import _logging
+from eks_auth_sync._logging import RunSummary
+
+
+class _FakeLogger:
+    def __init__(self):
+        self.events = []
+
+    def info(self, event, **kw):
+        self.events.append((event, kw))
+
+
+class TestRunSummary(unittest.TestCase):
+    def test_log(self):
+        logger = _FakeLogger()
+        summary = RunSummary()
+        summary.update(command="sync", mappings=2)
+        with summary.timed("scan"):
+            pass
+        summary.log(logger)
+
+        self.assertEqual(len(logger.events), 1)
+        event, fields = logger.events[0]
+        self.assertEqual(event, "run summary")
+        self.assertEqual(fields["command"], "sync")
+        self.assertEqual(fields["mappings"], 2)
+        self.assertIn("scan_seconds", fields)
+        self.assertIn("total_seconds", fields)
+
+    def test_timed_failure(self):
+        summary = RunSummary()
+        with self.assertRaises(ValueError):
+            with summary.timed("update"):
+                raise ValueError("failed")
+        logger = _FakeLogger()
+        summary.log(logger)
+        self.assertIn("update_seconds", logger.events[0][1])
+
+
+class TestLevelFiltering(unittest.TestCase):
+    def setUp(self):
+        self.stdlib_logger = logging.getLogger("eks_auth_sync.tests")
+        self.addCleanup(self.stdlib_logger.setLevel, self.stdlib_logger.level)
+        self.processed = []
+
+    def _logger(self, level):
+        self.stdlib_logger.setLevel(level)
+        return _logging._LevelFilteringBoundLogger(  # pylint: disable=protected-access
+            self.stdlib_logger, processors=[self._process], context={}
+        )
+
+    def _process(self, logger, method_name, event_dict):
+        self.processed.append((method_name, event_dict["event"]))
+        raise structlog.DropEvent
+
+    def test_drops_events_below_level(self):
+        logger = self._logger(logging.INFO)
+        logger.debug("dropped", payload=1)
+        logger.info("kept")
+        logger.warning("also kept")
+        self.assertEqual(self.processed, [("info", "kept"), ("warning", "also kept")])
+
+    def test_keeps_debug_events_at_debug_level(self):
+        logger = self._logger(logging.DEBUG)
+        logger.bind(cluster="testing").debug("kept")
+        self.assertEqual(self.processed, [("debug", "kept")])
+
+    def test_debug_enabled(self):
+        app_logger = logging.getLogger("eks_auth_sync")
+        self.addCleanup(app_logger.setLevel, app_logger.level)
+        app_logger.setLevel(logging.DEBUG)
+        self.assertTrue(_logging.debug_enabled())
+        app_logger.setLevel(logging.INFO)
+        self.assertFalse(_logging.debug_enabled())
+
+
+if __name__ == "__main__":
+    unittest.main()
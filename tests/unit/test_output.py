@@ -0,0 +1,66 @@
+# pylint: disable=missing-docstring
+import io
+import json
+import unittest
+import yaml
+from eks_auth_sync import output
+from eks_auth_sync.mapping import MappingType, Mapping
+from tests.unit.fixtures import NODE_MAPPING
+
+MAPPINGS = [
+    Mapping(
+        arn="<userarn>",
+        mapping_type=MappingType.UserToUser,
+        username="seppo",
+        groups=["backend"],
+    ),
+    NODE_MAPPING,
+]
+
+RECORDS = [
+    {
+        "arn": "<userarn>",
+        "type": "user-to-user",
+        "username": "seppo",
+        "groups": ["backend"],
+        "source": "tag",
+    },
+    {
+        "arn": "<rolearn>",
+        "type": "role-to-node",
+        "username": "",
+        "groups": [],
+        "source": "rule",
+    },
+]
+
+
+class TestOutput(unittest.TestCase):
+    def test_yaml(self):
+        stream = io.StringIO()
+        output.write(output.YAML, MAPPINGS, stream)
+        self.assertEqual(
+            yaml.load(stream.getvalue(), Loader=yaml.SafeLoader),
+            [m.to_aws_auth_entry() for m in MAPPINGS],
+        )
+
+    def test_json(self):
+        stream = io.StringIO()
+        output.write(output.JSON, MAPPINGS, stream)
+        self.assertEqual(json.loads(stream.getvalue()), RECORDS)
+
+    def test_ndjson(self):
+        stream = io.StringIO()
+        writer = output.NdjsonWriter(stream)
+        for mapping in MAPPINGS + MAPPINGS:
+            writer.write(mapping)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], RECORDS)
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            output.write("xml", MAPPINGS, io.StringIO())
+
+
+if __name__ == "__main__":
+    unittest.main()
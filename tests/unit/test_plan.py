@@ -0,0 +1,56 @@
+# pylint: disable=missing-docstring
+import unittest
+from eks_auth_sync import plan
+from eks_auth_sync.mapping import MappingType, Mapping, to_aws_auth
+
+
+def _role(arn: str, username: str, groups: list) -> Mapping:
+    return Mapping(
+        arn=arn, mapping_type=MappingType.RoleToUser, username=username, groups=groups
+    )
+
+
+class TestPlan(unittest.TestCase):
+    current = [
+        _role("<kept>", "kept", ["viewer"]),
+        _role("<changed>", "changed", ["viewer"]),
+        _role("<removed>", "removed", []),
+    ]
+    desired = [
+        _role("<kept>", "kept", ["viewer"]),
+        _role("<changed>", "changed", ["admin"]),
+        _role("<added>", "added", []),
+    ]
+
+    def test_no_configmap(self):
+        changes = plan.create(None, self.desired)
+        self.assertEqual([c.arn for c in changes.added], [m.arn for m in self.desired])
+        self.assertEqual(changes.removed, [])
+        self.assertEqual(changes.changed, [])
+
+    def test_changes(self):
+        changes = plan.create(to_aws_auth(self.current), self.desired)
+        self.assertTrue(changes.has_changes)
+        self.assertEqual([c.arn for c in changes.added], ["<added>"])
+        self.assertEqual([c.arn for c in changes.removed], ["<removed>"])
+        self.assertEqual(
+            changes.changed,
+            [
+                plan.Change(
+                    "<changed>",
+                    self.current[1].to_aws_auth_entry(),
+                    self.desired[1].to_aws_auth_entry(),
+                )
+            ],
+        )
+        self.assertTrue(
+            changes.format().endswith("1 to add, 1 to change, 1 to remove.")
+        )
+
+    def test_no_changes(self):
+        changes = plan.create(to_aws_auth(self.current), self.current)
+        self.assertFalse(changes.has_changes)
+
+
+if __name__ == "__main__":
+    unittest.main()
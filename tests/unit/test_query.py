@@ -0,0 +1,149 @@
+# pylint: disable=missing-docstring
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from eks_auth_sync import query
+from eks_auth_sync.mapping import MappingType, Mapping, NODE_GROUPS
+from eks_auth_sync.snapshot import Snapshot
+
+
+def _snapshot(cluster: str = "testing") -> Snapshot:
+    return Snapshot.create(
+        cluster,
+        [
+            Mapping(
+                arn="<admin>",
+                mapping_type=MappingType.RoleToUser,
+                username="admin",
+                groups=["system:masters", "viewers"],
+            ),
+            Mapping(
+                arn="<dev>",
+                mapping_type=MappingType.UserToUser,
+                username="dev",
+                groups=["viewers"],
+            ),
+            Mapping(
+                arn="<node>",
+                mapping_type=MappingType.RoleToNode,
+                username="",
+                groups=[],
+            ),
+        ],
+        {"<dev>": {"kind": "user", "name": "dev", "path": "/", "id": "x"}},
+    )
+
+
+class TestQueryIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.filename = os.path.join(self.tmpdir.name, "snapshot.json")
+
+    def test_query(self):
+        _snapshot().save(self.filename)
+        index = query.QueryIndex.build(self.filename)
+
+        self.assertEqual(len(index.query()), 3)
+        self.assertEqual(
+            [r["arn"] for r in index.query(group="viewers")], ["<admin>", "<dev>"]
+        )
+        self.assertEqual(
+            [r["arn"] for r in index.query(group="viewers", username="dev")], ["<dev>"]
+        )
+        self.assertEqual(index.query(arn="<dev>")[0]["principal"]["name"], "dev")
+        self.assertEqual(
+            index.query(arn="<node>")[0]["groups"], list(NODE_GROUPS),
+        )
+        self.assertEqual(index.query(arn="<dev>", cluster="other"), [])
+        self.assertEqual(len(index.query(cluster="testing")), 3)
+        with self.assertRaises(ValueError):
+            index.query(name="dev")
+
+    def test_open_uses_saved_index(self):
+        _snapshot().save(self.filename)
+        query.QueryIndex.build(self.filename).save_for(self.filename)
+
+        with mock.patch.object(query.QueryIndex, "build") as build:
+            index = query.QueryIndex.open(self.filename)
+        build.assert_not_called()
+        self.assertEqual(index.query(username="admin")[0]["arn"], "<admin>")
+
+    def test_saved_index_refers_to_snapshot(self):
+        _snapshot().save(self.filename)
+        query.QueryIndex.open(self.filename)
+
+        with open(query.index_filename(self.filename), encoding="utf-8") as fp:
+            contents = json.load(fp)
+        self.assertEqual(contents["cluster"], "testing")
+        self.assertEqual(sorted(contents["positions"]), ["arn", "group", "username"])
+        self.assertEqual(contents["positions"]["group"]["viewers"], [0, 1])
+        with open(self.filename, encoding="utf-8") as fp:
+            text = fp.read()
+        mapping_offset, principal_offset = contents["offsets"][1]
+        self.assertTrue(text.startswith('{"arn":"<dev>"', mapping_offset))
+        self.assertTrue(text.startswith('{"kind":"user"', principal_offset))
+        self.assertIsNone(contents["offsets"][0][1])
+
+    def test_open_without_saving_index(self):
+        _snapshot().save(self.filename)
+
+        with mock.patch.object(query, "atomic_write", side_effect=PermissionError()):
+            index = query.QueryIndex.open(self.filename)
+
+        self.assertEqual(index.query(arn="<admin>")[0]["username"], "admin")
+        self.assertFalse(os.path.exists(query.index_filename(self.filename)))
+
+    def test_snapshot_changed_during_query(self):
+        _snapshot().save(self.filename)
+        query.QueryIndex.open(self.filename)
+        index = query.QueryIndex.open(self.filename)
+
+        _snapshot("other").save(self.filename)
+
+        with self.assertRaises(ValueError):
+            index.query(arn="<admin>")
+
+    def test_build_from_formatted_snapshot(self):
+        with open(self.filename, "w", encoding="utf-8") as fp:
+            json.dump(
+                {
+                    "version": 1,
+                    "cluster": "testing",
+                    "mappings": [m.to_dict() for m in _snapshot().mappings],
+                    "principals": {"<dev>": {"name": "dev"}},
+                },
+                fp,
+                indent=2,
+            )
+
+        index = query.QueryIndex.build(self.filename)
+
+        self.assertEqual(index.query(username="dev")[0]["principal"], {"name": "dev"})
+        self.assertEqual(len(index.query(group="viewers")), 2)
+
+    def test_build_unsupported_snapshot(self):
+        with open(self.filename, "w", encoding="utf-8") as fp:
+            json.dump({"version": 2, "cluster": "testing", "mappings": []}, fp)
+
+        with self.assertRaises(ValueError):
+            query.QueryIndex.build(self.filename)
+
+    def test_open_rebuilds_stale_index(self):
+        _snapshot().save(self.filename)
+        self.assertEqual(len(query.QueryIndex.open(self.filename).query()), 3)
+
+        _snapshot("other").save(self.filename)
+        index = query.QueryIndex.open(self.filename)
+
+        self.assertEqual(len(index.query(cluster="other")), 3)
+        self.assertEqual(
+            query.QueryIndex.load(query.index_filename(self.filename)).source,
+            index.source,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# pylint: disable=missing-docstring
+import unittest
+from eks_auth_sync.mapping import MappingType, Mapping, MappingSource
+from eks_auth_sync.rules import Rule, RuleSet
+from tests.unit.fixtures import NODE_MAPPING
+
+SSO_PATH = "/aws-reserved/sso.amazonaws.com/"
+
+
+class TestRuleSet(unittest.TestCase):
+    ruleset = RuleSet(
+        [
+            Rule.from_dict(
+                {
+                    "mapping_type": "role-to-user",
+                    "name": "AWSReservedSSO_(?P<permset>[A-Za-z]+)_[0-9a-f]+",
+                    "path": "/aws-reserved/sso\\.amazonaws\\.com/",
+                    "username": "sso-${permset}:{{SessionName}}",
+                    "groups": ["sso-${permset}", "sso"],
+                }
+            ),
+            Rule.from_dict(
+                {"mapping_type": "role-to-node", "name": "eks-node-.*", "path": "/"}
+            ),
+            Rule.from_dict(
+                {
+                    "mapping_type": "user-to-user",
+                    "path": "/people/",
+                    "username": "${name}",
+                }
+            ),
+        ]
+    )
+
+    def test_match_role_templates(self):
+        role = {"RoleName": "AWSReservedSSO_Admin_0123abcd", "Path": SSO_PATH}
+        self.assertEqual(
+            self.ruleset.match_role(role, "<rolearn>"),
+            Mapping(
+                arn="<rolearn>",
+                mapping_type=MappingType.RoleToUser,
+                username="sso-Admin:{{SessionName}}",
+                groups=["sso-Admin", "sso"],
+                source=MappingSource.Rule,
+            ),
+        )
+
+    def test_match_node_role(self):
+        role = {"RoleName": "eks-node-a", "Path": "/"}
+        self.assertEqual(
+            self.ruleset.match_role(role, "<rolearn>"), NODE_MAPPING,
+        )
+
+    def test_match_user(self):
+        user = {"UserName": "seppo", "Path": "/people/"}
+        self.assertEqual(
+            self.ruleset.match_user(user, "<userarn>"),
+            Mapping(
+                arn="<userarn>",
+                mapping_type=MappingType.UserToUser,
+                username="seppo",
+                groups=[],
+                source=MappingSource.Rule,
+            ),
+        )
+
+    def test_no_match(self):
+        self.assertIsNone(
+            self.ruleset.match_role({"RoleName": "eks-node-a", "Path": "/x/"}, "")
+        )
+        self.assertIsNone(
+            self.ruleset.match_role({"RoleName": "seppo", "Path": "/people/"}, "")
+        )
+        self.assertIsNone(
+            self.ruleset.match_user({"UserName": "eks-node-a", "Path": "/"}, "")
+        )
+
+    def test_invalid_rules(self):
+        invalid_rules = (
+            {"mapping_type": "role-to-user", "name": "x"},
+            {"mapping_type": "role-to-user", "username": "${missing}"},
+            {"mapping_type": "user-to-user", "username": "$"},
+        )
+        for rule in invalid_rules:
+            with self.assertRaises(ValueError):
+                _ = RuleSet([Rule.from_dict(rule)])
+
+
+if __name__ == "__main__":
+    unittest.main()
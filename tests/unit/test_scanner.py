@@ -0,0 +1,293 @@
+# pylint: disable=missing-docstring
+import unittest
+import unittest.mock
+import botocore.exceptions
+from eks_auth_sync import scanner, _aws
+from eks_auth_sync.rules import Rule, RuleSet
+from eks_auth_sync.mapping import Mapping, MappingType
+from tests.fakes.iam import ACCOUNT_ID, FakeIam
+
+
+class TestScanner(unittest.TestCase):
+    def _fake_iam(self, **kwargs):
+        iam = FakeIam(page_size=2, **kwargs)
+        for i in range(5):
+            iam.add_role(
+                f"dev-{i}",
+                path="/teams/",
+                tags={"eks/testing/type": "user", "eks/testing/username": f"dev-{i}"},
+            )
+        iam.add_role("node", tags={"eks/testing/type": "node"})
+        iam.add_role("untagged")
+        iam.add_user("teppo", path="/alt/", tags={"eks/testing/username": "teppo"})
+        return iam
+
+    @staticmethod
+    def _clients_without_retries(iam):
+        """ Turn off Botocore's retries to fail the calls at once """
+        with unittest.mock.patch.object(_aws, "MAX_ATTEMPTS", 0):
+            return iam.clients()
+
+    def test_scan(self):
+        iam = self._fake_iam()
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        result = scnr.scan(roles_paths=["/"], users_paths=["/"])
+
+        self.assertTrue(result.complete)
+        self.assertEqual(len(result.mappings), 7)
+        self.assertEqual(
+            result.mappings[-1].arn, f"arn:aws:iam::{ACCOUNT_ID}:user/alt/teppo"
+        )
+        self.assertEqual(result.mappings[5].mapping_type, MappingType.RoleToNode)
+        self.assertEqual(iam.calls["ListRoles"], 4)
+        self.assertNotIn("GetCallerIdentity", iam.calls)
+
+    def test_scan_maps_roles_without_path(self):
+        iam = self._fake_iam()
+        role_arn = iam.add_role(
+            "ops", path="/teams/ops/", tags={"eks/testing/username": "ops"}
+        )
+        iam.add_role("ops-node", path="/nodes/", tags={"eks/testing/type": "node"})
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        result = scnr.scan(roles_paths=["/teams/ops/", "/nodes/"], users_paths=["/"])
+
+        self.assertEqual(role_arn, f"arn:aws:iam::{ACCOUNT_ID}:role/teams/ops/ops")
+        self.assertEqual(
+            [m.arn for m in result.mappings],
+            [
+                f"arn:aws:iam::{ACCOUNT_ID}:role/ops-node",
+                f"arn:aws:iam::{ACCOUNT_ID}:role/ops",
+                f"arn:aws:iam::{ACCOUNT_ID}:user/alt/teppo",
+            ],
+        )
+        self.assertEqual(
+            result.principals[f"arn:aws:iam::{ACCOUNT_ID}:role/ops"]["path"],
+            "/teams/ops/",
+        )
+
+    def test_scan_collapses_path_prefixes(self):
+        iam = self._fake_iam()
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        result = scnr.scan(roles_paths=["/teams/", "/", "/teams/a/"], users_paths=[])
+
+        self.assertEqual(len(result.mappings), 6)
+        self.assertEqual(iam.calls["ListRoles"], 4)
+        self.assertEqual(iam.calls["ListRoleTags"], 7)
+
+    def test_scan_deduplicates_mappings_across_shards(self):
+        iam = self._fake_iam()
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        with unittest.mock.patch.object(
+            scanner, "_collapse_path_prefixes", lambda paths: sorted(set(paths))
+        ):
+            result = scnr.scan(roles_paths=["/", "/teams/"], users_paths=["/"])
+
+        arns = [m.arn for m in result.mappings]
+        self.assertEqual(len(arns), 7)
+        self.assertEqual(len(set(arns)), 7)
+        self.assertEqual(iam.calls["ListRoleTags"], 12)
+
+    def test_scan_merges_extra_mappings_once(self):
+        iam = self._fake_iam()
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+        extra = Mapping(
+            arn="<rolearn>",
+            mapping_type=MappingType.RoleToUser,
+            username="dev-0",
+            groups=["admin"],
+        )
+
+        result = scnr.scan(
+            roles_paths=["/"],
+            users_paths=["/"],
+            options=scanner.ScanOptions(extra_mappings=[extra]),
+        )
+
+        self.assertEqual(len(result.mappings), 8)
+        self.assertEqual(result.mappings[0], extra._replace(groups=("admin",)))
+        self.assertEqual(
+            [(c.key, c.value, c.existing.arn) for c in result.conflicts],
+            [("username", "dev-0", "<rolearn>")],
+        )
+
+    def test_scan_streams_page_by_page(self):
+        iam = self._fake_iam()
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+        list_calls = []
+
+        scnr.scan(
+            roles_paths=["/"],
+            options=scanner.ScanOptions(
+                on_mapping=lambda _: list_calls.append(iam.calls["ListRoles"])
+            ),
+        )
+
+        # Mappings are found before the rest of the pages are listed
+        self.assertEqual(list_calls[0], 1)
+        self.assertEqual(sorted(set(list_calls)), [1, 2, 3])
+
+    def test_scan_concurrency(self):
+        iam = self._fake_iam(latency=0.01)
+        clients = iam.clients(concurrency=2)
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        result = scnr.scan(
+            roles_paths=["/teams/", "/other/", "/nodes/"],
+            users_paths=["/alt/", "/users/"],
+            options=scanner.ScanOptions(concurrency=2),
+        )
+
+        self.assertEqual(len(result.mappings), 6)
+        self.assertEqual(iam.max_in_flight, 2)
+
+    def test_scan_leaves_retries_to_botocore(self):
+        iam = self._fake_iam()
+        iam.fail_tags("dev-1", status=500, code="ServiceFailure", count=2)
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        result = scnr.scan(roles_paths=["/"], users_paths=["/"])
+
+        self.assertEqual(len(result.mappings), 7)
+        self.assertEqual(result.degraded, [])
+        self.assertEqual(iam.calls["ListRoleTags"], 7 + 2)
+
+    def test_scan_falls_back_to_last_known_good(self):
+        iam = self._fake_iam()
+        iam.fail_tags("dev-1")
+        iam.fail_tags("untagged")
+        iam.fail_tags("dev-2", status=404, code="NoSuchEntity")
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+        dev1_arn = f"arn:aws:iam::{ACCOUNT_ID}:role/dev-1"
+        last_known_good = Mapping(
+            arn=dev1_arn,
+            mapping_type=MappingType.RoleToUser,
+            username="dev-1",
+            groups=("old",),
+        )
+
+        result = scnr.scan(
+            roles_paths=["/"],
+            users_paths=["/"],
+            options=scanner.ScanOptions(fallback=[last_known_good]),
+        )
+
+        self.assertEqual(len(result.mappings), 6)
+        self.assertIn(last_known_good, result.mappings)
+        self.assertNotIn("dev-2", [m.username for m in result.mappings])
+        self.assertEqual(
+            result.degraded, [dev1_arn, f"arn:aws:iam::{ACCOUNT_ID}:role/untagged"]
+        )
+        stats = scnr.stats.as_dict()
+        self.assertEqual(stats["degraded"], 2)
+        self.assertEqual(stats["fallbacks"], 1)
+        self.assertEqual(stats["deleted"], 1)
+
+    def test_scan_fails_without_fallback(self):
+        iam = self._fake_iam()
+        iam.fail_tags("dev-1", status=503, code="ServiceUnavailable")
+        clients = self._clients_without_retries(iam)
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        with self.assertRaises(botocore.exceptions.ClientError):
+            scnr.scan(roles_paths=["/"], users_paths=["/"])
+        self.assertEqual(iam.calls["ListRoleTags"], 2)
+
+    def test_scan_fails_on_access_denied(self):
+        iam = self._fake_iam()
+        iam.fail_tags("dev-1")
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+
+        with self.assertRaises(botocore.exceptions.ClientError):
+            scnr.scan(roles_paths=["/"], users_paths=["/"])
+        self.assertEqual(iam.calls["ListRoleTags"], 2)
+
+    def test_scan_priority_tier_first(self):
+        iam = self._fake_iam()
+        iam.add_role("eks-node-a", path="/nodes/")
+        clients = iam.clients()
+        node_rules = RuleSet(
+            [Rule(MappingType.RoleToNode, name="eks-node-.*", path="/nodes/")]
+        )
+        scnr = scanner.Scanner(
+            clients.session, "testing", rules=node_rules, clients=clients
+        )
+        tiers = []
+
+        def on_priority(mappings):
+            tiers.append((mappings, iam.calls["ListRoleTags"]))
+
+        result = scnr.scan(
+            roles_paths=["/"],
+            users_paths=["/"],
+            options=scanner.ScanOptions(
+                concurrency=1,
+                priority_paths=["/teams/", "/other/"],
+                on_priority=on_priority,
+            ),
+        )
+
+        self.assertEqual(len(tiers), 1)
+        tier, tag_lookups = tiers[0]
+        self.assertEqual(
+            sorted(m.username for m in tier),
+            ["", "dev-0", "dev-1", "dev-2", "dev-3", "dev-4"],
+        )
+        self.assertEqual(tag_lookups, 5)
+        self.assertEqual(len(result.mappings), 8)
+        self.assertEqual(iam.calls["ListRoleTags"], 7)
+        self.assertEqual(iam.calls["ListRoles"], 3 + 1 + 4)
+        self.assertEqual(scnr.stats["principals"], 9)
+
+    def test_scan_priority_tier_leaves_out_degraded_and_overridden(self):
+        iam = self._fake_iam()
+        iam.fail_tags("dev-1")
+        clients = iam.clients()
+        scnr = scanner.Scanner(clients.session, "testing", clients=clients)
+        last_known_good = Mapping(
+            arn=f"arn:aws:iam::{ACCOUNT_ID}:role/dev-1",
+            mapping_type=MappingType.RoleToUser,
+            username="dev-1",
+            groups=("old",),
+        )
+        from_file = Mapping(
+            arn="<rolearn>",
+            mapping_type=MappingType.RoleToUser,
+            username="dev-2",
+            groups=("admin",),
+        )
+        tiers = []
+
+        result = scnr.scan(
+            roles_paths=["/"],
+            users_paths=["/"],
+            options=scanner.ScanOptions(
+                fallback=[last_known_good],
+                priority_paths=["/teams/"],
+                on_priority=tiers.append,
+                extra_mappings=[from_file],
+            ),
+        )
+
+        self.assertEqual(len(tiers), 1)
+        self.assertEqual(
+            sorted(m.username for m in tiers[0]), ["dev-0", "dev-3", "dev-4"]
+        )
+        self.assertIn(last_known_good, result.mappings)
+        self.assertIn(from_file, result.mappings)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+# pylint: disable=missing-docstring
+import json
+import os
+import tempfile
+import unittest
+from eks_auth_sync.snapshot import Snapshot
+from tests.unit.fixtures import NODE_MAPPING
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "snapshot.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_and_load(self):
+        snapshot = Snapshot.create(
+            "testing",
+            [NODE_MAPPING],
+            {"<rolearn>": {"kind": "role", "name": "node", "path": "/", "id": "x"}},
+        )
+        snapshot.save(self.filename)
+        self.assertEqual(Snapshot.load(self.filename), snapshot)
+
+    def test_unsupported_version(self):
+        with open(self.filename, "w") as fp:
+            json.dump({"version": 0, "cluster": "testing", "mappings": []}, fp)
+        with self.assertRaises(ValueError):
+            _ = Snapshot.load(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# pylint: disable=missing-docstring
+import unittest
+from eks_auth_sync import _args
+from eks_auth_sync.mapping import MappingType, Mapping, to_aws_auth
+from eks_auth_sync.store import (
+    ConflictPolicy,
+    MappingConflict,
+    MappingStore,
+)
+
+
+def _role(name, username, groups=("viewer",)):
+    return Mapping(
+        arn=f"arn:aws:iam::1:role/{name}",
+        mapping_type=MappingType.RoleToUser,
+        username=username,
+        groups=list(groups),
+    )
+
+
+def _node(name):
+    return Mapping(
+        arn=f"arn:aws:iam::1:role/{name}",
+        mapping_type=MappingType.RoleToNode,
+        username="",
+        groups=[],
+    )
+
+
+class TestMappingStore(unittest.TestCase):
+    def test_deduplicates_identical_mappings(self):
+        store = MappingStore(mappings=[_role("dev", "dev"), _role("dev", "dev")])
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.conflicts, [])
+        self.assertIn("arn:aws:iam::1:role/dev", store)
+        self.assertEqual(store.by_username("dev").arn, "arn:aws:iam::1:role/dev")
+
+    def test_interns_groups(self):
+        store = MappingStore(mappings=[_role("a", "a"), _role("b", "b")])
+        first, second = list(store)
+
+        self.assertEqual(first.groups, ("viewer",))
+        self.assertIs(first.groups, second.groups)
+
+    def test_warn_policy(self):
+        store = MappingStore(
+            mappings=[
+                _role("dev", "dev"),
+                _role("dev", "other"),
+                _role("another", "dev"),
+            ]
+        )
+
+        self.assertEqual(
+            [m.username for m in store], ["dev", "dev"],
+        )
+        self.assertEqual([c.key for c in store.conflicts], ["arn", "username"])
+
+    def test_first_policy(self):
+        store = MappingStore(
+            ConflictPolicy.First,
+            [_role("dev", "dev"), _role("dev", "other"), _role("another", "dev")],
+        )
+
+        self.assertEqual(
+            [(m.arn, m.username) for m in store], [("arn:aws:iam::1:role/dev", "dev")]
+        )
+        self.assertEqual(len(store.conflicts), 2)
+
+    def test_last_policy(self):
+        store = MappingStore(
+            ConflictPolicy.Last,
+            [_role("dev", "dev"), _role("dev", "other"), _role("another", "other")],
+        )
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get("arn:aws:iam::1:role/another").username, "other")
+        self.assertIsNone(store.get("arn:aws:iam::1:role/dev"))
+        self.assertIsNone(store.by_username("dev"))
+
+    def test_error_policy(self):
+        store = MappingStore(ConflictPolicy.Error, [_role("dev", "dev")])
+
+        with self.assertRaises(MappingConflict) as ctx:
+            store.add(_role("another", "dev"))
+        self.assertEqual(ctx.exception.conflict.key, "username")
+        self.assertEqual(len(store), 1)
+
+    def test_skips_username_conflicts_for_nodes_and_templates(self):
+        store = MappingStore(
+            ConflictPolicy.Error,
+            [
+                _node("node-a"),
+                _node("node-b"),
+                _role("a", "sso:{{SessionName}}"),
+                _role("b", "sso:{{SessionName}}"),
+            ],
+        )
+
+        self.assertEqual(len(store), 4)
+        self.assertIsNone(store.by_username("sso:{{SessionName}}"))
+
+    def test_to_aws_auth(self):
+        store = MappingStore(mappings=[_role("dev", "dev")])
+
+        configmap = to_aws_auth(store)
+        self.assertEqual(
+            configmap.data["mapRoles"],
+            "- groups:\n  - viewer\n  rolearn: arn:aws:iam::1:role/dev\n  username: dev\n",
+        )
+
+    def test_cli_policies(self):
+        self.assertEqual(
+            _args.CONFLICT_POLICIES, tuple(p.value for p in ConflictPolicy)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()